@@ -0,0 +1,77 @@
+"""
+Benchmark the comment text parsers over the fixture corpus in benchmarks/fixtures/comments.
+
+Usage:
+    python benchmarks/bench_comment_parsers.py [--scale 200] [--repeat 5]
+
+The fixture comments are replicated `--scale` times to build a larger input,
+each parser runs `--repeat` times and the best run is reported as comments/sec.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import comment_parsers  # noqa: E402
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "comments")
+
+
+def load_corpus(scale):
+    """
+    Build one input per platform from the fixtures, replicated `scale` times
+    """
+    with open(os.path.join(FIXTURE_DIR, "wechat.txt"), encoding="utf-8") as f:
+        wechat_lines = f.read().splitlines()
+    # keep the article header and the comments-section marker once, repeat the comment blocks
+    marker = next(i for i, ln in enumerate(wechat_lines) if ln.strip().lower().endswith("comments"))
+    wechat = "\n".join(wechat_lines[: marker + 1] + wechat_lines[marker + 1:] * scale)
+
+    with open(os.path.join(FIXTURE_DIR, "weibo.txt"), encoding="utf-8") as f:
+        weibo = f.read().rstrip("\n")
+    weibo = "\n".join([weibo] * scale)
+
+    with open(os.path.join(FIXTURE_DIR, "douyin.json"), encoding="utf-8") as f:
+        douyin = json.load(f) * scale
+
+    return {
+        "wechat": (comment_parsers.parse_wechat_comments, wechat),
+        "weibo": (comment_parsers.parse_weibo_comments, weibo),
+        "douyin": (comment_parsers.parse_douyin_comments, douyin),
+    }
+
+
+def run(scale, repeat):
+    now = datetime.now()
+    results = {}
+    for name, (parser, data) in load_corpus(scale).items():
+        best = None
+        count = 0
+        for _ in range(repeat):
+            start = time.perf_counter()
+            count = len(parser(data, now))
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[name] = {
+            "comments": count,
+            "seconds": round(best, 6),
+            "comments_per_sec": round(count / best) if best else None,
+        }
+        print(f"{name:<8} {count:>8} comments  {best * 1000:>9.2f} ms  {results[name]['comments_per_sec']:>10} comments/sec")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark comment text parsers")
+    parser.add_argument("--scale", type=int, default=200, help="times the fixture corpus is replicated")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per parser, the best one is reported")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.scale, args.repeat)
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
@@ -0,0 +1,77 @@
+"""
+Benchmark the vectorized metric normalizer against the scalar utils.chinese_unit_to_number loop.
+
+Usage:
+    python benchmarks/bench_metric_normalizer.py [--rows 200000] [--repeat 3]
+
+Both paths run over the same synthetic column of metric strings and their
+results are compared before timings are reported.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+import metric_normalizer  # noqa: E402
+import utils  # noqa: E402
+
+SAMPLE_VALUES = ["12", "1.2万", "3k", "", "12000.0", "0.5亿", "7.8k", "2.1M", "999", "1百万", None]
+
+
+def scalar_path(values):
+    return np.array(
+        [int(utils.chinese_unit_to_number(v)) if v else 0 for v in values], dtype=np.int64
+    )
+
+
+def best_of(func, values, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(values)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def make_values(rows, rng):
+    """
+    Mix of repeated display strings and high-cardinality raw counts
+    """
+    values = []
+    for _ in range(rows):
+        kind = rng.random()
+        if kind < 0.4:
+            values.append(rng.choice(SAMPLE_VALUES))
+        elif kind < 0.8:
+            values.append(str(rng.randint(0, 99_999)))
+        else:
+            values.append(f"{rng.randint(1, 9999) / 10}万")
+    return values
+
+
+def run(rows, repeat):
+    rng = random.Random(42)
+    values = make_values(rows, rng)
+
+    scalar_time, expected = best_of(scalar_path, values, repeat)
+    vector_time, actual = best_of(metric_normalizer.chinese_units_to_numbers, values, repeat)
+    if not np.array_equal(expected, actual):
+        raise SystemExit("❌ Vectorized result differs from the scalar path")
+
+    print(f"scalar      {rows:>9} values  {scalar_time * 1000:>9.2f} ms  {rows / scalar_time:>12.0f} values/sec")
+    print(f"vectorized  {rows:>9} values  {vector_time * 1000:>9.2f} ms  {rows / vector_time:>12.0f} values/sec")
+    print(f"speedup     {scalar_time / vector_time:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark metric normalization")
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.rows, args.repeat)
@@ -0,0 +1,216 @@
+"""
+End-to-end benchmark of the three scrapers against the local fixture server (no network).
+
+Usage:
+    python benchmarks/bench_scrapers.py [--pages 8] [--concurrency 1 2 4] [--latency-ms 50]
+                                        [--output results.json] [--baseline results.json]
+
+For every platform and concurrency level, `--pages` fixture urls are scraped with
+`scrape_post` into a temporary database, at most `concurrency` at a time in one event loop.
+Reports pages/sec, p50/p95 per-url latency and the peak RSS of this process plus its
+browser processes. With `--replay-urls urls.txt` the urls are replayed from their HAR
+archives (recorded with `main.py --har record`) instead of the fixture server.
+With `--baseline`, exits with status 1 when pages/sec dropped or p95 latency grew by
+more than `--tolerance` compared to a previous `--output` file.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import psutil  # noqa: E402
+import config  # noqa: E402
+import utils  # noqa: E402
+import scrape_douyin_post  # noqa: E402
+import scrape_weibo_post  # noqa: E402
+import scrape_weixin_post  # noqa: E402
+from logging_config import log_context  # noqa: E402
+from fixture_server import FixtureServer  # noqa: E402
+
+SCRAPERS = {
+    "weixin": scrape_weixin_post.scrape_post,
+    "weibo": scrape_weibo_post.scrape_post,
+    "douyin": scrape_douyin_post.scrape_post,
+}
+
+
+class RssSampler:
+    """
+    Sample the RSS of this process and all its children (the browsers) in a background thread
+    """
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self):
+        process = psutil.Process()
+        total = process.memory_info().rss
+        for child in process.children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except psutil.Error:
+                # the child exited between listing and reading
+                pass
+        self.peak = max(self.peak, total)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._sample()
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def scrape_all(scrape_post, urls, conn, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    failures = 0
+
+    async def one(url):
+        nonlocal failures
+        # gather runs each url in its own task, so every url keeps its own correlation id
+        async with semaphore:
+            with log_context(url):
+                start = time.perf_counter()
+                try:
+                    saved = await scrape_post(url, conn) is not False
+                except Exception:
+                    saved = False
+                latencies.append(time.perf_counter() - start)
+                if not saved:
+                    failures += 1
+
+    await asyncio.gather(*(one(url) for url in urls))
+    return latencies, failures
+
+
+def run_case(platform, urls, concurrency, db_path):
+    conn = sqlite3.connect(db_path)
+    utils.create_table(conn, config.table_name)
+    try:
+        with RssSampler() as rss:
+            start = time.perf_counter()
+            latencies, failures = asyncio.run(scrape_all(SCRAPERS[platform], urls, conn, concurrency))
+            elapsed = time.perf_counter() - start
+    finally:
+        conn.close()
+    return {
+        "platform": platform,
+        "concurrency": concurrency,
+        "pages": len(urls),
+        "failures": failures,
+        "pages_per_sec": len(urls) / elapsed,
+        "p50_seconds": percentile(latencies, 0.5),
+        "p95_seconds": percentile(latencies, 0.95),
+        "peak_rss_mb": rss.peak / 1024 / 1024,
+    }
+
+
+def compare(results, baseline_path, tolerance):
+    """
+    :return: list of regression messages against the baseline results file
+    """
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["platform"], r["concurrency"]): r for r in json.load(f)["results"]}
+    regressions = []
+    for result in results:
+        base = baseline.get((result["platform"], result["concurrency"]))
+        if base is None:
+            continue
+        name = f"{result['platform']} x{result['concurrency']}"
+        if result["pages_per_sec"] < base["pages_per_sec"] * (1 - tolerance):
+            regressions.append(f"{name}: {result['pages_per_sec']:.2f} pages/sec, baseline {base['pages_per_sec']:.2f}")
+        if result["p95_seconds"] > base["p95_seconds"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {result['p95_seconds']:.2f}s, baseline {base['p95_seconds']:.2f}s")
+    return regressions
+
+
+def run(args):
+    # the fixtures load instantly, keep the waits short so they don't dominate the numbers
+    config.page_load_wait_ms = args.wait_ms
+    config.comment_wait_ms = args.wait_ms
+    config.scroll_wait_ms = args.wait_ms
+
+    if args.replay_urls:
+        config.har_mode = "replay"
+        server = None
+        with open(args.replay_urls, encoding="utf-8") as f:
+            replay_urls = [line.strip() for line in f if line.strip()]
+    else:
+        server = FixtureServer(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms).start()
+
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for platform in args.platforms:
+                for concurrency in args.concurrency:
+                    if server is not None:
+                        urls = [server.post_url(platform, f"{concurrency}-{i}") for i in range(args.pages)]
+                    else:
+                        urls = [url for url in replay_urls if utils.platform_from_url(url) == platform]
+                        if not urls:
+                            continue
+                    db_path = os.path.join(tmp_dir, f"{platform}-{concurrency}.db")
+                    result = run_case(platform, urls, concurrency, db_path)
+                    results.append(result)
+                    print(
+                        f"{platform:<7} x{concurrency:<3} {result['pages_per_sec']:>7.2f} pages/sec"
+                        f"  p50 {result['p50_seconds']:>6.2f}s  p95 {result['p95_seconds']:>6.2f}s"
+                        f"  peak RSS {result['peak_rss_mb']:>7.1f} MB  failures {result['failures']}"
+                    )
+    finally:
+        if server is not None:
+            server.stop()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"settings": vars(args), "results": results}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if any(result["failures"] for result in results):
+        raise SystemExit("❌ Some fixture pages failed to scrape, check the selectors against the fixtures")
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        if regressions:
+            raise SystemExit("❌ Performance regressions:\n" + "\n".join(regressions))
+        print(f"✅ No regression against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the scrapers against local page fixtures")
+    parser.add_argument("--platforms", nargs="+", choices=list(SCRAPERS), default=list(SCRAPERS))
+    parser.add_argument("--pages", type=int, default=8, help="urls per platform and concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--latency-ms", type=float, default=50, help="delay of every fixture server response")
+    parser.add_argument("--jitter-ms", type=float, default=10)
+    parser.add_argument("--wait-ms", type=int, default=200, help="replaces the fixed page and scroll waits")
+    parser.add_argument("--replay-urls", help="replay these urls from their HAR archives instead of the fixtures")
+    parser.add_argument("--output", help="write the results as JSON, e.g. to use as a later baseline")
+    parser.add_argument("--baseline", help="results JSON of a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown")
+    run(parser.parse_args())
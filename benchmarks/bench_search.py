@@ -0,0 +1,104 @@
+"""
+Benchmark keyword search: LIKE '%...%' scans against the FTS5 bigram index of search_index.py.
+
+Usage:
+    python benchmarks/bench_search.py [--rows 200000] [--repeat 5]
+
+Builds a temporary database of synthetic posts from the comment fixtures, indexes it
+with search_index.rebuild and times a few queries both ways (best of `--repeat`).
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+import search_index  # noqa: E402
+import utils  # noqa: E402
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "comments")
+
+QUERIES = ["小麦", "无人机植保", "苹果价格", "有机肥"]
+
+
+def load_sentences():
+    with open(os.path.join(FIXTURE_DIR, "weibo.txt"), encoding="utf-8") as f:
+        sentences = [line.split("：", 1)[-1].split(" ")[0].strip("'") for line in f if "：" in line]
+    with open(os.path.join(FIXTURE_DIR, "douyin.json"), encoding="utf-8") as f:
+        sentences += [entry.split("\n")[-7] for entry in json.load(f) if len(entry.split("\n")) >= 7]
+    return [s for s in sentences if s]
+
+
+def build_database(path, rows, rng):
+    """
+    Posts made of random fixture sentences plus random filler characters, indexed in bulk
+    """
+    sentences = load_sentences()
+    filler = "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所民得经"
+    conn = sqlite3.connect(path)
+    utils.create_table(conn, config.table_name)
+    batch = []
+    for i in range(rows):
+        text = "".join(rng.choice(filler) for _ in range(rng.randint(20, 80)))
+        if rng.random() < 0.05:
+            text += rng.choice(sentences)
+        batch.append((f"https://weibo.com/bench/{i}", text))
+        if len(batch) == 10_000:
+            conn.executemany(f"INSERT INTO {config.table_name} (link1, content) VALUES (?, ?)", batch)
+            batch = []
+    if batch:
+        conn.executemany(f"INSERT INTO {config.table_name} (link1, content) VALUES (?, ?)", batch)
+    conn.commit()
+    start = time.perf_counter()
+    search_index.rebuild(conn, config.table_name)
+    return conn, time.perf_counter() - start
+
+
+def best_of(func, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run(rows, repeat):
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        conn, index_seconds = build_database(os.path.join(tmp_dir, "bench.db"), rows, rng)
+        print(f"indexed {rows} posts in {index_seconds:.1f}s")
+        for query in QUERIES:
+            like_time, like_rows = best_of(
+                lambda: conn.execute(
+                    f"SELECT COUNT(*) FROM {config.table_name} WHERE content LIKE ?", (f"%{query}%",)
+                ).fetchone()[0],
+                repeat,
+            )
+            fts_time, fts_rows = best_of(
+                lambda: len(search_index.search(conn, query, limit=rows, include_comments=False)), repeat
+            )
+            top_time, _ = best_of(lambda: search_index.search(conn, query, limit=20), repeat)
+            if like_rows != fts_rows:
+                raise SystemExit(f"❌ '{query}': LIKE found {like_rows} posts, FTS {fts_rows}")
+            print(
+                f"{query:<8} {like_rows:>7} hits  LIKE {like_time * 1000:>8.2f} ms"
+                f"  FTS all {fts_time * 1000:>8.2f} ms  FTS top 20 {top_time * 1000:>7.2f} ms"
+            )
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark LIKE scans against the FTS5 index")
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.rows, args.repeat)
@@ -0,0 +1,68 @@
+"""
+Measure how long importing the scraping entry point takes in a fresh interpreter.
+
+Usage:
+    python benchmarks/bench_startup.py [--module main] [--repeat 5] [--max-seconds 1.0]
+
+Each run imports `--module` in a new `python` process and reports the median and best
+wall time. Exits with status 1 when the median exceeds `--max-seconds` or when one of
+the OCR/AI/dataframe stacks (which the Playwright scrapers don't need) got imported.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# must stay out of a Playwright-only scrape, see ocr_utils.py
+HEAVY_MODULES = ["cv2", "pytesseract", "PIL.ImageGrab", "dashscope", "numpy", "pandas", "pyarrow"]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module):
+    """
+    Import `module` in a fresh interpreter
+    :return: (seconds, list of heavy modules that were imported)
+    """
+    probe = PROBE.format(module=module, heavy=HEAVY_MODULES)
+    output = subprocess.run(
+        [sys.executable, "-c", probe], cwd=ROOT_DIR, capture_output=True, text=True, check=True
+    ).stdout
+    # the module may log while importing, the result is the last line
+    result = json.loads(output.strip().splitlines()[-1])
+    return result["seconds"], result["heavy"]
+
+
+def run(module, repeat, max_seconds):
+    timings = []
+    heavy = []
+    for _ in range(repeat):
+        seconds, heavy = measure(module)
+        timings.append(seconds)
+
+    median = statistics.median(timings)
+    print(f"import {module}: median {median * 1000:.1f} ms, best {min(timings) * 1000:.1f} ms over {repeat} runs")
+    if heavy:
+        raise SystemExit(f"❌ import {module} loads {', '.join(heavy)}")
+    if max_seconds is not None and median > max_seconds:
+        raise SystemExit(f"❌ import {module} takes {median:.2f}s, budget {max_seconds:.2f}s")
+    print("✅ No OCR/AI/dataframe modules imported")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the import time of the scraping entry point")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=1.0, help="fail when the median import time is above")
+    args = parser.parse_args()
+    run(args.module, args.repeat, args.max_seconds)
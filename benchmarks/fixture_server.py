@@ -0,0 +1,131 @@
+"""
+Local HTTP server for the saved page fixtures, so the scrapers can run end to end without network.
+
+Routes:
+    /<platform>/<post id>       fixture page of weixin, weibo or douyin (any post id)
+    /api/<platform>/comments    mock comment API read by the fixture pages (weibo, douyin)
+
+Every response is delayed by `latency_ms` (+/- `jitter_ms`) to mimic a remote site.
+
+Usage:
+    python benchmarks/fixture_server.py [--port 8800] [--latency-ms 100] [--jitter-ms 20]
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+PLATFORMS = ("weixin", "weibo", "douyin")
+
+
+def load_fixtures():
+    """
+    Read the fixture pages and the comment API payloads into memory
+    """
+    pages = {}
+    for platform in PLATFORMS:
+        with open(os.path.join(FIXTURE_DIR, "pages", f"{platform}.html"), "rb") as f:
+            pages[platform] = f.read()
+
+    comments_dir = os.path.join(FIXTURE_DIR, "comments")
+    with open(os.path.join(comments_dir, "weibo.txt"), encoding="utf-8") as f:
+        weibo = [line for line in f.read().splitlines() if line.strip()]
+    with open(os.path.join(comments_dir, "douyin.json"), encoding="utf-8") as f:
+        douyin = json.load(f)
+    apis = {
+        "weibo": json.dumps(weibo, ensure_ascii=False).encode("utf-8"),
+        "douyin": json.dumps(douyin, ensure_ascii=False).encode("utf-8"),
+    }
+    return pages, apis
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    # set on the server instance by FixtureServer
+    server: "FixtureServer"
+
+    def do_GET(self):
+        self.server.delay()
+        parts = [part for part in self.path.split("?", 1)[0].split("/") if part]
+        if len(parts) == 3 and parts[0] == "api" and parts[2] == "comments" and parts[1] in self.server.apis:
+            self._send(200, "application/json; charset=utf-8", self.server.apis[parts[1]])
+        elif len(parts) == 2 and parts[0] in self.server.pages:
+            self._send(200, "text/html; charset=utf-8", self.server.pages[parts[0]])
+        else:
+            self._send(404, "text/plain; charset=utf-8", b"not found")
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # keep benchmark output clean
+        pass
+
+
+class FixtureServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, latency_ms=0, jitter_ms=0):
+        """
+        :param port: 0 picks a free port, see `base_url`
+        :param latency_ms: delay added to every response
+        :param jitter_ms: random +/- variation of the delay
+        """
+        super().__init__((host, port), FixtureHandler)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.pages, self.apis = load_fixtures()
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def post_url(self, platform, post_id):
+        return f"{self.base_url}/{platform}/{post_id}"
+
+    def delay(self):
+        delay_ms = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000)
+
+    def start(self):
+        """
+        Serve in a background thread
+        """
+        self._thread = threading.Thread(target=self.serve_forever, name="fixture-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the scraper page fixtures locally")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    args = parser.parse_args()
+
+    server = FixtureServer(args.host, args.port, args.latency_ms, args.jitter_ms)
+    print(f"Serving fixtures at {server.base_url}, e.g. {server.post_url('douyin', 1)}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,151 @@
+"""
+Shared Playwright browser context setup for the scrapers, with HAR record and replay
+and persistent login state.
+
+    config.har_mode = None      live network (default)
+    config.har_mode = 'record'  save every network exchange of a url into har/<platform>/<hash>.zip
+    config.har_mode = 'replay'  serve the url from its archive through Playwright routing, no network
+
+The archive is only complete once the context is closed, so scrapers close it with `close_browser`.
+
+Cookies and localStorage of each platform are kept in browser_state/<platform>.json:
+every context starts from that file and `save_storage_state` writes it back. An expired
+session is refreshed at most once per `login_refresh_interval_seconds` (`refresh_login`), not
+once per url; concurrent scrapes wait for the refresh in progress and then use its session.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+import weakref
+import config
+import utils
+import browser_watchdog
+from logging_config import get_logger
+
+logger = get_logger()
+
+HAR_MODES = ("record", "replay")
+
+CONTEXT_OPTIONS = {
+    "viewport": {"width": 1920, "height": 1080},
+    "ignore_https_errors": True,
+}
+
+# platform -> time.monotonic() when its last login refresh finished
+_login_refreshed_at = {}
+# event loop -> {platform: asyncio.Lock}, a lock can't be shared between the loops of asyncio.run calls
+_login_locks = weakref.WeakKeyDictionary()
+
+
+def har_path(url, har_dir=None):
+    """
+    Archive file of a url: <har_dir>/<platform>/<sha1 of the url>.zip
+    """
+    digest = hashlib.sha1(url.strip().encode("utf-8")).hexdigest()
+    return os.path.join(har_dir or config.har_dir, utils.platform_from_url(url), f"{digest}.zip")
+
+
+def storage_state_path(platform):
+    return os.path.join(config.browser_state_dir, f"{platform}.json")
+
+
+async def new_context(browser, url, har_mode=None):
+    """
+    Create the browser context used to scrape `url`, logged in with the saved state of its platform.
+    :param har_mode: 'record', 'replay' or None, default config.har_mode
+    """
+    har_mode = har_mode or config.har_mode
+    if har_mode and har_mode not in HAR_MODES:
+        raise ValueError(f"Invalid HAR mode '{har_mode}', expected one of {HAR_MODES}")
+
+    options = dict(CONTEXT_OPTIONS)
+    state_path = storage_state_path(utils.platform_from_url(url))
+    if os.path.exists(state_path):
+        options["storage_state"] = state_path
+
+    if har_mode == "record":
+        path = har_path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        logger.info(f"📼 Recording network exchanges of {url} into {path}")
+        # a .zip archive keeps the response bodies as separate entries instead of base64 in the json
+        return await browser.new_context(**options, record_har_path=path, record_har_content="attach")
+
+    context = await browser.new_context(**options)
+    if har_mode == "replay":
+        path = har_path(url)
+        if not os.path.exists(path):
+            await context.close()
+            raise FileNotFoundError(f"No HAR archive for {url}: {path}")
+        logger.info(f"📼 Replaying {url} from {path}")
+        # requests missing from the archive are aborted, nothing goes to the network
+        await context.route_from_har(path, not_found="abort")
+    return context
+
+
+async def save_storage_state(context, platform):
+    """
+    Write the cookies and localStorage of `context` as the saved state of `platform`
+    """
+    if config.har_mode == "replay":
+        # replayed responses may carry stale cookies, keep the real session
+        return
+    state = await context.storage_state()
+    path = storage_state_path(platform)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # several scrapes may save at once, never leave a half-written file behind
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+async def load_storage_state(context, platform):
+    """
+    Add the saved cookies of `platform` to an existing context
+    """
+    path = storage_state_path(platform)
+    if not os.path.exists(path):
+        return
+    with open(path, encoding="utf-8") as f:
+        cookies = json.load(f).get("cookies", [])
+    if cookies:
+        await context.add_cookies(cookies)
+
+
+async def refresh_login(platform, context, wait_for_login):
+    """
+    Refresh the expired session of `platform` with `wait_for_login()` (the manual login wait),
+    unless another scrape is doing it: then wait for it and load its session into `context`.
+    An expired session costs one login wait per login_refresh_interval_seconds instead of one per url.
+    :return: False when a refresh finished less than login_refresh_interval_seconds before this
+        call, the scrape should fail fast
+    """
+    requested = time.monotonic()
+    locks = _login_locks.setdefault(asyncio.get_running_loop(), {})
+    async with locks.setdefault(platform, asyncio.Lock()):
+        last = _login_refreshed_at.get(platform)
+        if last is not None and last >= requested:
+            # refreshed while this scrape waited for the lock
+            await load_storage_state(context, platform)
+            return True
+        if last is not None and requested - last < config.login_refresh_interval_seconds:
+            return False
+        try:
+            await wait_for_login()
+        finally:
+            _login_refreshed_at[platform] = time.monotonic()
+        return True
+
+
+async def close_browser(browser, context):
+    """
+    Close the context first so a HAR archive being recorded is written, then the browser.
+    Each step is bounded by config.browser_close_timeout_seconds, a browser that doesn't
+    answer is killed, without touching the other browsers of the process (see browser_watchdog.py).
+    """
+    try:
+        await browser_watchdog.bounded(context.close(), "context close", browser=browser)
+    finally:
+        await browser_watchdog.bounded(browser.close(), "browser close", browser=browser)
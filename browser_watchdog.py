@@ -0,0 +1,157 @@
+"""
+Per-URL deadline and hung-browser watchdog for the scrapers.
+
+`run_with_deadline` cancels a scrape that runs longer than `config.url_timeout_seconds`;
+page_pool then closes the page's context (or the browser launched for the url), with waits
+bounded by `config.browser_close_timeout_seconds`. A browser that doesn't answer
+in time is killed here, which also fails every CDP call still waiting on it.
+
+`HungBrowserWatchdog` covers the case where even that doesn't return: a timer thread kills the
+browser processes of this process once the deadline and the bounded cleanup have passed. The
+page pool notices the disconnected browser and launches a fresh one for the next url.
+
+Browsers launched with `launch` carry a unique id switch on their command line, so a close that
+times out kills only the process tree of that browser, not the other browsers of the process
+(scrape_api.scrape_many and the scrape service share one event loop between many scrapes).
+"""
+import asyncio
+import os
+import threading
+import uuid
+import weakref
+try:
+    import psutil
+except ImportError:  # hung browsers can't be killed, the deadline still applies
+    psutil = None
+import config
+from logging_config import get_logger
+from run_metrics import get_metrics
+
+logger = get_logger()
+metrics = get_metrics()
+
+# process names of the browsers Playwright launches
+BROWSER_PROCESS_NAMES = ("chrome", "chromium", "headless_shell", "firefox", "webkit")
+# ignored by the browser, identifies its main process among the children of this process
+BROWSER_ID_SWITCH = "--scraper-browser-id"
+
+# browser -> id switch it was launched with
+_browser_ids = weakref.WeakKeyDictionary()
+
+
+async def launch(browser_type, args=(), **kwargs):
+    """
+    Launch a browser with `browser_type.launch`, tagged so its processes can be told apart
+    """
+    switch = f"{BROWSER_ID_SWITCH}={uuid.uuid4().hex}"
+    browser = await browser_type.launch(args=list(args) + [switch], **kwargs)
+    _browser_ids[browser] = switch
+    return browser
+
+
+def browser_processes(browser=None):
+    """
+    Browser processes started by this process (through the Playwright driver)
+    :param browser: only the processes of this browser (launched with `launch`), default all
+    """
+    if psutil is None:
+        return []
+    switch = _browser_ids.get(browser) if browser is not None else None
+    if switch is not None:
+        return _tagged_processes(switch)
+    processes = []
+    for child in psutil.Process(os.getpid()).children(recursive=True):
+        try:
+            if child.status() == psutil.STATUS_ZOMBIE:
+                continue
+            name = child.name().lower()
+        except psutil.Error:
+            continue
+        if any(browser in name for browser in BROWSER_PROCESS_NAMES):
+            processes.append(child)
+    return processes
+
+
+def _tagged_processes(switch):
+    for child in psutil.Process(os.getpid()).children(recursive=True):
+        try:
+            if child.status() != psutil.STATUS_ZOMBIE and switch in child.cmdline():
+                # renderer, GPU and utility processes are children of the browser process
+                return [child] + child.children(recursive=True)
+        except psutil.Error:
+            continue
+    return []
+
+
+def kill_browser_processes(reason, browser=None):
+    """
+    Kill the browser processes of this process
+    :param browser: only those of this browser, default all
+    :return: number of killed processes
+    """
+    killed = 0
+    for process in browser_processes(browser):
+        try:
+            process.kill()
+            killed += 1
+        except psutil.Error:
+            continue
+    if killed:
+        logger.warning(f"🔪 Killed {killed} browser processes: {reason}")
+        metrics.inc("browser_kills_total", killed)
+    return killed
+
+
+async def run_with_deadline(coro, timeout=None):
+    """
+    Await `coro`, cancelling it after `timeout` seconds (default config.url_timeout_seconds)
+    :raise asyncio.TimeoutError: when the deadline passed
+    """
+    return await asyncio.wait_for(coro, timeout or config.url_timeout_seconds)
+
+
+async def bounded(awaitable, what, timeout=None, browser=None, kill=True):
+    """
+    Await a cleanup step for at most `timeout` seconds (default config.browser_close_timeout_seconds),
+    killing the processes of `browser` (all browser processes when None) when it doesn't finish in time
+    :param kill: False to only report the timeout, e.g. when other pages still use the browser
+    :return: True when the step finished in time
+    """
+    try:
+        await asyncio.wait_for(awaitable, timeout or config.browser_close_timeout_seconds)
+        return True
+    except asyncio.TimeoutError:
+        if kill:
+            kill_browser_processes(f"{what} did not finish in time", browser)
+        else:
+            logger.warning(f"⚠️ {what} did not finish in time")
+        return False
+
+
+class HungBrowserWatchdog:
+    """
+    Kills the browser processes of this process if the guarded block is still running after `seconds`
+
+        with HungBrowserWatchdog(timeout + 3 * config.browser_close_timeout_seconds):
+            asyncio.run(...)
+    """
+
+    def __init__(self, seconds, url=None):
+        self.seconds = seconds
+        self.url = url
+        self.fired = False
+        self._timer = None
+
+    def _fire(self):
+        self.fired = True
+        kill_browser_processes(f"scrape of {self.url} still running after {self.seconds}s")
+
+    def __enter__(self):
+        self._timer = threading.Timer(self.seconds, self._fire)
+        self._timer.daemon = True
+        self._timer.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._timer.cancel()
+        return False
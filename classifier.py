@@ -0,0 +1,161 @@
+"""
+Classification stage: fills `is_agriculture_related` from a keyword lexicon (see agriculture_lexicon.txt).
+
+    python classifier.py [--lexicon agriculture_lexicon.txt] [--all]
+
+The lexicon is compiled once into an Aho-Corasick automaton, so every post is scanned in one
+pass whatever the number of terms. Rows are read and updated in bulk chunks. For each post
+the distinct matched terms are stored in `agriculture_terms` (JSON), their summed weights in
+`agriculture_score` (comment matches count `classify_comment_weight`) and the hash of the
+lexicon and settings in `lexicon_hash`. A run only scores rows that were never scored, were
+updated since, or were scored with another lexicon, so editing the lexicon re-scores the
+whole table on the next run.
+"""
+import argparse
+import hashlib
+import json
+import sqlite3
+from datetime import datetime
+try:
+    import ahocorasick
+except ImportError:  # classification can't run without it
+    ahocorasick = None
+import config
+import utils
+import search_index
+from logging_config import get_logger
+
+logger = get_logger()
+
+CLASSIFIER_COLUMNS = {
+    "agriculture_terms": "TEXT",
+    "agriculture_score": "REAL",
+    "lexicon_hash": "TEXT",
+    "classified_at": "TEXT",
+}
+
+
+def load_lexicon(path=None):
+    """
+    Read a lexicon file: one term per line, optionally "<term>\\t<weight>", '#' starts a comment line
+    :return: dict {lower-cased term: weight}
+    """
+    lexicon = {}
+    with open(path or config.lexicon_path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            term, _, weight = line.partition("\t")
+            try:
+                lexicon[term.strip().lower()] = float(weight) if weight.strip() else 1.0
+            except ValueError:
+                raise ValueError(f"Invalid weight on line {line_number} of the lexicon: {line}")
+    return lexicon
+
+
+class Classifier:
+    def __init__(self, lexicon, include_comments=None, comment_weight=None, threshold=None):
+        """
+        :param lexicon: dict {term: weight}, see load_lexicon
+        """
+        if ahocorasick is None:
+            raise ImportError("The classifier needs the pyahocorasick package: pip install pyahocorasick")
+        if not lexicon:
+            raise ValueError("The lexicon is empty")
+        self.include_comments = config.classify_include_comments if include_comments is None else include_comments
+        self.comment_weight = config.classify_comment_weight if comment_weight is None else comment_weight
+        self.threshold = config.classify_threshold if threshold is None else threshold
+        self.lexicon = lexicon
+        self.automaton = ahocorasick.Automaton()
+        for term, weight in lexicon.items():
+            self.automaton.add_word(term, (term, weight))
+        self.automaton.make_automaton()
+        settings = [sorted(lexicon.items()), self.include_comments, self.comment_weight, self.threshold]
+        self.lexicon_hash = hashlib.sha1(json.dumps(settings, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    def matches(self, text):
+        """
+        :return: dict {matched term: weight}
+        """
+        if not text:
+            return {}
+        return dict(value for _, value in self.automaton.iter(text.lower()))
+
+    def score(self, content, comments=None):
+        """
+        :return: (sorted matched terms, score, related)
+        """
+        matched = self.matches(content)
+        score = sum(matched.values())
+        if self.include_comments:
+            comment_matches = self.matches(search_index.comments_text(comments))
+            score += sum(weight * self.comment_weight for term, weight in comment_matches.items() if term not in matched)
+            matched.update(comment_matches)
+        return sorted(matched), score, score >= self.threshold
+
+
+def classify_posts(conn, classifier, table_name=None, chunk_size=None, rescore_all=False):
+    """
+    Score the posts that are unscored, updated since they were scored, or scored with another lexicon
+    :param rescore_all: score every post
+    :return: (number of scored posts, number of related posts among them)
+    """
+    table_name = table_name or config.table_name
+    chunk_size = chunk_size or config.export_chunk_size
+    utils.ensure_columns(conn, table_name, CLASSIFIER_COLUMNS)
+
+    pending = "1 = 1" if rescore_all else (
+        "(lexicon_hash IS NOT ? OR classified_at IS NULL OR updated_at > classified_at)"
+    )
+    params = [] if rescore_all else [classifier.lexicon_hash]
+    last_id = 0
+    scored = 0
+    related = 0
+    while True:
+        rows = conn.execute(
+            f"SELECT id, content, comments FROM {table_name} WHERE id > ? AND {pending} ORDER BY id LIMIT ?",
+            [last_id] + params + [chunk_size],
+        ).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        now = datetime.now().isoformat(sep=" ", timespec="microseconds")
+        updates = []
+        for row_id, content, comments in rows:
+            terms, score, is_related = classifier.score(content, comments)
+            related += is_related
+            updates.append(
+                ("1" if is_related else "0", json.dumps(terms, ensure_ascii=False), score,
+                 classifier.lexicon_hash, now, row_id)
+            )
+        conn.executemany(
+            f"""
+            UPDATE {table_name} SET is_agriculture_related = ?, agriculture_terms = ?, agriculture_score = ?,
+                lexicon_hash = ?, classified_at = ?
+            WHERE id = ?""",
+            updates,
+        )
+        conn.commit()
+        scored += len(rows)
+        logger.info(f"Classification: processed up to id {last_id}, {scored} rows scored")
+    return scored, related
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fill is_agriculture_related from the keyword lexicon")
+    parser.add_argument("--lexicon", default=None, help="lexicon file, default config.lexicon_path")
+    parser.add_argument("--all", action="store_true", help="re-score every post, not only the pending ones")
+    parser.add_argument("--chunk-size", type=int, default=None)
+    args = parser.parse_args()
+
+    lexicon = load_lexicon(args.lexicon)
+    classifier = Classifier(lexicon)
+    logger.info(f"Loaded {len(lexicon)} lexicon terms, hash {classifier.lexicon_hash[:12]}")
+    conn = sqlite3.connect(config.db_name)
+    logger.info(f"connect to database successful: {config.db_name}")
+    utils.create_table(conn, config.table_name)
+    scored, related = classify_posts(conn, classifier, chunk_size=args.chunk_size, rescore_all=args.all)
+    conn.close()
+    logger.info(f"✅ Classified {scored} posts, {related} agriculture related")
@@ -0,0 +1,379 @@
+"""
+Comment text parsers for Weixin, Weibo and Douyin.
+
+All patterns are compiled once at import time and each parser walks its input
+in a single pass. Relative times ('2天前', '3小时前', ...) are resolved against
+one `now` anchor per call, so every comment of a run shares the same reference time.
+"""
+import re
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, List
+from logging_config import get_logger
+
+logger = get_logger()
+
+# ---------------------------------------------------------------------------
+# Relative date/time helpers
+# ---------------------------------------------------------------------------
+
+_DAYS_AGO_RE = re.compile(r'(\d+)\s*天前')
+_HOURS_RE = re.compile(r'(\d+)\s*小时')
+_MINUTES_RE = re.compile(r'(\d+)\s*分')
+_EXPLICIT_DATE_FORMATS = ("%Y-%m-%d", "%Y/%m/%d", "%Y.%m.%d")
+
+_REL_YEARS_RE = re.compile(r'(\d+)\s*年前')
+_REL_MONTHS_RE = re.compile(r'(\d+)\s*月前')
+_REL_WEEKS_RE = re.compile(r'(\d+)\s*(?:周|星期)前')
+_REL_DAYS_RE = re.compile(r'(\d+)\s*天前')
+_REL_HOURS_RE = re.compile(r'(\d+)\s*小时前')
+_REL_MINUTES_RE = re.compile(r'(\d+)\s*分钟前')
+# checked in order, first match wins
+_REL_TIME_UNITS = (
+    (_REL_YEARS_RE, lambda n: timedelta(days=n * 365)),
+    (_REL_MONTHS_RE, lambda n: timedelta(days=n * 30)),
+    (_REL_WEEKS_RE, lambda n: timedelta(weeks=n)),
+    (_REL_DAYS_RE, lambda n: timedelta(days=n)),
+    (_REL_HOURS_RE, lambda n: timedelta(hours=n)),
+    (_REL_MINUTES_RE, lambda n: timedelta(minutes=n)),
+)
+
+
+@lru_cache(maxsize=1024)
+def _explicit_date(s: str):
+    """Parse 'YYYY-MM-DD' / 'YYYY/MM/DD' / 'YYYY.MM.DD' to an ISO date, or None."""
+    for fmt in _EXPLICIT_DATE_FORMATS:
+        try:
+            return datetime.strptime(s, fmt).date().isoformat()
+        except ValueError:
+            pass
+    return None
+
+
+def parse_relative_date(time_str: str, now: datetime | None = None) -> str:
+    """Convert relative time strings like '2天前', '昨天', '4小时前', '41分钟前' to 'YYYY-MM-DD'."""
+    now = now or datetime.now()
+    s = time_str.strip()
+    if not s:
+        return now.date().isoformat()
+    m = _DAYS_AGO_RE.search(s)
+    if m:
+        return (now - timedelta(days=int(m.group(1)))).date().isoformat()
+    if '昨天' in s:
+        return (now - timedelta(days=1)).date().isoformat()
+    m = _HOURS_RE.search(s)
+    if m:
+        # keep same day unless crosses midnight; produce date only
+        return (now - timedelta(hours=int(m.group(1)))).date().isoformat()
+    m = _MINUTES_RE.search(s)
+    if m:
+        return (now - timedelta(minutes=int(m.group(1)))).date().isoformat()
+    if '今天' in s or '刚刚' in s:
+        return now.date().isoformat()
+    # try parse explicit date formats (YYYY-MM-DD, YYYY/MM/DD, etc.)
+    # fallback: today's date
+    return _explicit_date(s) or now.date().isoformat()
+
+
+def parse_relative_time(time_str: str, now: datetime | None = None) -> str:
+    """
+    Convert relative time strings like '2年前·天津', '1月前', '3天前', '2周前' to 'YYYY-MM-DD 00:00:00'
+    """
+    now = now or datetime.now()
+    # Drop location if present (after ·)
+    s = time_str.strip().split("·")[0].strip()
+
+    for pattern, delta in _REL_TIME_UNITS:
+        m = pattern.search(s)
+        if m:
+            return (now - delta(int(m.group(1)))).strftime("%Y-%m-%d 00:00:00")
+
+    # Default to today
+    return now.strftime("%Y-%m-%d 00:00:00")
+
+
+# ---------------------------------------------------------------------------
+# Weixin
+# ---------------------------------------------------------------------------
+
+_WECHAT_SECTION_RE = re.compile(r'^\s*\d+\s*comment', re.I)
+_WECHAT_TIME_RE = re.compile(
+    r'^(?:\d+\s*天前|\d+\s*小时前|\d+\s*小时|\d+\s*分钟前|昨天|今天|刚刚|\d{4}[-/\.]\d{1,2}[-/\.]\d{1,2})$'
+)
+_DIGITS_RE = re.compile(r'\d+')
+_REPLY_COUNT_RE = re.compile(r'\d+条回复')
+
+
+def parse_wechat_comments(text: str, now: datetime | None = None) -> List[Dict]:
+    """
+    Extract comment blocks from Weixin article text (text extracted from UI).
+    Handles patterns like:
+      username
+      location (optional)
+      time (e.g. '2天前' / '昨天' / '41分钟前' / explicit date)
+      optional likes (a number on the next line)
+      content (one or more lines)
+    Returns list of dicts:
+      {'username': ..., 'content': ..., 'time': 'YYYY-MM-DD', 'likes': '10'}
+    """
+    if not text:
+        return []
+    now = now or datetime.now()
+
+    # Single pass: every line is classified once. Lines before the first
+    # comments-section header are discarded when the header is seen.
+    lines: List[str] = []
+    kinds: List[int] = []  # 0 = text, 1 = time, 2 = digits
+    time_indices: List[int] = []
+    section_found = False
+    for raw in text.splitlines():
+        ln = raw.strip()
+        if not section_found:
+            low = ln.lower()
+            if _WECHAT_SECTION_RE.match(ln) or low == "comment" or low == "comments":
+                section_found = True
+                lines.clear()
+                kinds.clear()
+                time_indices.clear()
+                continue
+        if ln == "":
+            continue
+        if _WECHAT_TIME_RE.match(ln):
+            time_indices.append(len(lines))
+            kinds.append(1)
+        elif _DIGITS_RE.fullmatch(ln):
+            kinds.append(2)
+        else:
+            kinds.append(0)
+        lines.append(ln)
+
+    comments = []
+    total = len(lines)
+    for idx_pos, t_idx in enumerate(time_indices):
+        # username: usually two lines above time (username, location, time)
+        username = "Unknown"
+        if t_idx >= 2:
+            username = lines[t_idx - 2]
+        else:
+            # fallback: previous non-time non-numeric line
+            j = t_idx - 1
+            while j >= 0 and kinds[j] != 0:
+                j -= 1
+            if j >= 0:
+                username = lines[j]
+
+        # likes: next line after time that is purely digits
+        likes = "0"
+        content_start = t_idx + 1
+        if content_start < total and kinds[content_start] == 2:
+            likes = lines[content_start]
+            content_start += 1
+
+        # content ends before the next comment's username (next time index - 2) or EOF
+        if idx_pos + 1 < len(time_indices):
+            content_end = max(content_start, time_indices[idx_pos + 1] - 2)
+        else:
+            content_end = total
+
+        # filter out reply-count lines like '20条回复'
+        content = "\n".join(
+            ln for ln in lines[content_start:content_end] if not _REPLY_COUNT_RE.search(ln)
+        ).strip()
+
+        comments.append({
+            "username": username,
+            "content": content,
+            "time": parse_relative_date(lines[t_idx], now),
+            "likes": likes,
+        })
+
+    return comments
+
+
+# ---------------------------------------------------------------------------
+# Weibo
+# ---------------------------------------------------------------------------
+
+_WEIBO_LINE_RE = re.compile(
+    r"""^['"]?                       # optional leading quote
+         (?P<username>[^:：]+?)      # username (up to colon)
+         [:：]\s*                    # colon separator
+         (?P<content>.*?)\s+        # content (lazy) then whitespace before date
+         (?P<date>\d{2,4}[-/\.]\d{1,2}[-/\.]\d{1,2})  # date (yy-mm-dd or yyyy-mm-dd)
+         (?:\s+(?P<time>\d{1,2}:\d{2}))?              # optional hh:mm
+         (?:\s+(?P<likes>\d+))?      # optional likes number
+         ['"]?\s*$                   # optional trailing quote and end
+    """,
+    re.VERBOSE,
+)
+_WEIBO_CLOCK_RE = re.compile(r'\d{1,2}:\d{2}')
+_WEIBO_DATE_RE = re.compile(r'\d{2,4}[-/\.]\d{1,2}[-/\.]\d{1,2}')
+_WEIBO_DATE_FORMATS = ("%y-%m-%d", "%Y-%m-%d", "%y/%m/%d", "%Y/%m/%d", "%y.%m.%d", "%Y.%m.%d")
+
+
+@lru_cache(maxsize=1024)
+def _weibo_date(date_part: str):
+    """Normalize a weibo date token to 'YYYY-MM-DD', or None if it can't be parsed."""
+    for fmt in _WEIBO_DATE_FORMATS:
+        try:
+            return datetime.strptime(date_part, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    # fallback: try to extract numbers and build date, two-digit year => 2000s
+    digits = _DIGITS_RE.findall(date_part)
+    if len(digits) >= 3:
+        y, mth, d = int(digits[0]), int(digits[1]), int(digits[2])
+        if y < 100:
+            y += 2000
+        try:
+            return datetime(year=y, month=mth, day=d).strftime("%Y-%m-%d")
+        except ValueError:
+            return None
+    return None
+
+
+@lru_cache(maxsize=1024)
+def _weibo_fallback_date(date_str: str):
+    for fmt in ("%y-%m-%d", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(date_str, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    return None
+
+
+def parse_weibo_comments(text: str, now: datetime | None = None) -> List[Dict[str, str]]:
+    """
+    Read text (one comment per line) and extract comments into list of dicts:
+    {
+      'username': "用户A",
+      'content': "test",
+      'time': "YYYY-MM-DD 00:00:00",
+      'likes': '10'
+    }
+    """
+    comments: List[Dict[str, str]] = []
+    if not text:
+        return comments
+    now = now or datetime.now()
+    today = now.strftime("%Y-%m-%d")
+
+    for raw in text.splitlines():
+        s = raw.strip()
+        if not s:
+            continue
+        m = _WEIBO_LINE_RE.match(s)
+        if m:
+            # ignore captured hh:mm and use midnight
+            date = _weibo_date(m.group("date").strip()) or today
+            comments.append({
+                "username": m.group("username").strip(),
+                "content": m.group("content").strip(),
+                "time": date + " 00:00:00",
+                "likes": m.group("likes") or "0",
+            })
+            continue
+
+        # simpler fallback: split by last tokens (date time likes)
+        parts = s.strip("'\" ").rsplit(maxsplit=3)
+        if len(parts) < 2:
+            continue
+        if (len(parts) >= 3 and _WEIBO_CLOCK_RE.match(parts[-2])) or _WEIBO_DATE_RE.match(parts[-2]):
+            # best-effort parse
+            username, rest = (parts[0].split(":", 1) + [""])[:2]
+            date_token = parts[-3] if len(parts) >= 3 else parts[-2]
+            likes = parts[-1] if parts[-1].isdigit() else "0"
+            date = _weibo_fallback_date(date_token) or today
+            comments.append({
+                "username": username.strip(),
+                "content": rest.strip(),
+                "time": date + " 00:00:00",
+                "likes": likes,
+            })
+
+    return comments
+
+
+# ---------------------------------------------------------------------------
+# Douyin
+# ---------------------------------------------------------------------------
+
+_DOUYIN_NOISE_LINES = frozenset(("...", "分享", "回复", "展开1条回复"))
+_DOUYIN_REL_TIME_RE = re.compile(r'年前|月前|天前|小时前|分钟前|周前')
+
+
+def parse_douyin_comment(entry, now: datetime | None = None):
+    """
+    Parse one Douyin comment element text:
+    'username\\n...\\ncontent\\nrelative_time·location\\n\\nlikes\\n\\n分享\\n回复'
+    Returns a dict or None when the entry doesn't look like a comment.
+    """
+    entry = str(entry).strip()
+    if not entry or entry == "'":
+        return None
+    now = now or datetime.now()
+
+    # Remove surrounding quotes, keep meaningful lines only
+    username = None
+    content = None
+    time_line = None
+    likes = None
+    count = 0
+    for ln in entry.strip("'\"").split("\n"):
+        ln = ln.strip()
+        if not ln or ln in _DOUYIN_NOISE_LINES:
+            continue
+        count += 1
+        if count == 1:
+            username = ln
+        elif count == 2:
+            content = ln
+        if time_line is None and _DOUYIN_REL_TIME_RE.search(ln):
+            time_line = ln
+        if likes is None and ln.isdigit():
+            likes = ln
+
+    if count < 2:
+        return None
+
+    # the time line sits where content is expected when the comment has no text
+    if _DOUYIN_REL_TIME_RE.search(content):
+        content = ""
+
+    return {
+        "username": username,
+        "content": content,
+        "time": parse_relative_time(time_line, now) if time_line else now.strftime("%Y-%m-%d 00:00:00"),
+        "likes": likes or "0",
+    }
+
+
+def parse_douyin_comments(text, now: datetime | None = None) -> List[Dict[str, str]]:
+    """
+    Extract comments from a list of comment element texts, or from a string
+    with one comment per line.
+
+    Returns list of dicts:
+    {
+      'username': "魏哥",
+      'content': "为您加油",
+      'time': "2024-11-27 00:00:00",
+      'likes': '12'
+    }
+    """
+    now = now or datetime.now()
+    if isinstance(text, list):
+        entries = text
+    else:
+        entries = [line.strip() for line in text.split('\n') if line.strip()]
+
+    comments: List[Dict[str, str]] = []
+    for entry in entries:
+        try:
+            comment = parse_douyin_comment(entry, now)
+        except Exception as e:
+            logger.error(f"Error parsing entry: {e}")
+            continue
+        if comment:
+            comments.append(comment)
+    return comments
@@ -19,4 +19,99 @@ wechat_article_link = "http://mp.weixin.qq.com/s?__biz=MjM5ODQ4MTQ1OA==&mid=2651
 tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
 
 # Export Excel path
-export_excel_path = "data.xlsx"
\ No newline at end of file
+export_excel_path = "data.xlsx"
+
+# Rows fetched per chunk when streaming the Excel export
+export_chunk_size = 5000
+
+# Parquet export directory (partitioned by platform and publication month)
+export_parquet_dir = "data_parquet"
+# Rows per record batch when streaming the Parquet export
+export_parquet_batch_size = 10000
+
+# Incremental Excel export directory (one delta workbook per run)
+export_delta_dir = "exports"
+
+# Job queue (SQLite) for multi-worker crawling
+queue_db_name = 'queue.db'
+queue_lease_seconds = 600  # a leased job returns to the queue if not acked within this time
+queue_max_attempts = 3
+queue_retry_delay = 60  # seconds, multiplied by the job's attempt count
+queue_poll_seconds = 5  # idle workers re-check the queue at this interval
+
+# Run metrics report (stage latencies, success/failure counters)
+metrics_json_path = 'run_metrics.json'
+# Prometheus textfile for the node exporter, e.g. '/var/lib/node_exporter/textfile_collector/scraper.prom'
+metrics_prometheus_path = None
+
+# Fixed page waits of the scrapers (milliseconds), lowered by the offline benchmarks
+page_load_wait_ms = 5000  # after page.goto, before locating elements
+comment_wait_ms = 1000  # before scrolling the comment section (weibo)
+scroll_wait_ms = 2000  # after each scroll that loads more comments
+
+# HAR record/replay of the scrapers' network traffic: None (live), 'record' or 'replay'
+har_mode = None
+har_dir = 'har'  # archives are stored as har/<platform>/<url hash>.zip
+
+# Logging (JSON lines in the log file, written by a background thread)
+log_file_path = 'app.log'
+log_max_message_chars = 2000  # longer messages (e.g. whole article content or comments JSON) are truncated
+
+# Saved cookies/localStorage per platform (browser_state/<platform>.json), keep this directory private
+browser_state_dir = 'browser_state'
+login_wait_ms = 50000  # time for a manual login when the saved session has expired
+login_refresh_interval_seconds = 600  # after a login wait, urls finding the session expired fail fast for this long
+login_dismiss_timeout_ms = 5000  # wait for the Douyin login banner to dismiss, skipped when absent
+
+# Raw page snapshots (rendered HTML + API JSON, zstd) for re-extraction without network, see reextract.py
+snapshot_enabled = False
+snapshot_dir = 'snapshots'
+
+# SQLite FTS5 full-text index over posts (CJK bigrams), kept in sync by utils.insert_data
+fts_enabled = True
+fts_index_comments = True
+
+# Word segmentation stage (segmentation.py): rows read and updated per chunk
+segment_chunk_size = 5000
+
+# Keyword classification stage (classifier.py) filling is_agriculture_related
+lexicon_path = 'agriculture_lexicon.txt'  # one term per line, optional tab-separated weight
+classify_threshold = 2.0  # minimum score of an agriculture related post
+classify_include_comments = True
+classify_comment_weight = 0.5  # comment matches count half
+
+# Append the counts of every scrape to the metric_snapshots history (metric_history.py)
+metric_history_enabled = True
+
+# Refresh planner (refresh_planner.py): re-scrape budget and engagement velocity model
+refresh_budget = 2000  # fetches per plan
+refresh_min_interval_minutes = 30  # posts scraped more recently are not planned
+refresh_decay_exponent = 1.0  # engagement velocity decays as age^-k
+refresh_metric_weights = {"likes": 1, "shares": 2, "comments": 2, "favorites": 1}
+
+# Near-duplicate clusters of post content (near_duplicates.py), kept up to date by utils.insert_data
+near_duplicates_enabled = True
+simhash_max_distance = 4  # fingerprints differing in at most this many bits are near-duplicates
+
+# Deadline of one url scrape (seconds, includes the login wait), the scrape is cancelled after it
+url_timeout_seconds = 180
+# Bound of each browser/context close; a browser that doesn't close in time is killed
+browser_close_timeout_seconds = 10
+
+# Page reuse (page_pool.py): main.py keeps one browser per worker and one context/page per platform
+page_reuse_enabled = True
+page_max_navigations = 50  # urls scraped in one page before its context is recycled
+page_max_js_heap_mb = 512  # recycle a page whose JS heap is larger after a url
+browser_max_rss_mb = 1500  # relaunch the browser when its processes together use more
+
+# Library API (scrape_api.scrape_many): urls scraped at a time in one event loop
+scrape_concurrency = 4
+
+# HTTP scrape service (scrape_service.py)
+service_host = "127.0.0.1"
+service_port = 8700
+service_cache_ttl_seconds = 300  # scraped posts are served from memory for this long, 0 disables the cache
+service_cache_max_size = 10000
+service_max_batch = 100  # urls per request
+service_max_jobs = 1000  # finished jobs kept for GET /jobs/<job_id>
+service_save_results = False  # also upsert the scraped posts into db_name
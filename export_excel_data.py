@@ -1,64 +1,250 @@
+import argparse
+import os
 import sqlite3
+from datetime import datetime
 import pandas as pd
+from openpyxl import Workbook
 import config
 
+# Excel hard limit is 1,048,576 rows per sheet (including the header row)
+EXCEL_MAX_ROWS = 1_048_576
+
+# Bookkeeping tables that are not scraped data
+SKIP_TABLES = {
+    "export_watermarks",
+    "metric_snapshots",  # metric_history.SNAPSHOT_TABLE
+    "simhash_bands",  # near_duplicates.BAND_TABLE
+    "segmentation_cache",  # segmentation.CACHE_TABLE
+}
+
+
+def _prepare_chunk(df, exclude_columns, column_mapping):
+    """
+    Apply column exclusion, numeric coercion and renaming to one chunk
+    """
+    # Exclude custome columns
+    cols_to_drop = [col for col in exclude_columns if col in df.columns]
+    if cols_to_drop:
+        df = df.drop(columns=cols_to_drop)
+
+    # Convert customed column to int
+    for col in ['like_count', 'shared_count', 'comment_count']:
+        if col in df.columns:
+            # Convert to NaN first, then to 0, finaly to int
+            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(int)
+
+    # Rename columns
+    df = df.rename(columns=column_mapping)
+
+    # openpyxl writes NaN literally, so turn missing values back into empty cells
+    return df.astype(object).where(df.notna(), None)
+
+
+def _write_chunks(workbook, sheet_title, chunks, exclude_columns, column_mapping):
+    """
+    Append DataFrame chunks to write-only sheets, rolling over to a new sheet when one is full.
+    Returns the number of rows written.
+    """
+    sheet = None
+    sheet_index = 1
+    sheet_rows = 0
+    header = None
+    total_rows = 0
+    # chunks come from pd.read_sql_query(chunksize=...), which steps the sqlite cursor with fetchmany
+    for df in chunks:
+        df = _prepare_chunk(df, exclude_columns, column_mapping)
+        if header is None:
+            header = list(df.columns)
+        for row in df.itertuples(index=False, name=None):
+            if sheet is None or sheet_rows >= EXCEL_MAX_ROWS:
+                # Roll over to a new sheet once the current one is full
+                title = sheet_title if sheet_index == 1 else f"{sheet_title}_{sheet_index}"
+                sheet = workbook.create_sheet(title=title[:31])
+                sheet.append(header)
+                sheet_rows = 1
+                sheet_index += 1
+            sheet.append(row)
+            sheet_rows += 1
+        total_rows += len(df)
+        print(f"  Exported {total_rows} rows from {sheet_title}")
+    return total_rows
+
+
+def _exported_tables(conn):
+    """
+    Tables holding scraped data: bookkeeping tables, SQLite's own tables, virtual tables
+    (the FTS index) and their shadow tables are left out
+    """
+    tables = conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'table'").fetchall()
+    virtual = [name for name, sql in tables if (sql or "").lstrip().upper().startswith("CREATE VIRTUAL TABLE")]
+    return [
+        name for name, _ in tables
+        if name not in SKIP_TABLES
+        and not name.startswith("sqlite_")
+        and not any(name == table or name.startswith(f"{table}_") for table in virtual)
+    ]
+
 
 def sqlite_to_excel_unnamed_first(
-    db_path, excel_path, column_mapping=None, exclude_columns=None
+    db_path, excel_path, column_mapping=None, exclude_columns=None, chunk_size=None
 ):
     """
-    Export SQLite table to Excel
+    Export SQLite table to Excel.
+    Rows are streamed from the database in chunks and written with openpyxl's
+    write-only mode, so memory stays flat regardless of table size.
     :param db_path: SQLite database path
     :param excel_path: Export Excel path
     :param column_mapping: dict，columns mapping {"like_count": "Like"}
     :param exclude_columns: list， Exclude columns，such as ["id"]
+    :param chunk_size: int, rows fetched from the database per chunk
     """
     if exclude_columns is None:
         exclude_columns = ["id"]
     if column_mapping is None:
         column_mapping = {}
+    if chunk_size is None:
+        chunk_size = config.export_chunk_size
 
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
 
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-    table_names = [table[0] for table in cursor.fetchall()]
+    table_names = _exported_tables(conn)
 
     if not table_names:
         print("❌ No database tables")
+        conn.close()
         return
 
-    with pd.ExcelWriter(excel_path, engine="openpyxl") as writer:
-        for table_name in table_names:
-            print(f"Processing table: {table_name}")
-            df = pd.read_sql_query(f"SELECT * FROM `{table_name}`", conn)
+    workbook = Workbook(write_only=True)
+    for table_name in table_names:
+        print(f"Processing table: {table_name}")
+        cursor.execute(f"SELECT EXISTS(SELECT 1 FROM `{table_name}`)")
+        if not cursor.fetchone()[0]:
+            print(f"  ⚠️ Table {table_name} is empty, skip")
+            continue
 
-            if df.empty:
-                print(f"  ⚠️ Table {table_name} is empty, skip")
-                continue
+        chunks = pd.read_sql_query(f"SELECT * FROM `{table_name}`", conn, chunksize=chunk_size)
+        _write_chunks(workbook, table_name, chunks, exclude_columns, column_mapping)
 
-            # Exclude custome columns
-            cols_to_drop = [col for col in exclude_columns if col in df.columns]
-            if cols_to_drop:
-                df = df.drop(columns=cols_to_drop)
+    if not workbook.worksheets:
+        # openpyxl can't save a workbook without sheets
+        workbook.create_sheet(title="empty")
+    workbook.save(excel_path)
 
-            # Convert customed column to int
-            for col in ['like_count', 'shared_count', 'comment_count']:
-                if col in df.columns:
-                    # Convert to NaN first, then to 0, finaly to int
-                    df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(int)
+    conn.close()
+    print(f"✅ Done! Export excel path: {excel_path}")
 
-            # Rename columns
-            df = df.rename(columns=column_mapping)
 
-            # Export to Excel
-            df.to_excel(writer, sheet_name=table_name, index=False)
+def _ensure_watermark_table(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS export_watermarks (
+            name TEXT PRIMARY KEY,
+            high_water TEXT,
+            exported_at TEXT
+        )
+    """
+    )
+    conn.commit()
 
-    conn.close()
-    print(f"✅ Done! Export excel path: {excel_path}")
+
+def sqlite_to_excel_incremental(
+    db_path, delta_dir, table_name=None, column_mapping=None, exclude_columns=None, chunk_size=None
+):
+    """
+    Export only the rows inserted or changed since the previous incremental export.
+    The high-water mark (largest exported `updated_at`) is kept in the `export_watermarks`
+    table, so each run reads just the delta through the `updated_at` index.
+    The first run has no watermark and exports every row; when no row has an `updated_at`
+    (legacy rows) the watermark is '', so later runs skip them and export any row written since.
+    The watermark and the rows are read from one snapshot, so a row committed during the
+    export is left for the next run rather than skipped.
+    :param db_path: SQLite database path
+    :param delta_dir: Directory for delta workbooks, one `<table>_delta_<timestamp>.xlsx` per run
+    :param table_name: Exported table, default config.table_name
+    :return: Path of the written delta workbook, or None when nothing changed
+    """
+    table_name = table_name or config.table_name
+    if exclude_columns is None:
+        exclude_columns = ["id"]
+    if column_mapping is None:
+        column_mapping = {}
+    if chunk_size is None:
+        chunk_size = config.export_chunk_size
+
+    conn = sqlite3.connect(db_path)
+    try:
+        _ensure_watermark_table(conn)
+        # one read transaction: the bound and the exported rows come from the same snapshot
+        conn.execute("BEGIN")
+        row = conn.execute(
+            "SELECT high_water FROM export_watermarks WHERE name = ?", (table_name,)
+        ).fetchone()
+        high_water = row[0] if row else None
+
+        if high_water is None:
+            print(f"No watermark for {table_name}, exporting all rows")
+            where, params = "", ()
+            # '' sorts before every timestamp, a NULL watermark would mean a full export every run
+            new_high_water = conn.execute(f"SELECT MAX(updated_at) FROM `{table_name}`").fetchone()[0] or ""
+        else:
+            print(f"Exporting {table_name} rows changed after {high_water or 'the previous export'}")
+            where, params = "WHERE updated_at > ?", (high_water,)
+            new_high_water = conn.execute(
+                f"SELECT MAX(updated_at) FROM `{table_name}` WHERE updated_at > ?", params
+            ).fetchone()[0]
+            if new_high_water is None:
+                print(f"✅ No changes in {table_name} since last export")
+                return None
+
+        # Rows committed after the snapshot are left for the next run
+        if where:
+            where += " AND updated_at <= ?"
+        else:
+            where = "WHERE updated_at IS NULL OR updated_at <= ?"
+        params += (new_high_water,)
+
+        os.makedirs(delta_dir, exist_ok=True)
+        excel_path = os.path.join(
+            delta_dir, f"{table_name}_delta_{datetime.now().strftime('%Y%m%d%H%M%S')}.xlsx"
+        )
+        workbook = Workbook(write_only=True)
+        chunks = pd.read_sql_query(
+            f"SELECT * FROM `{table_name}` {where} ORDER BY updated_at", conn,
+            params=params, chunksize=chunk_size,
+        )
+        total_rows = _write_chunks(workbook, table_name, chunks, exclude_columns, column_mapping)
+        if not total_rows:
+            print(f"✅ No rows to export in {table_name}")
+            return None
+        workbook.save(excel_path)
+        # end the read transaction, writing in it could fail once other writers moved on
+        conn.commit()
+
+        # Only move the watermark once the delta file is safely written
+        conn.execute(
+            """
+            INSERT INTO export_watermarks (name, high_water, exported_at) VALUES (?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET
+                high_water = excluded.high_water,
+                exported_at = excluded.exported_at""",
+            (table_name, new_high_water, datetime.now().isoformat(sep=" ", timespec="seconds")),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"✅ Done! Exported {total_rows} changed rows to: {excel_path}")
+    return excel_path
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export scraped data to Excel")
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="export only rows inserted or changed since the previous incremental export",
+    )
+    args = parser.parse_args()
+
     custom_columns = {
         "unnamed": "Unnamed: 0",
         "user_name": "User.name",
@@ -73,11 +259,21 @@ if __name__ == "__main__":
         "is_agriculture_related": "is_agriculture_related",
         "index_number": "No.",
         "comments": "Comments",
+        "created_at": "Created.at",
+        "updated_at": "Updated.at",
     }
 
-    sqlite_to_excel_unnamed_first(
-        db_path=config.db_name,
-        excel_path=config.export_excel_path,
-        column_mapping=custom_columns,
-        exclude_columns=["id"],
-    )
+    if args.incremental:
+        sqlite_to_excel_incremental(
+            db_path=config.db_name,
+            delta_dir=config.export_delta_dir,
+            column_mapping=custom_columns,
+            exclude_columns=["id"],
+        )
+    else:
+        sqlite_to_excel_unnamed_first(
+            db_path=config.db_name,
+            excel_path=config.export_excel_path,
+            column_mapping=custom_columns,
+            exclude_columns=["id"],
+        )
@@ -0,0 +1,180 @@
+import json
+import sqlite3
+from datetime import datetime
+import pyarrow as pa
+import pyarrow.dataset as ds
+import config
+from utils import chinese_unit_to_number, platform_from_url
+
+POSTS_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("unnamed", pa.string()),
+    ("user_name", pa.string()),
+    ("publication_date", pa.timestamp("s")),
+    ("content", pa.string()),
+    ("shared_count", pa.int64()),
+    ("comment_count", pa.int64()),
+    ("like_count", pa.int64()),
+    ("link1", pa.string()),
+    ("link2", pa.string()),
+    ("content_segmented", pa.string()),
+    ("is_agriculture_related", pa.string()),
+    ("index_number", pa.string()),
+    ("platform", pa.string()),
+    ("month", pa.string()),
+])
+
+COMMENTS_SCHEMA = pa.schema([
+    ("post_id", pa.int64()),
+    ("link1", pa.string()),
+    ("comment_index", pa.int32()),
+    ("username", pa.string()),
+    ("content", pa.string()),
+    ("time", pa.timestamp("s")),
+    ("likes", pa.int64()),
+    ("platform", pa.string()),
+    ("month", pa.string()),
+])
+
+PARTITIONING = ds.partitioning(
+    pa.schema([("platform", pa.string()), ("month", pa.string())]), flavor="hive"
+)
+
+POST_COLUMNS = [
+    "id", "unnamed", "user_name", "publication_date", "content",
+    "shared_count", "comment_count", "like_count", "link1", "link2",
+    "content_segmented", "is_agriculture_related", "index_number",
+]
+
+
+def _to_int(value):
+    """
+    Coerce a stored count to int, including the scraped forms "1.2万", "3k", "10w+" and "1,234";
+    missing or unparsable values become 0
+    """
+    if value is None:
+        return 0
+    if isinstance(value, (int, float)):
+        return int(value)
+    try:
+        return int(chinese_unit_to_number(str(value).strip().rstrip("+").replace(",", "")))
+    except ValueError:
+        return 0
+
+
+def _to_datetime(value):
+    """
+    Parse the date formats written by the scrapers, unknown formats become null
+    """
+    if not value:
+        return None
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(str(value).strip(), fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def _month_of(dt):
+    return dt.strftime("%Y-%m") if dt else "unknown"
+
+
+def _iter_post_rows(conn, table_name, batch_size):
+    """
+    Yield lists of post rows as dicts, fetched from the cursor in batches
+    """
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT {', '.join(POST_COLUMNS)}, comments FROM `{table_name}`")
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        yield [dict(zip(POST_COLUMNS + ["comments"], row)) for row in rows]
+
+
+def _post_batches(conn, table_name, batch_size):
+    for rows in _iter_post_rows(conn, table_name, batch_size):
+        columns = {name: [] for name in POSTS_SCHEMA.names}
+        for row in rows:
+            published = _to_datetime(row["publication_date"])
+            for name in POST_COLUMNS:
+                columns[name].append(row[name])
+            columns["publication_date"][-1] = published
+            for name in ("shared_count", "comment_count", "like_count"):
+                columns[name][-1] = _to_int(row[name])
+            columns["platform"].append(platform_from_url(row["link1"]))
+            columns["month"].append(_month_of(published))
+        yield pa.RecordBatch.from_pydict(columns, schema=POSTS_SCHEMA)
+
+
+def _comment_batches(conn, table_name, batch_size):
+    for rows in _iter_post_rows(conn, table_name, batch_size):
+        columns = {name: [] for name in COMMENTS_SCHEMA.names}
+        for row in rows:
+            if not row["comments"]:
+                continue
+            try:
+                comments = json.loads(row["comments"])
+            except (TypeError, ValueError):
+                continue
+            if not isinstance(comments, list):
+                continue
+            platform = platform_from_url(row["link1"])
+            month = _month_of(_to_datetime(row["publication_date"]))
+            for idx, comment in enumerate(comments):
+                if not isinstance(comment, dict):
+                    continue
+                columns["post_id"].append(row["id"])
+                columns["link1"].append(row["link1"])
+                columns["comment_index"].append(idx)
+                columns["username"].append(comment.get("username"))
+                columns["content"].append(comment.get("content"))
+                columns["time"].append(_to_datetime(comment.get("time")))
+                columns["likes"].append(_to_int(comment.get("likes")))
+                columns["platform"].append(platform)
+                columns["month"].append(month)
+        if columns["post_id"]:
+            yield pa.RecordBatch.from_pydict(columns, schema=COMMENTS_SCHEMA)
+
+
+def sqlite_to_parquet(db_path, output_dir, table_name=None, batch_size=None):
+    """
+    Export posts and their exploded comments to Parquet datasets.
+    Output layout (hive partitioning, one directory per platform and publication month):
+      <output_dir>/posts/platform=douyin/month=2024-05/part-0.parquet
+      <output_dir>/comments/platform=douyin/month=2024-05/part-0.parquet
+    :param db_path: SQLite database path
+    :param output_dir: Export directory
+    :param table_name: Posts table name, default config.table_name
+    :param batch_size: Rows per record batch, default config.export_parquet_batch_size
+    """
+    table_name = table_name or config.table_name
+    batch_size = batch_size or config.export_parquet_batch_size
+
+    # pyarrow pulls the batch generators from its own thread, only one thread uses the connection at a time
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    try:
+        for name, schema, batches in (
+            ("posts", POSTS_SCHEMA, _post_batches(conn, table_name, batch_size)),
+            ("comments", COMMENTS_SCHEMA, _comment_batches(conn, table_name, batch_size)),
+        ):
+            print(f"Processing dataset: {name}")
+            ds.write_dataset(
+                batches,
+                f"{output_dir}/{name}",
+                schema=schema,
+                format="parquet",
+                partitioning=PARTITIONING,
+                existing_data_behavior="delete_matching",
+            )
+    finally:
+        conn.close()
+    print(f"✅ Done! Export parquet path: {output_dir}")
+
+
+if __name__ == "__main__":
+    sqlite_to_parquet(
+        db_path=config.db_name,
+        output_dir=config.export_parquet_dir,
+    )
@@ -0,0 +1,222 @@
+"""
+Durable SQLite job queue with leases, so any number of worker processes can
+pull scraping work concurrently without an external broker.
+
+A job is leased to one worker until its lease expires. The worker acks it when
+done or nacks it on failure (retried with backoff until `max_attempts`).
+Leases of crashed workers expire and the jobs go back to the queue on the next lease call.
+
+    queue = JobQueue()
+    queue.enqueue(urls)
+    for job in queue.lease("worker-1"):
+        ...
+        queue.ack(job.id, "worker-1")
+"""
+import sqlite3
+import time
+from collections import namedtuple
+import config
+from logging_config import get_logger
+
+logger = get_logger()
+
+Job = namedtuple("Job", ["id", "url", "attempts"])
+
+QUEUED = "queued"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobQueue:
+    def __init__(self, db_path=None, lease_seconds=None, max_attempts=None, retry_delay=None):
+        """
+        :param db_path: queue database, default config.queue_db_name
+        :param lease_seconds: how long a leased job stays invisible to other workers
+        :param max_attempts: leases per job before it is marked failed
+        :param retry_delay: seconds before a nacked job is retried, multiplied by its attempts
+        """
+        self.db_path = db_path or config.queue_db_name
+        self.lease_seconds = lease_seconds or config.queue_lease_seconds
+        self.max_attempts = max_attempts or config.queue_max_attempts
+        self.retry_delay = config.queue_retry_delay if retry_delay is None else retry_delay
+        # autocommit mode, transactions are opened explicitly with BEGIN IMMEDIATE
+        self.conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self._create_table()
+
+    def _create_table(self):
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                url TEXT NOT NULL UNIQUE,
+                status TEXT NOT NULL DEFAULT 'queued',
+                priority INTEGER NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                available_at REAL NOT NULL DEFAULT 0,
+                lease_owner TEXT,
+                lease_expires_at REAL,
+                last_error TEXT,
+                created_at REAL,
+                updated_at REAL
+            )
+        """
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs (status, priority DESC, available_at, id)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_lease ON jobs (status, lease_expires_at)")
+
+    def close(self):
+        self.conn.close()
+
+    def enqueue(self, urls, priority=0, priorities=None):
+        """
+        Add urls to the queue. Finished or failed urls are queued again,
+        queued ones keep the higher of both priorities, leased ones are left alone.
+        :param priorities: dict {url: priority} overriding `priority` per url (see refresh_planner.py)
+        :return: number of jobs queued or re-queued
+        """
+        now = time.time()
+        priorities = priorities or {}
+        rows = [(url, priorities.get(url, priority), now, now) for url in urls]
+        cursor = self.conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            before = self.conn.total_changes
+            cursor.executemany(
+                """
+                INSERT INTO jobs (url, priority, created_at, updated_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    status = 'queued',
+                    priority = MAX(CASE WHEN jobs.status = 'queued' THEN jobs.priority ELSE excluded.priority END,
+                                   excluded.priority),
+                    attempts = CASE WHEN jobs.status = 'queued' THEN jobs.attempts ELSE 0 END,
+                    available_at = CASE WHEN jobs.status = 'queued' THEN jobs.available_at ELSE 0 END,
+                    last_error = CASE WHEN jobs.status = 'queued' THEN jobs.last_error ELSE NULL END,
+                    updated_at = excluded.updated_at
+                WHERE jobs.status != 'leased'""",
+                rows,
+            )
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+        count = self.conn.total_changes - before
+        logger.info(f"Enqueued {count} of {len(rows)} urls into {self.db_path}")
+        return count
+
+    def lease(self, worker_id, limit=1, lease_seconds=None):
+        """
+        Lease up to `limit` ready jobs for `worker_id`, highest priority first.
+        Expired leases are returned to the queue (or failed) first.
+        :return: list of Job
+        """
+        now = time.time()
+        expires_at = now + (lease_seconds or self.lease_seconds)
+        cursor = self.conn.cursor()
+        # IMMEDIATE takes the write lock up front, so two workers can't lease the same job
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.execute(
+                """
+                UPDATE jobs SET
+                    status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END,
+                    lease_owner = NULL,
+                    lease_expires_at = NULL,
+                    last_error = 'lease expired',
+                    updated_at = ?
+                WHERE status = 'leased' AND lease_expires_at < ?""",
+                (self.max_attempts, now, now),
+            )
+            if cursor.rowcount:
+                logger.info(f"Reclaimed {cursor.rowcount} expired leases")
+            cursor.execute(
+                """
+                SELECT id, url, attempts FROM jobs
+                WHERE status = 'queued' AND available_at <= ?
+                ORDER BY priority DESC, available_at, id
+                LIMIT ?""",
+                (now, limit),
+            )
+            jobs = [Job(row[0], row[1], row[2] + 1) for row in cursor.fetchall()]
+            cursor.executemany(
+                """
+                UPDATE jobs SET status = 'leased', attempts = attempts + 1,
+                    lease_owner = ?, lease_expires_at = ?, updated_at = ?
+                WHERE id = ?""",
+                [(worker_id, expires_at, now, job.id) for job in jobs],
+            )
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+        return jobs
+
+    def extend(self, job_id, worker_id, lease_seconds=None):
+        """
+        Push the lease expiry of a job still held by `worker_id` forward
+        """
+        cursor = self.conn.execute(
+            """
+            UPDATE jobs SET lease_expires_at = ?, updated_at = ?
+            WHERE id = ? AND status = 'leased' AND lease_owner = ?""",
+            (time.time() + (lease_seconds or self.lease_seconds), time.time(), job_id, worker_id),
+        )
+        return cursor.rowcount == 1
+
+    def ack(self, job_id, worker_id):
+        """
+        Mark a job leased by `worker_id` as done.
+        :return: False if the lease was lost (expired and taken by another worker)
+        """
+        cursor = self.conn.execute(
+            """
+            UPDATE jobs SET status = 'done', lease_owner = NULL, lease_expires_at = NULL,
+                last_error = NULL, updated_at = ?
+            WHERE id = ? AND status = 'leased' AND lease_owner = ?""",
+            (time.time(), job_id, worker_id),
+        )
+        if cursor.rowcount != 1:
+            logger.warning(f"⚠️ Lost lease on job {job_id}, ack ignored")
+        return cursor.rowcount == 1
+
+    def nack(self, job_id, worker_id, error=None, retry=True):
+        """
+        Return a failed job to the queue with a backoff, or mark it failed after max_attempts.
+        :param retry: False marks the job failed right away (e.g. unsupported url)
+        :return: False if the lease was lost
+        """
+        now = time.time()
+        cursor = self.conn.execute(
+            """
+            UPDATE jobs SET
+                status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END,
+                available_at = ? + ? * attempts,
+                lease_owner = NULL, lease_expires_at = NULL,
+                last_error = ?, updated_at = ?
+            WHERE id = ? AND status = 'leased' AND lease_owner = ?""",
+            (self.max_attempts if retry else 0, now, self.retry_delay, error, now, job_id, worker_id),
+        )
+        if cursor.rowcount != 1:
+            logger.warning(f"⚠️ Lost lease on job {job_id}, nack ignored")
+        return cursor.rowcount == 1
+
+    def stats(self):
+        """
+        :return: dict of job counts per status
+        """
+        counts = {QUEUED: 0, LEASED: 0, DONE: 0, FAILED: 0}
+        for status, count in self.conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"):
+            counts[status] = count
+        return counts
+
+    def has_pending(self):
+        """
+        True while jobs are queued or leased (a leased job may still come back)
+        """
+        row = self.conn.execute(
+            "SELECT EXISTS(SELECT 1 FROM jobs WHERE status IN ('queued', 'leased'))"
+        ).fetchone()
+        return bool(row[0])
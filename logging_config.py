@@ -1,29 +1,133 @@
+"""
+Logger of the project.
+
+Records are put on an in-memory queue by the calling thread and written by a
+QueueListener thread, so file and console I/O never blocks the asyncio scrapers.
+The log file gets one JSON object per line, the console stays human readable.
+
+Every record carries the correlation id of the url being scraped, set with
+
+    with log_context(url):
+        ...
+
+Context variables follow asyncio tasks, so concurrent scrapes keep their own id.
+Messages longer than `config.log_max_message_chars` are truncated.
+"""
+import atexit
+import contextvars
+import json
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
 import sys
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+import config
+
+_correlation_id = contextvars.ContextVar("correlation_id", default=None)
+_url = contextvars.ContextVar("url", default=None)
+
+_listener = None
+
+
+@contextmanager
+def log_context(url, correlation_id=None):
+    """
+    Tag the log records emitted inside the block with the url and a correlation id
+    :param correlation_id: default a new random id
+    """
+    id_token = _correlation_id.set(correlation_id or uuid.uuid4().hex[:12])
+    url_token = _url.set(url)
+    try:
+        yield _correlation_id.get()
+    finally:
+        _url.reset(url_token)
+        _correlation_id.reset(id_token)
+
+
+def truncate(text, limit=None):
+    limit = limit or config.log_max_message_chars
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}...[truncated {len(text) - limit} chars]"
+
+
+class ContextFilter(logging.Filter):
+    """
+    Copy the correlation id and url of the current context onto the record.
+    Runs in the thread that logs, before the record is queued.
+    """
+
+    def filter(self, record):
+        record.correlation_id = _correlation_id.get()
+        record.url = _url.get()
+        return True
+
+
+class TruncatingQueueHandler(QueueHandler):
+    def prepare(self, record):
+        # formats msg % args (and the traceback) into record.msg, then cut it down before it is queued
+        record = super().prepare(record)
+        record.msg = truncate(record.msg)
+        return record
+
+
+class JsonLineFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "process": record.process,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "correlation_id", None):
+            entry["correlation_id"] = record.correlation_id
+            entry["url"] = record.url
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class ConsoleFormatter(logging.Formatter):
+    def format(self, record):
+        message = super().format(record)
+        correlation_id = getattr(record, "correlation_id", None)
+        return f"[{correlation_id}] {message}" if correlation_id else message
+
+
+def _stop_listener():
+    if _listener is not None:
+        # flushes the records still on the queue
+        _listener.stop()
+
 
 def get_logger():
+    global _listener
     logger = logging.getLogger('app')
-    
+
     if logger.handlers:
         return logger
 
     logger.setLevel(logging.INFO)
-    
-    log_file_path = 'app.log'
+
     file_handler = RotatingFileHandler(
-        log_file_path,
+        config.log_file_path,
         maxBytes=10485760,  # 10MB
         backupCount=2,
         encoding='utf-8'
     )
-    file_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    file_handler.setFormatter(file_formatter)
-    logger.addHandler(file_handler)
-    
+    file_handler.setFormatter(JsonLineFormatter())
+
     console_handler = logging.StreamHandler(sys.stdout)
-    console_formatter = logging.Formatter('%(levelname)s - %(message)s')
-    console_handler.setFormatter(console_formatter)
-    logger.addHandler(console_handler)
-    
-    return logger
\ No newline at end of file
+    console_handler.setFormatter(ConsoleFormatter('%(levelname)s - %(message)s'))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = TruncatingQueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+    logger.addHandler(queue_handler)
+
+    _listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_stop_listener)
+
+    return logger
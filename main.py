@@ -1,39 +1,272 @@
+import argparse
 import asyncio
+import multiprocessing
+import os
+import socket
 import sqlite3
+import time
 import utils
 import config
+import sharding
+import job_queue
+import browser_watchdog
+import page_pool
+import run_metrics
+from run_metrics import get_metrics
 import scrape_weibo_post
 import scrape_weixin_post
 import scrape_douyin_post
-from logging_config import get_logger
+from logging_config import get_logger, log_context
 
 logger = get_logger()
+metrics = get_metrics()
 
-if __name__ == '__main__':
+SCRAPERS = {
+    'weibo': scrape_weibo_post.scrape_post,
+    'weixin': scrape_weixin_post.scrape_post,
+    'douyin': scrape_douyin_post.scrape_post,
+}
+
+
+def read_urls(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        # read urls from urls.txt that to be scraped
+        return [line.strip() for line in f if line.strip()]
+
+
+def scrape_url(url, conn):
+    """
+    Scrape one url with the scraper of its platform, in a browser launched for it.
+    Returns True when the post was saved.
+    """
+    return asyncio.run(scrape_url_async(url, conn))
+
+
+async def scrape_url_async(url, conn, pool=None):
+    """
+    Scrape one url with the scraper of its platform, in a page of `pool` when given.
+    Returns True when the post was saved.
+    """
+    # every log record of this url, including the scraper's, carries the same correlation id
+    with log_context(url):
+        return await _scrape_url(url, conn, pool)
+
+
+async def _scrape_url(url, conn, pool):
+    logger.info('Prepare to scrape url: ' + url)
+    platform = utils.platform_from_url(url)
+    scrape_post = SCRAPERS.get(platform)
+    if scrape_post is None:
+        logger.warning(f"⚠️ Unsupported url, skip: {url}")
+        metrics.inc("scrapes_total", platform=platform, status="unsupported")
+        return False
+    start = time.perf_counter()
+    status = "failure"
+    timeout = config.url_timeout_seconds
+    try:
+        # the watchdog only fires when cancelling at the deadline and the bounded cleanup didn't return either
+        with browser_watchdog.HungBrowserWatchdog(timeout + 3 * config.browser_close_timeout_seconds, url), \
+                metrics.track_stage() as stage:
+            if await browser_watchdog.run_with_deadline(scrape_post(url, conn, pool), timeout) is not False:
+                status = "success"
+    except asyncio.TimeoutError:
+        elapsed = time.perf_counter() - start
+        logger.error(f"⏱️ Scrape of {url} cancelled after {elapsed:.1f}s, stuck in stage: {stage.get('stage')}")
+        metrics.record_timeout(url, elapsed, platform=platform, stage=stage.get("stage"))
+        status = "timeout"
+    except Exception as e:
+        logger.error(f"An unexpected error occurred during scrape {platform} post with {url}: {e}")
+    metrics.observe("url_seconds", time.perf_counter() - start, platform=platform)
+    metrics.inc("scrapes_total", platform=platform, status=status)
+    return status == "success"
+
+
+def scrape_urls(urls, db_path, report_suffix=None):
+    """
+    Scrape urls one by one into the database at db_path, then write the run report
+    :param report_suffix: appended to the report file names, so shard processes don't overwrite each other
+    """
+    conn = sqlite3.connect(db_path)
+    logger.info(f"connect to database successful: {db_path}")
+    utils.create_table(conn, config.table_name)
+
+    asyncio.run(_scrape_urls(urls, conn))
+
+    conn.close()
+    write_report(report_suffix)
+
+
+async def _scrape_urls(urls, conn):
+    # one event loop and one browser for all urls of this process, pages are reused per platform
+    pool = await page_pool.PagePool().start()
+    try:
+        for url in urls:
+            await scrape_url_async(url, conn, pool)
+    finally:
+        await pool.close()
+
+
+def write_report(suffix=None):
+    summary = metrics.write_report(suffix)
+    totals = {}
+    for counter in summary["counters"]:
+        if counter["name"] == "scrapes_total":
+            status = counter["labels"]["status"]
+            totals[status] = totals.get(status, 0) + counter["value"]
+    logger.info(f"📊 Run finished in {summary['duration_seconds']}s, scrapes: {totals}, report: {run_metrics.report_path(suffix)}")
+    if summary["timeouts"]:
+        lost = sum(timeout["seconds"] for timeout in summary["timeouts"])
+        logger.warning(f"⏱️ {len(summary['timeouts'])} urls timed out, {lost:.0f}s of the run spent on them")
+
+
+def run_shard(urls, index, count, har_mode=None):
+    """
+    Scrape the urls of one shard into its own database file
+    :param har_mode: set again in spawned processes, which re-import config
+    """
+    config.har_mode = har_mode or config.har_mode
+    shard_urls = sharding.select_shard(urls, index, count)
+    db_path = sharding.shard_db_path(config.db_name, index, count)
+    # rows left by an earlier run would be merged again over newer data
+    sharding.remove_shard_db(db_path)
+    logger.info(f"Shard {index + 1}/{count}: {len(shard_urls)} of {len(urls)} urls -> {db_path}")
+    scrape_urls(shard_urls, db_path, report_suffix=f"shard-{index + 1}-of-{count}")
+    return db_path
+
+
+def run_workers(urls, workers):
+    """
+    Scrape in `workers` processes, each with its own event loop and page pool,
+    then merge the shard databases into the main database
+    """
+    # spawn gives every worker a clean interpreter, Playwright doesn't survive fork
+    ctx = multiprocessing.get_context('spawn')
+    processes = []
+    for index in range(workers):
+        process = ctx.Process(target=run_shard, args=(urls, index, workers, config.har_mode), name=f"shard-{index + 1}")
+        process.start()
+        processes.append(process)
+    for process in processes:
+        process.join()
+        if process.exitcode != 0:
+            logger.error(f"❌ Worker {process.name} exited with code {process.exitcode}")
+
+    merge([sharding.shard_db_path(config.db_name, index, workers) for index in range(workers)], remove=True)
+
+
+def enqueue(urls):
+    queue = job_queue.JobQueue()
+    queue.enqueue(urls)
+    logger.info(f"Queue status: {queue.stats()}")
+    queue.close()
+
+
+def run_queue_worker(worker_id=None, report_suffix=None, har_mode=None):
+    """
+    Lease jobs from the queue and scrape them into the main database until the queue is drained
+    :param report_suffix: appended to the report file names, so local worker processes don't overwrite each other
+    :param har_mode: set again in spawned processes, which re-import config
+    """
+    config.har_mode = har_mode or config.har_mode
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    queue = job_queue.JobQueue()
+    # several workers write to the same database, wait for the write lock instead of failing
+    conn = sqlite3.connect(config.db_name, timeout=30)
+    # a fresh database has no table yet, every insert would fail and the jobs be lost
+    utils.create_table(conn, config.table_name)
+    logger.info(f"Queue worker {worker_id} started")
+
+    asyncio.run(_consume_queue(queue, conn, worker_id))
+
+    logger.info(f"Queue worker {worker_id} finished, queue status: {queue.stats()}")
+    conn.close()
+    queue.close()
+    write_report(report_suffix)
+
+
+async def _consume_queue(queue, conn, worker_id):
+    pool = await page_pool.PagePool().start()
+    try:
+        while True:
+            jobs = queue.lease(worker_id)
+            if not jobs:
+                if not queue.has_pending():
+                    break
+                # other workers hold the remaining jobs, their leases may still expire
+                await asyncio.sleep(config.queue_poll_seconds)
+                continue
+            job = jobs[0]
+            if utils.platform_from_url(job.url) not in SCRAPERS:
+                queue.nack(job.id, worker_id, error="unsupported url", retry=False)
+            elif await scrape_url_async(job.url, conn, pool):
+                queue.ack(job.id, worker_id)
+            else:
+                queue.nack(job.id, worker_id, error="scrape failed")
+    finally:
+        await pool.close()
+
+
+def run_queue_workers(workers):
+    """
+    Start `workers` queue worker processes on this machine
+    """
     conn = sqlite3.connect(config.db_name)
-    logger.info(f"connect to database successful: {config.db_name}")
     utils.create_table(conn, config.table_name)
+    conn.close()
 
-    with open('urls.txt', 'r', encoding='utf-8') as f:
-        # read urls from urls.txt that to be scraped
-        urls = [line.strip() for line in f if line.strip()]
-
-    for url in urls:
-        logger.info('Prepare to scrape url: ' + url)
-        if 'weibo.com/' in url:
-            try:
-                asyncio.run(scrape_weibo_post.scrape_post(url, conn))
-            except Exception as e:
-                print(f"An unexpected error occurred during scrape weibo post with {url}: {e}")
-        elif 'mp.weixin.qq.com/' in url:
-            try:
-                asyncio.run(scrape_weixin_post.scrape_post(url, conn))
-            except Exception as e:
-                print(f"An unexpected error occurred during scrape weixin post with {url}: {e}")
-        elif 'www.iesdouyin.com/' in url or 'www.douyin.com/' in url:
-            try:
-                asyncio.run(scrape_douyin_post.scrape_post(url, conn))
-            except Exception as e:
-                print(f"An unexpected error occurred during scrape douyin post with {url}: {e}")
-
-    conn.close()
\ No newline at end of file
+    ctx = multiprocessing.get_context('spawn')
+    processes = [
+        ctx.Process(target=run_queue_worker, kwargs={"report_suffix": f"worker-{index + 1}", "har_mode": config.har_mode},
+                    name=f"queue-worker-{index + 1}")
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        if process.exitcode != 0:
+            logger.error(f"❌ Worker {process.name} exited with code {process.exitcode}")
+
+
+def merge(shard_paths, remove=False):
+    """
+    :param remove: delete the shard databases once merged (local workers); `--merge` keeps copied shard files
+    """
+    conn = sqlite3.connect(config.db_name)
+    utils.create_table(conn, config.table_name)
+    sharding.merge_shards(conn, shard_paths, config.table_name, remove=remove)
+    conn.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Scrape Douyin/Weibo/Weixin posts listed in urls.txt")
+    parser.add_argument('--urls', default='urls.txt', help="file with one url per line")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="number of local processes: shard processes by default, queue workers with --queue")
+    parser.add_argument('--har', choices=['record', 'replay'],
+                        help="record every network exchange per url into har/, or replay from there without network")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--enqueue', action='store_true', help="add the urls to the job queue (queue.db)")
+    mode.add_argument('--queue', action='store_true', help="consume the job queue until it is drained")
+    mode.add_argument('--shard', help="scrape only shard i of K (1-based, e.g. 2/4) into its own database file")
+    mode.add_argument('--merge', nargs='+', metavar='SHARD_DB', help="upsert shard databases into the main database")
+    args = parser.parse_args()
+    if args.har:
+        config.har_mode = args.har
+
+    if args.enqueue:
+        enqueue(read_urls(args.urls))
+    elif args.queue:
+        if args.workers > 1:
+            run_queue_workers(args.workers)
+        else:
+            run_queue_worker()
+    elif args.merge:
+        merge(args.merge)
+    elif args.shard:
+        index, count = sharding.parse_shard_spec(args.shard)
+        run_shard(read_urls(args.urls), index, count)
+    elif args.workers > 1:
+        run_workers(read_urls(args.urls), args.workers)
+    else:
+        scrape_urls(read_urls(args.urls), config.db_name)
@@ -0,0 +1,240 @@
+"""
+Append-only history of the engagement counts of each post, so re-scrapes don't lose the
+previous values that the upsert of utils.insert_data overwrites.
+
+    metric_snapshots(post_id, ts, likes, shares, comments, favorites)
+
+One row per post per scrape, written in bulk by utils.insert_data. Counts are stored as
+integers ("1.2万" -> 12000) and ts as unix seconds; the (post_id, ts) primary key of the
+WITHOUT ROWID table is the only index and keeps the history of a post contiguous on disk.
+
+    python metric_history.py curve <url> [--metric likes]
+    python metric_history.py top --since 2024-05-01 [--metric likes] [--limit 20]
+"""
+import argparse
+import sqlite3
+import time
+from datetime import datetime
+import config
+import utils
+from logging_config import get_logger
+
+logger = get_logger()
+
+SNAPSHOT_TABLE = "metric_snapshots"
+
+# snapshot column -> item key of the scrapers
+METRICS = {
+    "likes": "like_count",
+    "shares": "shared_count",
+    "comments": "comment_count",
+    "favorites": "favorite_count",
+}
+
+
+def create_table(conn):
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {SNAPSHOT_TABLE} (
+            post_id INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            likes INTEGER,
+            shares INTEGER,
+            comments INTEGER,
+            favorites INTEGER,
+            PRIMARY KEY (post_id, ts)
+        ) WITHOUT ROWID
+    """
+    )
+
+
+def to_count(value):
+    """
+    Integer count of a scraped value ("1.2万", "3k", 15), None when missing or unparsable
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    try:
+        return int(utils.chinese_unit_to_number(str(value)))
+    except ValueError:
+        return None
+
+
+def _to_ts(value):
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    return int(datetime.fromisoformat(value).timestamp())
+
+
+def record_snapshots(conn, table_name, items, ts=None):
+    """
+    Append one snapshot per item that carries at least one count. Doesn't commit.
+    :param items: item dicts as passed to utils.insert_data, already upserted into `table_name`
+    :param ts: unix seconds, default now
+    :return: number of written snapshots
+    """
+    ts = int(ts if ts is not None else time.time())
+    counts = {}
+    for item in items:
+        values = [to_count(item.get(key)) for key in METRICS.values()]
+        if item.get("link1") and any(value is not None for value in values):
+            counts[item["link1"]] = values
+    if not counts:
+        return 0
+
+    rows = []
+    links = list(counts)
+    for start in range(0, len(links), 500):
+        chunk = links[start:start + 500]
+        for post_id, link in conn.execute(
+            f"SELECT id, link1 FROM {table_name} WHERE link1 IN ({', '.join('?' for _ in chunk)})", chunk
+        ):
+            rows.append([post_id, ts] + counts[link])
+    # a second scrape of the same post within the same second replaces the first
+    conn.executemany(
+        f"INSERT OR REPLACE INTO {SNAPSHOT_TABLE} (post_id, ts, {', '.join(METRICS)}) VALUES (?, ?, ?, ?, ?, ?)",
+        rows,
+    )
+    return len(rows)
+
+
+def copy_snapshots(source_conn, conn, table_name):
+    """
+    Copy the snapshots of a shard database into `conn`, matching posts by link1
+    (used by sharding.merge_shards after the posts were merged)
+    :return: number of copied snapshots
+    """
+    if not source_conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (SNAPSHOT_TABLE,)
+    ).fetchone():
+        return 0
+    create_table(conn)
+    cursor = source_conn.execute(
+        f"""
+        SELECT p.link1, s.ts, {', '.join(f's.{metric}' for metric in METRICS)}
+        FROM {SNAPSHOT_TABLE} AS s JOIN {table_name} AS p ON p.id = s.post_id"""
+    )
+    copied = 0
+    while True:
+        rows = cursor.fetchmany(1000)
+        if not rows:
+            break
+        links = list({row[0] for row in rows})
+        ids = dict(
+            conn.execute(
+                f"SELECT link1, id FROM {table_name} WHERE link1 IN ({', '.join('?' for _ in links)})", links
+            ).fetchall()
+        )
+        snapshots = [[ids[row[0]]] + list(row[1:]) for row in rows if row[0] in ids]
+        conn.executemany(
+            f"INSERT OR REPLACE INTO {SNAPSHOT_TABLE} (post_id, ts, {', '.join(METRICS)}) VALUES (?, ?, ?, ?, ?, ?)",
+            snapshots,
+        )
+        copied += len(snapshots)
+    conn.commit()
+    return copied
+
+
+def history(conn, post_id, since=None, until=None):
+    """
+    Snapshots of a post in time order
+    :param since: / :param until: unix seconds or ISO date strings, inclusive
+    :return: list of dicts with ts and the counts
+    """
+    sql = f"SELECT ts, {', '.join(METRICS)} FROM {SNAPSHOT_TABLE} WHERE post_id = ?"
+    params = [post_id]
+    if since is not None:
+        sql += " AND ts >= ?"
+        params.append(_to_ts(since))
+    if until is not None:
+        sql += " AND ts <= ?"
+        params.append(_to_ts(until))
+    rows = conn.execute(sql + " ORDER BY ts", params).fetchall()
+    return [dict(zip(["ts"] + list(METRICS), row)) for row in rows]
+
+
+def growth_curve(conn, post_id, metric="likes", since=None, until=None):
+    """
+    Growth of one count of a post between consecutive snapshots
+    :return: list of (ts, value, change since the previous snapshot, change per hour)
+    """
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric '{metric}', expected one of {list(METRICS)}")
+    curve = []
+    previous = None
+    for snapshot in history(conn, post_id, since, until):
+        value = snapshot[metric]
+        if value is None:
+            continue
+        if previous is None:
+            curve.append((snapshot["ts"], value, None, None))
+        else:
+            change = value - previous[1]
+            curve.append((snapshot["ts"], value, change, change * 3600 / (snapshot["ts"] - previous[0])))
+        previous = (snapshot["ts"], value)
+    return curve
+
+
+def top_growth(conn, metric="likes", since=None, until=None, limit=20, table_name=None):
+    """
+    Posts whose count grew the most between their first and last snapshot in the time range
+    :return: list of (link1, first value, last value, growth)
+    """
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric '{metric}', expected one of {list(METRICS)}")
+    table_name = table_name or config.table_name
+    where = f"{metric} IS NOT NULL"
+    params = []
+    if since is not None:
+        where += " AND ts >= ?"
+        params.append(_to_ts(since))
+    if until is not None:
+        where += " AND ts <= ?"
+        params.append(_to_ts(until))
+    rows = conn.execute(
+        f"""
+        WITH bounds AS (
+            SELECT post_id, MIN(ts) AS first_ts, MAX(ts) AS last_ts
+            FROM {SNAPSHOT_TABLE} WHERE {where} GROUP BY post_id
+        )
+        SELECT p.link1, f.{metric}, l.{metric}, l.{metric} - f.{metric} AS growth
+        FROM bounds AS b
+        JOIN {SNAPSHOT_TABLE} AS f ON f.post_id = b.post_id AND f.ts = b.first_ts
+        JOIN {SNAPSHOT_TABLE} AS l ON l.post_id = b.post_id AND l.ts = b.last_ts
+        JOIN {table_name} AS p ON p.id = b.post_id
+        ORDER BY growth DESC
+        LIMIT ?""",
+        params + [limit],
+    ).fetchall()
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Engagement history of the scraped posts")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    curve_parser = subparsers.add_parser("curve", help="growth curve of one post")
+    curve_parser.add_argument("url")
+    top_parser = subparsers.add_parser("top", help="posts with the largest growth")
+    top_parser.add_argument("--since", help="e.g. 2024-05-01")
+    top_parser.add_argument("--until")
+    top_parser.add_argument("--limit", type=int, default=20)
+    for sub in (curve_parser, top_parser):
+        sub.add_argument("--metric", choices=list(METRICS), default="likes")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(config.db_name)
+    if args.command == "curve":
+        row = conn.execute(f"SELECT id FROM {config.table_name} WHERE link1 = ?", (args.url,)).fetchone()
+        if row is None:
+            raise SystemExit(f"❌ Post not found: {args.url}")
+        for ts, value, change, per_hour in growth_curve(conn, row[0], args.metric):
+            growth = "" if change is None else f"  {change:+d}  ({per_hour:+.1f}/h)"
+            print(f"{datetime.fromtimestamp(ts).isoformat(sep=' ')}  {value}{growth}")
+    else:
+        for link, first, last, growth in top_growth(conn, args.metric, args.since, args.until, args.limit):
+            print(f"{growth:+10d}  {first} -> {last}  {link}")
+    conn.close()
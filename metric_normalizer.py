@@ -0,0 +1,178 @@
+"""
+Vectorized normalization of scraped metric strings ("1.2万", "3k", "12000.0", "") to int64.
+
+Semantics follow utils.chinese_unit_to_number exactly (the result is its value
+truncated to int). Distinct strings are split into number/unit with Arrow's
+regex-extract kernel, numbers are cast in bulk and unit suffixes go through a
+lookup table built with utils.chinese_unit_multiplier once per distinct suffix.
+
+Backfill the count columns of `posts`:
+    python metric_normalizer.py backfill [--chunk-size 5000] [--errors coerce]
+"""
+import argparse
+import sqlite3
+import numpy as np
+import pandas as pd
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:  # the per-value scalar path is used instead
+    pa = None
+import config
+import utils
+from logging_config import get_logger
+
+logger = get_logger()
+
+METRIC_COLUMNS = ["shared_count", "comment_count", "like_count"]
+
+# Same split as utils.CHINESE_NUMBER_PATTERN in RE2 syntax (ASCII digits only, '$' is end of text
+# and '.' doesn't cross newlines). Values RE2 can't settle identically go through the scalar path.
+_ARROW_PATTERN = r"^(?P<sign>[+-]?)(?P<num>[0-9]*\.?[0-9]+)(?P<unit>.*)$"
+
+
+def _needs_scalar(unit):
+    """
+    Unit suffixes where the Arrow split may differ from Python's: unicode digits (Python's \\d
+    would have kept them in the number) or whitespace only str.strip() removes
+    """
+    return any(ch.isdecimal() or "\x1c" <= ch <= "\x1f" for ch in unit)
+
+
+def _unit_table(units):
+    """
+    Build the multiplier lookup for the distinct unit suffixes.
+    Unsupported units map to NaN, units that need the scalar path map to -1.
+    """
+    table = np.empty(len(units), dtype=float)
+    for i, unit in enumerate(units):
+        if _needs_scalar(unit):
+            table[i] = -1
+            continue
+        try:
+            table[i] = utils.chinese_unit_multiplier(unit)
+        except ValueError:
+            table[i] = np.nan
+    return table
+
+
+def _scalar_value(value, errors):
+    try:
+        return int(utils.chinese_unit_to_number(value))
+    except ValueError:
+        if errors == "raise":
+            raise
+        return 0
+
+
+def _parse_distinct(texts, errors):
+    """
+    Parse distinct non-empty strings to int64 with Arrow string kernels
+    """
+    values = np.zeros(len(texts), dtype=np.int64)
+    if pa is None:
+        for i, text in enumerate(texts):
+            values[i] = _scalar_value(text, errors)
+        return values
+
+    parts = pc.extract_regex(pc.utf8_trim_whitespace(pa.array(texts, type=pa.string())), _ARROW_PATTERN)
+    matched = pc.is_valid(parts).to_numpy(zero_copy_only=False)
+    fast = pc.filter(parts, matched)
+
+    nums = pc.cast(pc.struct_field(fast, "num"), pa.float64()).to_numpy()
+    negative = pc.equal(pc.struct_field(fast, "sign"), "-").to_numpy(zero_copy_only=False)
+    nums = np.where(negative, -nums, nums)
+
+    units = pc.dictionary_encode(pc.struct_field(fast, "unit"))
+    multipliers = _unit_table(units.dictionary.to_pylist())[units.indices.to_numpy()]
+
+    unsupported = np.isnan(multipliers)
+    if unsupported.any() and errors == "raise":
+        first = pc.filter(pc.struct_field(fast, "unit"), pa.array(unsupported))[0].as_py()
+        raise ValueError(f"Unsupport Chinese unit: {first}")
+    multipliers[unsupported] = 0
+
+    fallback = ~matched
+    fallback[np.flatnonzero(matched)[multipliers == -1]] = True
+    keep = multipliers != -1
+    values[np.flatnonzero(matched)[keep]] = (nums[keep] * multipliers[keep]).astype(np.int64)
+
+    for i in np.flatnonzero(fallback):
+        values[i] = _scalar_value(texts[i], errors)
+    return values
+
+
+def chinese_units_to_numbers(values, errors="raise") -> np.ndarray:
+    """
+    Convert a pandas Series / numpy array / list of metric strings to an int64 array.
+    Values are factorized first, so each distinct string is parsed once.
+    :param values: strings such as "1.2万", "3k", "12"; None, NaN and "" become 0
+    :param errors: "raise" raises ValueError on the first unparsable value (like the
+                   scalar function), "coerce" turns unparsable values into 0
+    """
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+    # non-string cells (e.g. floats read back from the scrapers) are parsed from their text form
+    texts = [u if isinstance(u, str) else str(u) for u in uniques]
+    non_empty = [i for i, text in enumerate(texts) if text]
+
+    parsed = np.zeros(len(texts) + 1, dtype=np.int64)  # last slot serves missing values (code -1)
+    if non_empty:
+        parsed[non_empty] = _parse_distinct([texts[i] for i in non_empty], errors)
+    return parsed[codes]
+
+
+def backfill_metrics(conn, table_name=None, chunk_size=None, errors="coerce"):
+    """
+    Rewrite the count columns of every row as plain integers, chunk by chunk.
+    NULL counts (not scraped yet, e.g. Weixin before the UI step) are left as NULL.
+    Only rows whose stored text changes are updated.
+    :return: number of updated rows
+    """
+    table_name = table_name or config.table_name
+    chunk_size = chunk_size or config.export_chunk_size
+    cursor = conn.cursor()
+    last_id = 0
+    updated = 0
+    while True:
+        df = pd.read_sql_query(
+            f"SELECT id, {', '.join(METRIC_COLUMNS)} FROM {table_name} WHERE id > ? ORDER BY id LIMIT ?",
+            conn, params=(last_id, chunk_size),
+        )
+        if df.empty:
+            break
+        last_id = int(df["id"].iloc[-1])
+
+        changed = np.zeros(len(df), dtype=bool)
+        for col in METRIC_COLUMNS:
+            original = df[col].astype(object)
+            present = original.notna().to_numpy()
+            normalized = chinese_units_to_numbers(original, errors=errors).astype(str).astype(object)
+            normalized[~present] = None
+            changed |= present & (original.to_numpy() != normalized)
+            df[col] = normalized
+
+        rows = df.loc[changed, METRIC_COLUMNS + ["id"]].values.tolist()
+        if rows:
+            cursor.executemany(
+                f"UPDATE {table_name} SET {', '.join(f'{col} = ?' for col in METRIC_COLUMNS)} WHERE id = ?",
+                rows,
+            )
+            conn.commit()
+            updated += len(rows)
+        logger.info(f"Backfill metrics: processed up to id {last_id}, {updated} rows updated")
+    return updated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Normalize scraped metric columns")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    backfill = subparsers.add_parser("backfill", help="rewrite count columns of posts as integers")
+    backfill.add_argument("--chunk-size", type=int, default=None)
+    backfill.add_argument("--errors", choices=["raise", "coerce"], default="coerce")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(config.db_name)
+    logger.info(f"connect to database successful: {config.db_name}")
+    count = backfill_metrics(conn, chunk_size=args.chunk_size, errors=args.errors)
+    conn.close()
+    logger.info(f"✅ Backfill done, {count} rows updated")
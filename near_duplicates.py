@@ -0,0 +1,268 @@
+"""
+Near-duplicate detection of post content with 64-bit SimHash fingerprints, so reposts and
+syndicated copies can be processed once per cluster.
+
+utils.insert_data fingerprints every inserted or changed post (`posts.simhash`, indexed) and
+assigns `posts.dup_cluster_id`: the cluster of its nearest earlier near-duplicate, or its own
+id. Two posts are near-duplicates when their fingerprints differ in at most
+`simhash_max_distance` bits. The fingerprint is split into max_distance + 1 bands stored in
+`simhash_bands`; near-duplicates share at least one band exactly, so candidates are found
+with a few indexed lookups instead of a scan.
+
+A post that links two existing clusters joins the smaller id at insert time; `rebuild`
+merges such clusters:
+    python near_duplicates.py rebuild
+    python near_duplicates.py clusters [--min-size 2]
+
+Pipelines process one post per cluster with `WHERE id = dup_cluster_id`.
+"""
+import argparse
+import hashlib
+import re
+import sqlite3
+import config
+from logging_config import get_logger
+
+logger = get_logger()
+
+BAND_TABLE = "simhash_bands"
+SHINGLE_SIZE = 3
+
+# repost chains ("//@user: ..."), bracketed emoticons ("[赞]") and links differ between copies of the same text
+_NOISE_RE = re.compile(r"//@[^:：\s]+[:：]|\[[^\[\]\s]{1,8}\]|https?://\S+|转发微博")
+_NON_WORD_RE = re.compile(r"[\W_]+")
+
+
+def _band_count():
+    return config.simhash_max_distance + 1
+
+
+def _to_signed(value):
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _to_unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+def simhash(text):
+    """
+    64-bit SimHash of the character shingles of `text` (lower-cased, without punctuation, whitespace,
+    repost markup, emoticons and links), as a signed integer for SQLite; None for empty text
+    """
+    import numpy as np  # not loaded at startup (see benchmarks/bench_startup.py)
+
+    normalized = _NON_WORD_RE.sub("", _NOISE_RE.sub("", (text or "").lower()))
+    if not normalized:
+        return None
+    shingles = {}
+    for i in range(max(len(normalized) - SHINGLE_SIZE + 1, 1)):
+        shingle = normalized[i:i + SHINGLE_SIZE]
+        shingles[shingle] = shingles.get(shingle, 0) + 1
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big") for s in shingles],
+        dtype=np.uint64,
+    )
+    weights = np.array(list(shingles.values()), dtype=np.int64)
+    bits = ((hashes[:, None] >> np.arange(64, dtype=np.uint64)) & np.uint64(1)).astype(np.int64)
+    votes = (weights[:, None] * (2 * bits - 1)).sum(axis=0)
+    return _to_signed(sum(1 << i for i in range(64) if votes[i] > 0))
+
+
+def distance(a, b):
+    """
+    Number of differing bits of two fingerprints
+    """
+    return bin(_to_unsigned(a) ^ _to_unsigned(b)).count("1")
+
+
+def bands(fingerprint):
+    """
+    :return: list of (band number, band value)
+    """
+    count = _band_count()
+    width = 64 // count
+    value = _to_unsigned(fingerprint)
+    return [(band, (value >> (band * width)) & ((1 << width) - 1)) for band in range(count)]
+
+
+def create_table(conn, table_name):
+    """
+    Band table and the simhash index (the columns are added by utils.create_table)
+    """
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {BAND_TABLE} (
+            band INTEGER NOT NULL,
+            value INTEGER NOT NULL,
+            post_id INTEGER NOT NULL,
+            PRIMARY KEY (band, value, post_id)
+        ) WITHOUT ROWID
+    """
+    )
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table_name}_simhash ON {table_name} (simhash)")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table_name}_dup_cluster ON {table_name} (dup_cluster_id)")
+
+
+def _store_bands(conn, post_id, fingerprint):
+    conn.execute(f"DELETE FROM {BAND_TABLE} WHERE post_id = ?", (post_id,))
+    if fingerprint is not None:
+        conn.executemany(
+            f"INSERT OR IGNORE INTO {BAND_TABLE} (band, value, post_id) VALUES (?, ?, ?)",
+            [(band, value, post_id) for band, value in bands(fingerprint)],
+        )
+
+
+def find_near_duplicates(conn, table_name, fingerprint, exclude_id=None):
+    """
+    Posts within simhash_max_distance bits of `fingerprint`
+    :return: list of (post id, dup_cluster_id, distance)
+    """
+    band_filter = " OR ".join("(band = ? AND value = ?)" for _ in range(_band_count()))
+    params = [x for pair in bands(fingerprint) for x in pair]
+    rows = conn.execute(
+        f"""
+        SELECT p.id, p.dup_cluster_id, p.simhash FROM {table_name} AS p
+        WHERE p.id IN (SELECT post_id FROM {BAND_TABLE} WHERE {band_filter})""",
+        params,
+    ).fetchall()
+    matches = []
+    for post_id, cluster_id, other in rows:
+        if post_id == exclude_id or other is None:
+            continue
+        bits = distance(fingerprint, other)
+        if bits <= config.simhash_max_distance:
+            matches.append((post_id, cluster_id, bits))
+    return matches
+
+
+def index_posts(conn, table_name, links):
+    """
+    Fingerprint the posts with these link1 values whose content changed and assign their cluster
+    (called by utils.insert_data)
+    """
+    links = list(links)
+    for start in range(0, len(links), 500):
+        chunk = links[start:start + 500]
+        rows = conn.execute(
+            f"SELECT id, content, simhash, dup_cluster_id FROM {table_name} "
+            f"WHERE link1 IN ({', '.join('?' for _ in chunk)})",
+            chunk,
+        ).fetchall()
+        for post_id, content, stored, cluster_id in rows:
+            fingerprint = simhash(content)
+            if fingerprint == stored and cluster_id is not None:
+                continue
+            if fingerprint is None:
+                cluster_id = post_id
+            else:
+                matches = find_near_duplicates(conn, table_name, fingerprint, exclude_id=post_id)
+                cluster_id = min([cluster or match_id for match_id, cluster, _ in matches] + [post_id])
+            conn.execute(
+                f"UPDATE {table_name} SET simhash = ?, dup_cluster_id = ? WHERE id = ?",
+                (fingerprint, cluster_id, post_id),
+            )
+            _store_bands(conn, post_id, fingerprint)
+
+
+def rebuild(conn, table_name=None, chunk_size=5000):
+    """
+    Fingerprint every post and recompute all clusters, merging clusters linked by a near-duplicate pair
+    :return: (number of posts, number of clusters with more than one post)
+    """
+    table_name = table_name or config.table_name
+    create_table(conn, table_name)
+    conn.execute(f"DELETE FROM {BAND_TABLE}")
+    fingerprints = {}
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT id, content FROM {table_name}")
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        updates = [(simhash(content), post_id) for post_id, content in rows]
+        conn.executemany(f"UPDATE {table_name} SET simhash = ? WHERE id = ?", updates)
+        conn.executemany(
+            f"INSERT OR IGNORE INTO {BAND_TABLE} (band, value, post_id) VALUES (?, ?, ?)",
+            [(band, value, post_id) for fingerprint, post_id in updates if fingerprint is not None
+             for band, value in bands(fingerprint)],
+        )
+        fingerprints.update((post_id, fingerprint) for fingerprint, post_id in updates)
+
+    # union-find over the near-duplicate pairs found in each band bucket
+    parent = {post_id: post_id for post_id in fingerprints}
+
+    def find(post_id):
+        while parent[post_id] != post_id:
+            parent[post_id] = parent[parent[post_id]]
+            post_id = parent[post_id]
+        return post_id
+
+    def union(a, b):
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    buckets = conn.execute(
+        f"SELECT group_concat(post_id) FROM {BAND_TABLE} GROUP BY band, value HAVING COUNT(*) > 1"
+    )
+    for (post_ids,) in buckets:
+        # identical fingerprints are merged directly, only distinct ones are compared pairwise
+        by_fingerprint = {}
+        for post_id in map(int, post_ids.split(",")):
+            by_fingerprint.setdefault(fingerprints[post_id], []).append(post_id)
+        for same in by_fingerprint.values():
+            for post_id in same[1:]:
+                union(same[0], post_id)
+        distinct = list(by_fingerprint.items())
+        for i, (fingerprint, same) in enumerate(distinct):
+            for other, other_same in distinct[i + 1:]:
+                if distance(fingerprint, other) <= config.simhash_max_distance:
+                    union(same[0], other_same[0])
+
+    conn.executemany(
+        f"UPDATE {table_name} SET dup_cluster_id = ? WHERE id = ?",
+        [(find(post_id), post_id) for post_id in fingerprints],
+    )
+    conn.commit()
+    sizes = {}
+    for post_id in fingerprints:
+        root = find(post_id)
+        sizes[root] = sizes.get(root, 0) + 1
+    duplicated = sum(1 for size in sizes.values() if size > 1)
+    logger.info(f"✅ Fingerprinted {len(fingerprints)} posts, {duplicated} clusters with near-duplicates")
+    return len(fingerprints), duplicated
+
+
+def clusters(conn, table_name=None, min_size=2):
+    """
+    :return: list of (dup_cluster_id, size, link1 of the representative), largest first
+    """
+    table_name = table_name or config.table_name
+    return conn.execute(
+        f"""
+        SELECT c.dup_cluster_id, c.size, p.link1 FROM (
+            SELECT dup_cluster_id, COUNT(*) AS size FROM {table_name}
+            WHERE dup_cluster_id IS NOT NULL GROUP BY dup_cluster_id HAVING COUNT(*) >= ?
+        ) AS c JOIN {table_name} AS p ON p.id = c.dup_cluster_id
+        ORDER BY c.size DESC""",
+        (min_size,),
+    ).fetchall()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Near-duplicate clusters of the scraped posts")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("rebuild", help="fingerprint all posts and recompute the clusters")
+    clusters_parser = subparsers.add_parser("clusters", help="list the duplicate clusters")
+    clusters_parser.add_argument("--min-size", type=int, default=2)
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(config.db_name)
+    if args.command == "rebuild":
+        rebuild(conn)
+    else:
+        for cluster_id, size, link in clusters(conn, min_size=args.min_size):
+            print(f"{cluster_id:>8}  {size:>5} posts  {link}")
+    conn.close()
@@ -0,0 +1,144 @@
+"""
+OCR and AI image recognition helpers for the Weixin desktop UI automation (scrape_weixin_post_ui.py).
+
+Kept out of utils so the Playwright scrapers don't load OpenCV, Tesseract,
+PIL.ImageGrab (which needs a display) or the DashScope SDK.
+"""
+import os
+import cv2
+import numpy as np
+import pytesseract
+from PIL import ImageGrab
+from logging_config import get_logger
+import config
+
+logger = get_logger()
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+# Setting Tesseract path（Windows）
+pytesseract.pytesseract.tesseract_cmd = config.tesseract_cmd
+like_icon_path = os.path.join(script_dir, "ocr_icon", "like_icon.png")
+share_icon_path = os.path.join(script_dir, "ocr_icon", "share_icon.png")
+favorite_icon_path = os.path.join(script_dir, "ocr_icon", "favorite_icon.png")
+comment_icon_path = os.path.join(script_dir, "ocr_icon", "comment_icon.png")
+search_icon_path = os.path.join(script_dir, "ocr_icon", "search_icon.png")
+
+
+def ocr_image_recognition_ai(image_path):
+    # the DashScope SDK is only needed here, don't load it with the OCR helpers
+    import dashscope
+    from dashscope import MultiModalConversation
+
+    dashscope.api_key = os.getenv("DASHSCOPE_API_KEY")
+    messages = [
+        {
+            "role": "user",
+            "content": [
+                {"image": image_path},
+                {
+                    "text": "请识别图片中从左到右固定的点赞、转发、喜欢和评论四个图标及其相邻的数字，结果输出只需要数字，去掉其他字符。例如“赞 1234”，“评论 56”只需要返回“1234”和“56”，特别要注意如果其中某一个图标不显示，则输出对应位置的数字为 0。"
+                },
+            ],
+        }
+    ]
+
+    response = MultiModalConversation.call(model="qwen-vl-plus", messages=messages)
+
+    if response.status_code == 200:
+        content = response.output.choices[0].message.content
+        logger.info(f"OCR Recognition Result: {content}")
+        return content
+    else:
+        logger.info(f"OCR request failed: {response}")
+        return None
+
+
+def find_icon_and_read_number(template_path, screenshot, icon_width=30, icon_height=30):
+    """
+    Find the icon position in the screenshot based on the template, and read the number to its right
+    :param template_path: Icon template path
+    :param screenshot: Icon screenshot image (numpy array)
+    :param icon_width, icon_height: Icon size (for cropping number area)
+    :return: Number value
+    """
+    try:
+        # Read template
+        template = cv2.imread(template_path, 0)  # Grayscale
+        if template is None:
+            logger.info(f"❌ Template image {template_path} not found")
+            return 0
+
+        # Template matching
+        res = cv2.matchTemplate(screenshot, template, cv2.TM_CCOEFF_NORMED)
+        min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(res)
+
+        # if max_val < 0.7:  # Matching score below 70% is considered not found
+        #     logger.info(f"⚠️ Not found {template_path}")
+        #     return 0
+
+        # Get top-left coordinates of the icon
+        top_left = max_loc
+        h, w = template.shape[:2]
+
+        # Crop the number area to the right of the icon
+        # (assuming the number starts 5px to the right of the icon, width 60px, height same as icon)
+        number_region = screenshot[
+            top_left[1] : top_left[1] + h,
+            # top_left[0] + w + 5:top_left[0] + w + 60
+            top_left[0] + w - 3 : top_left[0] + w + 59,
+        ]
+
+        # Image preprocessing (improve OCR accuracy)
+        _, thresh = cv2.threshold(number_region, 150, 255, cv2.THRESH_BINARY_INV)
+
+        # OCR recognize numbers
+        text = pytesseract.image_to_string(
+            # thresh, config="--psm 6 --oem 1 -c tessedit_char_whitelist=0123456789 "
+            thresh, config="--psm 6 --oem 1 -c tessedit_char_whitelist=0123456789 "
+        )
+        # text = pytesseract.image_to_string(thresh, config='--psm 9 -c tessedit_char_whitelist=0123456789 ')
+        numbers = [int(n) for n in text.split() if n.isdigit()]
+
+        if numbers:
+            logger.info(f"OCR numbers success: {numbers}")
+            return numbers[0]
+        else:
+            logger.info("❌ No numbers recognized")
+            return 0
+    except Exception as e:
+       logger.info(f"OCR error: {e}")
+
+
+def ocr_wechat_article_metrics(left, top, right, bottom):
+    """OCR WeChat article metrics: likes, shares, favorites, comments"""
+    # Screenshot the entire WeChat article window (adjust according to your coordinates)
+    # L, T, R, B = config.wechat_article_area_coords  # The coordinates of article area
+    L, T, R, B = left, top, right, bottom  # The coordinates of article area
+    screenshot = np.array(ImageGrab.grab(bbox=(L, T, R, B)))
+    screenshot_gray = cv2.cvtColor(screenshot, cv2.COLOR_BGR2GRAY)
+
+    # Recognize the four metrics respectively
+    likes = find_icon_and_read_number(like_icon_path, screenshot_gray)
+    shares = find_icon_and_read_number(share_icon_path, screenshot_gray)
+    favorites = find_icon_and_read_number(favorite_icon_path, screenshot_gray)
+    comments = find_icon_and_read_number(comment_icon_path, screenshot_gray)
+
+    return likes, shares, favorites, comments
+
+def find_search_icon_coordination(left, top, right, bottom):
+    template_path = search_icon_path
+    L, T, R, B = left, top, right, bottom  # The coordinates of article area
+    screenshot = np.array(ImageGrab.grab(bbox=(L, T, R, B)))
+    screenshot_gray = cv2.cvtColor(screenshot, cv2.COLOR_BGR2GRAY)
+    template = cv2.imread(template_path, 0)  # Grayscale
+    if template is None:
+        logger.info(f"❌ Template image {template_path} not found")
+        return 0
+
+    # Template matching
+    res = cv2.matchTemplate(screenshot_gray, template, cv2.TM_CCOEFF_NORMED)
+    min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(res)
+    # Get top-left coordinates of the icon
+    top_left = max_loc
+    h, w = template.shape[:2]
+    return top_left[1]+2, top_left[0]+2
@@ -0,0 +1,246 @@
+"""
+Reuse of one browser, and of contexts and pages per platform, across the urls of a worker process.
+
+    pool = PagePool()
+    await pool.start()
+    async with page_for(url, pool) as page:
+        ...
+    await pool.close()
+
+Between urls the page is reset: the snapshot capture is detached and the page goes to
+about:blank. Cookies stay in the context, so a platform stays logged in. A page is recycled
+(its context closed and a new one created on the next url) after `page_max_navigations`
+urls, when its JS heap exceeds `page_max_js_heap_mb`, or when the scrape failed. When the
+browser processes of this worker exceed `browser_max_rss_mb` together, new pages go to a newly
+launched browser and the old one is closed when its last page is released; a browser killed
+by the watchdog is replaced the same way.
+
+Concurrent scrapes of one platform (scrape_api.scrape_many) get one page each. HAR
+record/replay needs a context per url, so `page_for` falls back to a fresh browser per url
+when `config.har_mode` is set, as it does without a pool or with `page_reuse_enabled` off.
+"""
+from contextlib import asynccontextmanager
+from playwright.async_api import async_playwright
+import asyncio
+import config
+import utils
+import browser_utils
+import browser_watchdog
+import snapshot_store
+from logging_config import get_logger
+from run_metrics import get_metrics
+
+logger = get_logger()
+metrics = get_metrics()
+
+LAUNCH_ARGS = ['--start-maximized']
+
+JS_HEAP_SCRIPT = "() => performance.memory ? performance.memory.usedJSHeapSize : null"
+
+
+def browser_rss_mb():
+    """
+    Resident memory of all browser processes of this worker, in MB
+    """
+    total = 0
+    for process in browser_watchdog.browser_processes():
+        try:
+            total += process.memory_info().rss
+        except Exception:
+            continue
+    return total / (1024 * 1024)
+
+
+class _Slot:
+    def __init__(self, browser, context, page):
+        self.browser = browser
+        self.context = context
+        self.page = page
+        self.navigations = 0
+
+
+class PagePool:
+    """
+    One browser for the worker, idle contexts and pages kept per platform
+    """
+
+    def __init__(self):
+        self._playwright = None
+        self.browser = None
+        self.idle = {}
+        # pages in use per browser, and browsers replaced but still serving some of them
+        self._busy = {}
+        self._retired = set()
+        # concurrent pages wait for the browser being launched instead of launching their own
+        self._launch_lock = asyncio.Lock()
+
+    @property
+    def busy(self):
+        return sum(self._busy.values())
+
+    async def start(self):
+        self._playwright = await async_playwright().start()
+        return self
+
+    async def warm(self):
+        """
+        Launch the browser now instead of on the first url
+        """
+        await self._ensure_browser(None)
+
+    async def close(self):
+        await self._discard_idle()
+        for browser in list(self._retired) + ([self.browser] if self.browser is not None else []):
+            await self._close_browser(browser)
+        self.browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+    async def _close_browser(self, browser):
+        self._retired.discard(browser)
+        self._busy.pop(browser, None)
+        await browser_watchdog.bounded(browser.close(), "browser close", browser=browser)
+
+    async def _retire(self, browser):
+        """
+        New pages go to a new browser from now on; `browser` is closed once its last page is released
+        """
+        if browser is not self.browser:
+            # already retired or closed
+            return
+        self.browser = None
+        await self._discard_idle()
+        if self._busy.get(browser):
+            self._retired.add(browser)
+        else:
+            await self._close_browser(browser)
+
+    async def _ensure_browser(self, platform):
+        if self.browser is not None and self.browser.is_connected():
+            return self.browser
+        async with self._launch_lock:
+            if self.browser is not None and not self.browser.is_connected():
+                logger.warning("⚠️ Browser disconnected, launching a new one")
+                metrics.inc("page_recycles_total", reason="browser_lost")
+                await self._retire(self.browser)
+            if self.browser is None:
+                with metrics.span("launch", platform):
+                    self.browser = await browser_watchdog.launch(
+                        self._playwright.chromium, headless=True, args=LAUNCH_ARGS
+                    )
+            return self.browser
+
+    async def _discard(self, platform, slot, reason, detail=""):
+        snapshot_store.stop_capture(slot.page)
+        if reason:
+            logger.info(f"♻️ Recycling a {platform} page after {slot.navigations} urls: {reason}{detail}")
+            metrics.inc("page_recycles_total", platform=platform, reason=reason)
+        # other pages may still use the browser: don't kill it, replace it once they are done
+        if not await browser_watchdog.bounded(slot.context.close(), "context close", kill=False):
+            await self._retire(slot.browser)
+
+    async def _discard_idle(self):
+        idle, self.idle = self.idle, {}
+        for platform, slots in idle.items():
+            for slot in slots:
+                await self._discard(platform, slot, None)
+
+    async def _js_heap_mb(self, page):
+        try:
+            heap = await page.evaluate(JS_HEAP_SCRIPT)
+        except Exception:
+            return None
+        return heap / (1024 * 1024) if heap else None
+
+    async def _release(self, platform, slot):
+        snapshot_store.stop_capture(slot.page)
+        heap_mb = await self._js_heap_mb(slot.page)
+        if slot.browser is not self.browser:
+            # its browser is being replaced
+            await self._discard(platform, slot, None)
+        elif slot.navigations >= config.page_max_navigations:
+            await self._discard(platform, slot, "navigations")
+        elif heap_mb and heap_mb > config.page_max_js_heap_mb:
+            await self._discard(platform, slot, "js_heap", f" {heap_mb:.0f} MB")
+        else:
+            try:
+                await slot.page.goto("about:blank")
+                self.idle.setdefault(platform, []).append(slot)
+            except Exception:
+                await self._discard(platform, slot, "reset_failed")
+
+        # a retired browser still counts in the RSS, wait until it is gone before measuring again
+        if self.browser is not None and not self._retired:
+            rss_mb = browser_rss_mb()
+            if rss_mb > config.browser_max_rss_mb:
+                logger.info(f"♻️ Browser processes use {rss_mb:.0f} MB, relaunching the browser")
+                metrics.inc("page_recycles_total", reason="browser_rss")
+                await self._retire(self.browser)
+
+    async def _page_done(self, browser):
+        if browser not in self._busy:
+            # closed by close()
+            return
+        self._busy[browser] -= 1
+        if browser in self._retired and not self._busy[browser]:
+            await self._close_browser(browser)
+
+    @asynccontextmanager
+    async def page(self, url):
+        """
+        An idle page of the platform of `url` or a new one, reset and possibly recycled once the block exits.
+        Concurrent blocks get different pages.
+        """
+        platform = utils.platform_from_url(url)
+        browser = await self._ensure_browser(platform)
+        idle = self.idle.get(platform)
+        slot = idle.pop() if idle else None
+        # counted before any await, so a retired browser isn't closed under the new page
+        self._busy[browser] = self._busy.get(browser, 0) + 1
+        if slot is None:
+            try:
+                with metrics.span("new_context", platform):
+                    context = await browser_utils.new_context(browser, url)
+                    slot = _Slot(browser, context, await context.new_page())
+            except BaseException:
+                await self._page_done(browser)
+                raise
+        slot.navigations += 1
+        released = False
+        try:
+            yield slot.page
+            await self._release(platform, slot)
+            released = True
+        finally:
+            if not released:
+                # failed, cancelled (deadline) or the release itself failed: the page state is unknown
+                idle = self.idle.get(platform)
+                if idle and slot in idle:
+                    idle.remove(slot)
+                await self._discard(platform, slot, "error")
+            await self._page_done(slot.browser)
+
+
+@asynccontextmanager
+async def page_for(url, pool=None):
+    """
+    A page to scrape `url` with: from the pool, or in a browser launched for this url and
+    closed afterwards when there is no pool or HAR record/replay is on
+    """
+    if pool is not None and config.page_reuse_enabled and not config.har_mode:
+        async with pool.page(url) as page:
+            yield page
+        return
+
+    platform = utils.platform_from_url(url)
+    async with async_playwright() as p:
+        with metrics.span("launch", platform):
+            browser = await browser_watchdog.launch(p.chromium, headless=True, args=LAUNCH_ARGS)
+            context = await browser_utils.new_context(browser, url)
+            page = await context.new_page()
+        try:
+            yield page
+        finally:
+            logger.info("🗑️ Closing browser.")
+            await browser_utils.close_browser(browser, context)
@@ -0,0 +1,141 @@
+"""
+Re-run the Douyin, Weibo and Weixin extractors over stored page snapshots (see snapshot_store.py)
+and upsert the results into the database, without any network access.
+
+Usage:
+    python reextract.py [--workers 4] [--platform weibo] [--since 2024-05-01] [--batch-size 50]
+
+The latest snapshot of every url is loaded into a browser page with JavaScript disabled and
+all requests aborted, then the platform's `extract_item` runs on it exactly as in a live
+scrape. Batches of snapshots are extracted in a process pool, each worker with one browser;
+the main process is the only database writer.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import sqlite3
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from playwright.async_api import async_playwright
+import config
+import utils
+import browser_utils
+import snapshot_store
+import scrape_douyin_post
+import scrape_weibo_post
+import scrape_weixin_post
+from logging_config import get_logger, log_context
+
+logger = get_logger()
+
+EXTRACTORS = {
+    'weibo': scrape_weibo_post.extract_item,
+    'weixin': scrape_weixin_post.extract_item,
+    'douyin': scrape_douyin_post.extract_item,
+}
+
+# filled later by other steps (segmentation, classification, UI automation), never overwritten here
+KEEP_COLUMNS = {"link1", "unnamed", "link2", "content_segmented", "is_agriculture_related", "index_number"}
+
+
+async def _extract_batch(snapshots, snapshot_dir):
+    store = snapshot_store.SnapshotStore(snapshot_dir)
+    items = []
+    failed = []
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        # the snapshot is the rendered DOM already, its scripts must not run (and fetch) again
+        context = await browser.new_context(**browser_utils.CONTEXT_OPTIONS, java_script_enabled=False)
+        await context.route("**/*", lambda route: route.abort())
+        page = await context.new_page()
+        try:
+            for url, fetched_at, content_hash in snapshots:
+                with log_context(url):
+                    try:
+                        snapshot = store.get(content_hash)
+                        await page.set_content(snapshot["html"], wait_until="domcontentloaded")
+                        # relative times ("2天前") are relative to the fetch, not to this run
+                        now = datetime.fromisoformat(fetched_at)
+                        items.append(await EXTRACTORS[utils.platform_from_url(url)](page, url, now=now))
+                    except Exception as e:
+                        logger.warning(f"⚠️ Re-extraction failed for {url}: {e}")
+                        failed.append(url)
+        finally:
+            await browser_utils.close_browser(browser, context)
+            store.close()
+    return items, failed
+
+
+def extract_batch(snapshots, snapshot_dir=None):
+    """
+    Extract items from a batch of (url, fetched_at, content hash) snapshots, runs in a pool worker
+    :return: (items, failed urls)
+    """
+    return asyncio.run(_extract_batch(snapshots, snapshot_dir))
+
+
+def upsert_items(conn, items):
+    """
+    Upsert re-extracted items, overwriting only the fields the extractor produced a value for
+    :return: number of upserted items
+    """
+    groups = {}
+    for item in items:
+        values = {k: v for k, v in item.items() if v is not None}
+        update_columns = tuple(sorted(k for k in values if k not in KEEP_COLUMNS))
+        groups.setdefault(update_columns, []).append(values)
+    for update_columns, group in groups.items():
+        # the counts are those of the original fetch, already in the metric history with its time
+        utils.insert_data(
+            conn, config.table_name, group, update_columns=list(update_columns) or None, record_metrics=False
+        )
+    return len(items)
+
+
+def reextract(platform=None, since=None, workers=None, batch_size=50):
+    """
+    Re-extract the latest snapshot of every url into config.db_name
+    :return: (number of upserted items, list of failed urls)
+    """
+    store = snapshot_store.SnapshotStore()
+    snapshots = [
+        (url, fetched_at, content_hash)
+        for url, fetched_at, content_hash in store.latest(platform, since)
+        if utils.platform_from_url(url) in EXTRACTORS
+    ]
+    store.close()
+    if not snapshots:
+        logger.info("No snapshots to re-extract")
+        return 0, []
+
+    batches = [snapshots[i:i + batch_size] for i in range(0, len(snapshots), batch_size)]
+    logger.info(f"Re-extracting {len(snapshots)} snapshots in {len(batches)} batches")
+
+    conn = sqlite3.connect(config.db_name)
+    utils.create_table(conn, config.table_name)
+    upserted = 0
+    failed = []
+    # spawn, Playwright doesn't survive fork
+    ctx = multiprocessing.get_context('spawn')
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+            futures = [pool.submit(extract_batch, batch, config.snapshot_dir) for batch in batches]
+            for future in as_completed(futures):
+                items, batch_failed = future.result()
+                upserted += upsert_items(conn, items)
+                failed += batch_failed
+    finally:
+        conn.close()
+
+    logger.info(f"✅ Re-extracted {upserted} of {len(snapshots)} snapshots, {len(failed)} failed")
+    return upserted, failed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Re-run the extractors over stored page snapshots")
+    parser.add_argument('--workers', type=int, default=None, help="extraction processes, default the CPU count")
+    parser.add_argument('--platform', choices=list(EXTRACTORS), help="only snapshots of this platform")
+    parser.add_argument('--since', help="only snapshots fetched at or after this time, e.g. 2024-05-01")
+    parser.add_argument('--batch-size', type=int, default=50, help="snapshots per worker task")
+    args = parser.parse_args()
+    reextract(args.platform, args.since, args.workers, args.batch_size)
@@ -0,0 +1,176 @@
+"""
+Refresh planner: picks the posts whose counts most likely moved since they were last scraped,
+so a limited re-scrape budget goes where the metrics actually change.
+
+    python refresh_planner.py [--budget 2000] [--output refresh_urls.txt] [--enqueue]
+
+The engagement of a post is the weighted sum of its counts (`refresh_metric_weights`). Its
+velocity at the last scrape comes from the last two snapshots of metric_history, or is the
+average rate since publication when there is only one. Velocity is assumed to decay as
+age^-k (`refresh_decay_exponent`), so the expected gain since the last scrape is that decayed
+rate integrated up to now. Posts with no counts yet come first, posts scraped within
+`refresh_min_interval_minutes` are skipped, and the best `budget` posts are written as a
+url list for `main.py --urls` or enqueued with their expected gain as job priority.
+
+Only Weibo and Douyin are planned: the Weixin counts come from the UI step, not from main.py.
+"""
+import argparse
+import math
+import sqlite3
+import time
+from collections import namedtuple
+from datetime import datetime
+import config
+import utils
+import job_queue
+import metric_history
+from logging_config import get_logger
+
+logger = get_logger()
+
+REFRESH_PLATFORMS = ("weibo", "douyin")
+
+Candidate = namedtuple("Candidate", ["url", "expected_gain", "velocity", "hours_since_scrape"])
+
+
+def _parse_time(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).strip()).timestamp()
+    except ValueError:
+        return None
+
+
+def engagement(snapshot):
+    """
+    Weighted sum of the counts of a snapshot dict, missing counts count 0
+    """
+    return sum((snapshot.get(metric) or 0) * weight for metric, weight in config.refresh_metric_weights.items())
+
+
+def expected_gain(velocity, age_at_scrape, age_now, decay_exponent=None):
+    """
+    Engagement expected between the last scrape and now for a post with `velocity`
+    (per hour) at `age_at_scrape` hours, decaying as age^-k
+    """
+    k = config.refresh_decay_exponent if decay_exponent is None else decay_exponent
+    if age_now <= age_at_scrape or velocity <= 0:
+        return 0.0
+    if abs(k - 1) < 1e-9:
+        return velocity * age_at_scrape * math.log(age_now / age_at_scrape)
+    return velocity * age_at_scrape ** k * (age_now ** (1 - k) - age_at_scrape ** (1 - k)) / (1 - k)
+
+
+def _load_posts(conn, table_name):
+    """
+    :return: dict post id -> (link1, published, created, list of the last two snapshots, newest first)
+    """
+    metric_history.create_table(conn)
+    metrics = ", ".join(f"r.{metric}" for metric in metric_history.METRICS)
+    rows = conn.execute(
+        f"""
+        WITH ranked AS (
+            SELECT *, ROW_NUMBER() OVER (PARTITION BY post_id ORDER BY ts DESC) AS rn
+            FROM {metric_history.SNAPSHOT_TABLE}
+        )
+        SELECT p.id, p.link1, p.publication_date, p.created_at, r.ts, {metrics}
+        FROM {table_name} AS p LEFT JOIN ranked AS r ON r.post_id = p.id AND r.rn <= 2
+        ORDER BY p.id, r.ts DESC"""
+    )
+    posts = {}
+    for post_id, link, published, created, ts, *counts in rows:
+        if utils.platform_from_url(link) not in REFRESH_PLATFORMS:
+            continue
+        post = posts.setdefault(post_id, (link, _parse_time(published), _parse_time(created), []))
+        if ts is not None:
+            post[3].append(dict(zip(["ts"] + list(metric_history.METRICS), [ts] + counts)))
+    return posts
+
+
+def plan(conn, budget=None, table_name=None, now=None):
+    """
+    Rank the posts by expected engagement gain since their last scrape
+    :return: (the best `budget` Candidates, all ranked Candidates)
+    """
+    budget = config.refresh_budget if budget is None else budget
+    table_name = table_name or config.table_name
+    now = now or time.time()
+    min_interval = config.refresh_min_interval_minutes * 60
+
+    candidates = []
+    for link, published, created, snapshots in _load_posts(conn, table_name).values():
+        if not snapshots:
+            # never measured, nothing to compare with
+            candidates.append(Candidate(link, math.inf, None, None))
+            continue
+        last = snapshots[0]
+        if now - last["ts"] < min_interval:
+            continue
+        published = published or created or last["ts"]
+        age_at_scrape = max((last["ts"] - published) / 3600, 1.0)
+        age_now = max((now - published) / 3600, age_at_scrape)
+        if len(snapshots) == 2 and last["ts"] > snapshots[1]["ts"]:
+            previous = snapshots[1]
+            velocity = max(engagement(last) - engagement(previous), 0) * 3600 / (last["ts"] - previous["ts"])
+        else:
+            velocity = engagement(last) / age_at_scrape
+        candidates.append(
+            Candidate(link, expected_gain(velocity, age_at_scrape, age_now), velocity, (now - last["ts"]) / 3600)
+        )
+
+    candidates.sort(key=lambda candidate: candidate.expected_gain, reverse=True)
+    return candidates[:budget], candidates
+
+
+def job_priority(candidate, top_priority):
+    return top_priority if math.isinf(candidate.expected_gain) else int(round(candidate.expected_gain))
+
+
+def write_plan(selected, path):
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(f"{candidate.url}\n" for candidate in selected)
+
+
+def enqueue_plan(selected):
+    """
+    Enqueue the planned urls with their expected gain as priority, unmeasured posts first
+    """
+    finite = [candidate.expected_gain for candidate in selected if not math.isinf(candidate.expected_gain)]
+    top_priority = int(round(max(finite, default=0))) + 1
+    queue = job_queue.JobQueue()
+    queue.enqueue(
+        [candidate.url for candidate in selected],
+        priorities={candidate.url: job_priority(candidate, top_priority) for candidate in selected},
+    )
+    logger.info(f"Queue status: {queue.stats()}")
+    queue.close()
+
+
+def summarize(selected, candidates):
+    planned = sum(candidate.expected_gain for candidate in selected if not math.isinf(candidate.expected_gain))
+    total = sum(candidate.expected_gain for candidate in candidates if not math.isinf(candidate.expected_gain))
+    unmeasured = sum(math.isinf(candidate.expected_gain) for candidate in selected)
+    share = f"{planned / total:.0%}" if total else "n/a"
+    logger.info(
+        f"✅ Planned {len(selected)} of {len(candidates)} due posts ({unmeasured} never measured), "
+        f"covering {share} of the expected engagement change"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plan the re-scrapes with the largest expected metric change")
+    parser.add_argument("--budget", type=int, default=None, help="number of fetches, default config.refresh_budget")
+    parser.add_argument("--output", default="refresh_urls.txt", help="planned urls, best first (for main.py --urls)")
+    parser.add_argument("--enqueue", action="store_true", help="also enqueue them into the job queue with priorities")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(config.db_name)
+    utils.create_table(conn, config.table_name)
+    selected, candidates = plan(conn, args.budget)
+    conn.close()
+    write_plan(selected, args.output)
+    logger.info(f"Wrote {len(selected)} urls to {args.output}")
+    if args.enqueue:
+        enqueue_plan(selected)
+    summarize(selected, candidates)
@@ -0,0 +1,229 @@
+"""
+Lightweight run metrics: stage timing spans, counters and latency histograms.
+
+    metrics = get_metrics()
+    with metrics.span("navigate", platform="douyin"):
+        await page.goto(url)
+    metrics.inc("scrapes_total", platform="douyin", status="success")
+
+A run ends with `metrics.write_report()`, which writes a JSON summary and,
+when `config.metrics_prometheus_path` is set, a Prometheus textfile for the
+node exporter textfile collector.
+"""
+import contextvars
+import json
+import os
+import time
+from contextlib import contextmanager
+import config
+
+# Upper bounds (seconds) of the latency histogram buckets, +Inf is implicit
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+METRIC_PREFIX = "scraper"
+
+# stage holder of the scrape running in this context, see RunMetrics.track_stage
+_current_stage = contextvars.ContextVar("current_stage", default=None)
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram, constant memory regardless of the number of samples
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q):
+        """
+        Estimate a quantile by linear interpolation inside its bucket (like Prometheus histogram_quantile)
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for i, bucket_count in enumerate(self.counts):
+            upper = self.buckets[i] if i < len(self.buckets) else self.max
+            if bucket_count and seen + bucket_count >= rank:
+                estimate = lower + (upper - lower) * (rank - seen) / bucket_count
+                return min(max(estimate, self.min), self.max)
+            seen += bucket_count
+            lower = upper
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "min": self.min,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+        }
+
+
+class RunMetrics:
+    def __init__(self):
+        self.started_at = time.time()
+        self.counters = {}
+        self.histograms = {}
+        self.timeouts = []
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(value)
+
+    @contextmanager
+    def span(self, stage, platform=None):
+        """
+        Time a stage of a scrape into the `stage_seconds` histogram.
+        Works around awaits inside async code as well.
+        """
+        holder = _current_stage.get()
+        if holder is not None:
+            holder["stage"] = stage
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("stage_seconds", time.perf_counter() - start, platform=platform, stage=stage)
+
+    @contextmanager
+    def track_stage(self):
+        """
+        Remember the last stage started inside the block, also from tasks created in it,
+        e.g. to report where a scrape was when its deadline passed
+        :return: dict with the 'stage' key once a span started
+        """
+        holder = {}
+        token = _current_stage.set(holder)
+        try:
+            yield holder
+        finally:
+            _current_stage.reset(token)
+
+    def record_timeout(self, url, seconds, platform=None, stage=None):
+        """
+        Note a url whose scrape was cancelled at its deadline, listed in the report
+        """
+        self.timeouts.append({"url": url, "platform": platform, "stage": stage, "seconds": round(seconds, 3)})
+
+    def summary(self):
+        def labelled(key):
+            name, labels = key
+            return {"name": name, "labels": dict(labels)}
+
+        return {
+            "started_at": self.started_at,
+            "duration_seconds": round(time.time() - self.started_at, 3),
+            "counters": [dict(labelled(key), value=value) for key, value in sorted(self.counters.items())],
+            "histograms": [dict(labelled(key), **hist.summary()) for key, hist in sorted(self.histograms.items())],
+            "timeouts": self.timeouts,
+        }
+
+    def to_prometheus(self, const_labels=()):
+        """
+        Render all metrics in the Prometheus text exposition format
+        :param const_labels: (name, value) pairs added to every sample, e.g. the worker writing the file
+        """
+        def fmt_labels(labels, extra=()):
+            pairs = list(const_labels) + list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{_escape_label(v)}"' for k, v in pairs) + "}"
+
+        lines = []
+        for name in sorted({key[0] for key in self.counters}):
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} counter")
+            for (metric, labels), value in sorted(self.counters.items()):
+                if metric == name:
+                    lines.append(f"{METRIC_PREFIX}_{name}{fmt_labels(labels)} {value}")
+        for name in sorted({key[0] for key in self.histograms}):
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} histogram")
+            for (metric, labels), hist in sorted(self.histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(list(hist.buckets) + ["+Inf"], hist.counts):
+                    cumulative += count
+                    lines.append(f"{METRIC_PREFIX}_{name}_bucket{fmt_labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{METRIC_PREFIX}_{name}_sum{fmt_labels(labels)} {hist.sum}")
+                lines.append(f"{METRIC_PREFIX}_{name}_count{fmt_labels(labels)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_report(self, suffix=None):
+        """
+        Write the JSON summary (and the Prometheus textfile if configured).
+        :param suffix: appended to the file names, e.g. the shard of a worker process; also the
+            `worker` label of the Prometheus samples, as the node exporter rejects the same series
+            coming from several textfiles
+        :return: the summary dict
+        """
+        summary = self.summary()
+        _atomic_write(report_path(suffix), json.dumps(summary, ensure_ascii=False, indent=2))
+        if config.metrics_prometheus_path:
+            _atomic_write(_with_suffix(config.metrics_prometheus_path, suffix),
+                          self.to_prometheus([("worker", suffix)] if suffix else ()))
+        return summary
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def report_path(suffix=None):
+    """
+    Path of the JSON report written by `write_report(suffix)`
+    """
+    return _with_suffix(config.metrics_json_path, suffix)
+
+
+def _with_suffix(path, suffix):
+    if not suffix:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{suffix}{ext}"
+
+
+def _atomic_write(path, text):
+    # the node exporter may read the file at any time, never expose a half-written one
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+_metrics = RunMetrics()
+
+
+def get_metrics():
+    return _metrics
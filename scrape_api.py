@@ -0,0 +1,230 @@
+"""
+Async library API of the scrapers, for embedding them in other asyncio programs.
+
+    async for record in scrape_many(urls, concurrency=4):
+        if isinstance(record, ScrapeError):
+            ...
+        else:
+            record.content, [comment.content for comment in record.comments]
+
+`scrape_many` yields one record per url as soon as it is done, in completion order: a `Post`
+(with its `Comment`s) or a `ScrapeError`. Nothing is written to the database unless a sink is
+given: any callable (or coroutine function) called with each Post before it is yielded, e.g.
+`SqliteSink(conn)`, which upserts like main.py does.
+
+Pages come from a page_pool.PagePool shared by the concurrent scrapes (one is started and
+closed by `scrape_many` unless `pool` is given). Each url gets the `url_timeout_seconds`
+deadline; the hung-browser watchdog of main.py is not used, as it would kill the browser of
+every scrape in flight.
+"""
+import asyncio
+import inspect
+import json
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+import config
+import utils
+import metric_history
+import page_pool
+import browser_watchdog
+import scrape_weibo_post
+import scrape_weixin_post
+import scrape_douyin_post
+from logging_config import get_logger, log_context
+from run_metrics import get_metrics
+
+logger = get_logger()
+metrics = get_metrics()
+
+ITEM_SCRAPERS = {
+    'weibo': scrape_weibo_post.scrape_item,
+    'weixin': scrape_weixin_post.scrape_item,
+    'douyin': scrape_douyin_post.scrape_item,
+}
+
+
+@dataclass(slots=True)
+class Comment:
+    post_url: str
+    username: str | None
+    content: str | None
+    time: str | None
+    likes: int | None
+
+    def to_dict(self):
+        """
+        Comment dict as stored in the comments column
+        """
+        return {
+            "username": self.username,
+            "content": self.content,
+            "time": self.time,
+            "likes": str(self.likes if self.likes is not None else 0),
+        }
+
+
+@dataclass(slots=True)
+class Post:
+    url: str
+    platform: str
+    user_name: str | None
+    publication_date: str | None
+    content: str | None
+    shared_count: int | None
+    comment_count: int | None
+    like_count: int | None
+    # None when the platform's scraper doesn't collect comments (Weixin)
+    comments: list[Comment] | None = None
+    scraped_at: str = field(default_factory=lambda: datetime.now().isoformat(sep=" ", timespec="seconds"))
+
+    @classmethod
+    def from_item(cls, item, platform):
+        """
+        :param item: item dict returned by a scraper's scrape_item
+        """
+        comments = None
+        if "comments" in item:
+            raw = item["comments"]
+            comments = [
+                Comment(
+                    post_url=item["link1"],
+                    username=comment.get("username"),
+                    content=comment.get("content"),
+                    time=comment.get("time"),
+                    likes=metric_history.to_count(comment.get("likes")),
+                )
+                for comment in (json.loads(raw) if isinstance(raw, str) else raw or [])
+            ]
+        return cls(
+            url=item["link1"],
+            platform=platform,
+            user_name=item.get("user_name"),
+            publication_date=item.get("publication_date"),
+            content=item.get("content"),
+            shared_count=metric_history.to_count(item.get("shared_count")),
+            comment_count=metric_history.to_count(item.get("comment_count")),
+            like_count=metric_history.to_count(item.get("like_count")),
+            comments=comments,
+        )
+
+    def to_item(self):
+        """
+        :return: item dict for utils.insert_data
+        """
+        item = {
+            'unnamed': None,
+            'user_name': self.user_name,
+            'publication_date': self.publication_date,
+            'content': self.content,
+            'shared_count': self.shared_count,
+            'comment_count': self.comment_count,
+            'like_count': self.like_count,
+            'link1': self.url,
+            'link2': None,
+            'content_segmented': None,
+            'is_agriculture_related': None,
+            'index_number': None,
+        }
+        if self.comments is not None:
+            item['comments'] = (
+                json.dumps([comment.to_dict() for comment in self.comments], ensure_ascii=False)
+                if self.comments else None
+            )
+        return item
+
+
+@dataclass(slots=True)
+class ScrapeError:
+    url: str
+    platform: str
+    # "failure", "timeout" or "unsupported", as the scrapes_total status
+    status: str
+    message: str
+    seconds: float
+
+
+class SqliteSink:
+    """
+    Sink that upserts every Post into a table, like main.py
+    """
+
+    def __init__(self, conn, table_name=None):
+        self.conn = conn
+        self.table_name = table_name or config.table_name
+        utils.create_table(conn, self.table_name)
+
+    def __call__(self, post):
+        with metrics.span("insert", post.platform):
+            if not utils.insert_data(self.conn, self.table_name, [post.to_item()]):
+                raise sqlite3.DatabaseError(f"The post {post.url} couldn't be saved to {self.table_name}")
+
+
+async def scrape_one(url, pool=None, timeout=None, platform=None):
+    """
+    Scrape one url with the scraper of its platform, within the url deadline
+    :param platform: scraper to use, default the platform of the url (set it for fixture or mirror urls)
+    :return: Post, or ScrapeError when it failed, timed out or isn't supported
+    """
+    platform = platform or utils.platform_from_url(url)
+    scrape_item = ITEM_SCRAPERS.get(platform)
+    if scrape_item is None:
+        metrics.inc("scrapes_total", platform=platform, status="unsupported")
+        return ScrapeError(url, platform, "unsupported", "Unsupported url", 0.0)
+    timeout = timeout or config.url_timeout_seconds
+    start = time.perf_counter()
+    with log_context(url), metrics.track_stage() as stage:
+        try:
+            item = await browser_watchdog.run_with_deadline(scrape_item(url, pool), timeout)
+            record = Post.from_item(item, platform)
+        except asyncio.TimeoutError:
+            elapsed = time.perf_counter() - start
+            logger.error(f"⏱️ Scrape of {url} cancelled after {elapsed:.1f}s, stuck in stage: {stage.get('stage')}")
+            metrics.record_timeout(url, elapsed, platform=platform, stage=stage.get("stage"))
+            record = ScrapeError(url, platform, "timeout", f"Deadline of {timeout}s passed", elapsed)
+        except Exception as e:
+            logger.error(f"❌ Scrape of {url} failed: {e}")
+            record = ScrapeError(url, platform, "failure", str(e) or type(e).__name__, time.perf_counter() - start)
+    elapsed = time.perf_counter() - start
+    metrics.observe("url_seconds", elapsed, platform=platform)
+    metrics.inc("scrapes_total", platform=platform, status="success" if isinstance(record, Post) else record.status)
+    return record
+
+
+async def scrape_many(urls, *, concurrency=None, sink=None, pool=None, timeout=None):
+    """
+    Scrape urls concurrently, yielding a Post or ScrapeError for each as soon as it is done
+    :param concurrency: scrapes in flight at a time, default config.scrape_concurrency
+    :param sink: called (and awaited, if it returns an awaitable) with each Post before it is yielded,
+        e.g. SqliteSink(conn); its exceptions propagate
+    :param pool: page_pool.PagePool to take pages from, default a pool started and closed here
+    :param timeout: deadline of each url in seconds, default config.url_timeout_seconds
+    :return: async generator of Post and ScrapeError records, in completion order
+    """
+    concurrency = concurrency or config.scrape_concurrency
+    own_pool = pool is None
+    if own_pool:
+        pool = await page_pool.PagePool().start()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(url):
+        async with semaphore:
+            return await scrape_one(url, pool, timeout)
+
+    tasks = [asyncio.ensure_future(run(url)) for url in urls]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            record = await next_done
+            if sink is not None and isinstance(record, Post):
+                written = sink(record)
+                if inspect.isawaitable(written):
+                    await written
+            yield record
+    finally:
+        # the caller stopped early or a sink failed: don't leave scrapes running
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if own_pool:
+            await pool.close()
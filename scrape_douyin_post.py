@@ -1,12 +1,20 @@
 import asyncio
 from datetime import datetime
-from playwright.async_api import async_playwright
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
 import json
 import utils
+import comment_parsers
+import browser_utils
+import snapshot_store
+import page_pool
 import config
 from logging_config import get_logger
+from run_metrics import get_metrics
 
 logger = get_logger()
+metrics = get_metrics()
+
+PLATFORM = 'douyin'
 
 async def extract_details_new(page):
     details = {
@@ -18,246 +26,252 @@ async def extract_details_new(page):
         "publish_time": None
     }
 
-    try:
-        # details["title"] = await page.locator(
-        #     'xpath=//div[@data-e2e="user-info"]/following-sibling::div[1]/a[contains(@href, "www.douyin.com/user/")]/div'
-        # ).inner_text()
-        title = await page.locator(
-            'xpath=(//div[@data-e2e="user-info"]/div[2]/a/div)[2]'
-        ).inner_text()
-        details["title"] = title.split("\n")[0]
-        print(f"scrape title: {details['title']}")
-    except Exception as e:
-        print(f"scrape title error: {e}")
-        pass
+    with metrics.span("locate_title", PLATFORM):
+        try:
+            # details["title"] = await page.locator(
+            #     'xpath=//div[@data-e2e="user-info"]/following-sibling::div[1]/a[contains(@href, "www.douyin.com/user/")]/div'
+            # ).inner_text()
+            title = await page.locator(
+                'xpath=(//div[@data-e2e="user-info"]/div[2]/a/div)[2]'
+            ).inner_text()
+            details["title"] = title.split("\n")[0]
+            logger.info(f"scrape title: {details['title']}")
+        except Exception as e:
+            logger.warning(f"scrape title error: {e}")
+            pass
 
-    try:
-        details["content"] = await page.locator('xpath=//div[@data-e2e="detail-video-info"]/div[1]/div/h1').inner_text()
-        print(f"scrape content: {details['content']}")
-    except Exception as e:
-        print(f"scrape content error: {e}")
-        pass
+    with metrics.span("locate_content", PLATFORM):
+        try:
+            details["content"] = await page.locator('xpath=//div[@data-e2e="detail-video-info"]/div[1]/div/h1').inner_text()
+            logger.info(f"scrape content: {details['content']}")
+        except Exception as e:
+            logger.warning(f"scrape content error: {e}")
+            pass
 
-    try:
-        details["like_count"] = await page.locator('xpath=//div[@data-e2e="detail-video-info"]/div[2]/div[1]/div[1]/span').inner_text()
-        print(f"scrape like_count: {details['like_count']}")
-    except Exception as e:
-        print(f"scrape like_count error: {e}")
-        pass
+    with metrics.span("locate_like_count", PLATFORM):
+        try:
+            details["like_count"] = await page.locator('xpath=//div[@data-e2e="detail-video-info"]/div[2]/div[1]/div[1]/span').inner_text()
+            logger.info(f"scrape like_count: {details['like_count']}")
+        except Exception as e:
+            logger.warning(f"scrape like_count error: {e}")
+            pass
 
-    try:
-        details["comment_count"] = await page.locator('xpath=//div[@data-e2e="detail-video-info"]/div[2]/div/div[2]/span').inner_text()
-        print(f"scrape comment_count: {details['comment_count']}")
-    except Exception as e:
-        print(f"scrape comment_count error: {e}")
-        pass
+    with metrics.span("locate_comment_count", PLATFORM):
+        try:
+            details["comment_count"] = await page.locator('xpath=//div[@data-e2e="detail-video-info"]/div[2]/div/div[2]/span').inner_text()
+            logger.info(f"scrape comment_count: {details['comment_count']}")
+        except Exception as e:
+            logger.warning(f"scrape comment_count error: {e}")
+            pass
 
-    try:
-        details["share_count"] = await page.locator('xpath=//div[@data-e2e="detail-video-info"]/div[2]/div/div[4]/span').inner_text()
-        print(f"scrpae share_count: {details['share_count']}")
-    except Exception as e:
-        print(f"scrape share_count error: {e}")
-        pass
+    with metrics.span("locate_share_count", PLATFORM):
+        try:
+            details["share_count"] = await page.locator('xpath=//div[@data-e2e="detail-video-info"]/div[2]/div/div[4]/span').inner_text()
+            logger.info(f"scrape share_count: {details['share_count']}")
+        except Exception as e:
+            logger.warning(f"scrape share_count error: {e}")
+            pass
 
-    try:
-        publish_time = await page.locator('span[data-e2e="detail-video-publish-time"]').inner_text()
-        publish_time  = publish_time.replace('发布时间：', '').strip()
-        dt_object = datetime.strptime(publish_time.strip(), '%Y-%m-%d %H:%M')
-        # Format to YYYY-MM-DD HH:MM:SS (adding ':00' for seconds)
-        details["publish_time"] = dt_object.strftime('%Y-%m-%d %H:%M:%S')
-        print(f"scrape publish_time: {details['publish_time']}")
-    except Exception as e:
-        print(f"scrape publish_time error: {e}")
-        pass
+    with metrics.span("locate_publish_time", PLATFORM):
+        try:
+            publish_time = await page.locator('span[data-e2e="detail-video-publish-time"]').inner_text()
+            publish_time  = publish_time.replace('发布时间：', '').strip()
+            dt_object = datetime.strptime(publish_time.strip(), '%Y-%m-%d %H:%M')
+            # Format to YYYY-MM-DD HH:MM:SS (adding ':00' for seconds)
+            details["publish_time"] = dt_object.strftime('%Y-%m-%d %H:%M:%S')
+            logger.info(f"scrape publish_time: {details['publish_time']}")
+        except Exception as e:
+            logger.warning(f"scrape publish_time error: {e}")
+            pass
 
     return details
 
-async def extract_comments(page, max_comments=20):
+async def load_comments(page):
     """
-    Extracts comments from a Douyin post page.
-    
-    Args:
-        page: Playwright page object
-        max_comments: Maximum number of comments to extract (default: 20)
-    
-    Returns:
-        List of dictionaries containing comment data
+    Scroll the post page so the first comments get loaded
     """
-    comments = []
-    
-    try:
-        logger.info(f"🔍 Starting comment extraction (max: {max_comments})...")
-        
-        # Scroll to load more comments
-        logger.info("📜 Scrolling to load comments...")
-        for i in range(3):
-            try:
-                await page.evaluate("window.scrollBy(0, 500)")
-                await page.wait_for_timeout(2000)
-                logger.info(f"Scroll {i+1}/3 completed")
-            except Exception as e:
-                logger.error(f"Scroll error: {e}")
-        
-        # Try to locate comment elements using different selectors
-        comment_selectors = [
-            '[data-e2e="comment-item"]',
-            '.comment-item',
-            '[class*="comment"]'
-        ]
-        
-        comment_elements = None
-        for selector in comment_selectors:
+    # Scroll to load more comments
+    logger.info("📜 Scrolling to load comments...")
+    for i in range(3):
+        try:
+            await page.evaluate("window.scrollBy(0, 500)")
+            await page.wait_for_timeout(config.scroll_wait_ms)
+            logger.info(f"Scroll {i+1}/3 completed")
+        except Exception as e:
+            logger.error(f"Scroll error: {e}")
+
+
+COMMENT_SELECTORS = [
+    '[data-e2e="comment-item"]',
+    '.comment-item',
+    '[class*="comment"]',
+]
+# also matches the comment list, the content and time nodes of each comment, etc.
+GENERIC_COMMENT_SELECTOR = '[class*="comment"]'
+
+# Texts of the matches of `selector` after the first `skip`, at most `limit`, in page order.
+# Matches nested in a taken match are skipped (querySelectorAll is in document order, so a
+# match's descendants follow it). With listItems only the matches under the element with the
+# most matching children count, i.e. the items of the comment list, not the list itself or
+# the parts of each comment.
+COMMENT_TEXTS_JS = """
+([selector, skip, limit, listItems]) => {
+    let matches = Array.from(document.querySelectorAll(selector));
+    if (listItems) {
+        const counts = new Map();
+        for (const element of matches) {
+            counts.set(element.parentElement, (counts.get(element.parentElement) || 0) + 1);
+        }
+        let list = null;
+        let most = 0;
+        for (const [parent, count] of counts) {
+            if (count > most) {
+                list = parent;
+                most = count;
+            }
+        }
+        matches = matches.filter(element => element.parentElement === list);
+    }
+    const texts = [];
+    let taken = null;
+    let index = 0;
+    for (const element of matches) {
+        if (taken && taken.contains(element)) continue;
+        taken = element;
+        if (index++ < skip) continue;
+        texts.push(element.innerText);
+        if (texts.length >= limit) break;
+    }
+    return texts;
+}
+"""
+
+
+async def iter_comments(page, max_comments=20, batch_size=10, now=None):
+    """
+    Yield the parsed comments already loaded on a Douyin post page (see load_comments), in page order.
+    Comment texts are read in batches of at most `batch_size` elements per round trip and never more
+    than needed for `max_comments`, so a caller that stops early doesn't pay for the rest.
+    :return: async generator of comment dicts (see comment_parsers.parse_douyin_comment)
+    """
+    now = now or datetime.now()
+    # elements that don't parse as a comment also count, up to twice the cap
+    scan_limit = max_comments * 2
+    for selector in COMMENT_SELECTORS:
+        scanned = 0
+        yielded = 0
+        while yielded < max_comments and scanned < scan_limit:
+            limit = min(batch_size, max_comments - yielded, scan_limit - scanned)
             try:
-                comment_elements = await page.locator(selector).all()
-                if comment_elements and len(comment_elements) > 0:
-                    logger.info(f"✅ Found {len(comment_elements)} comments using selector: {selector}")
-                    break
+                texts = await page.evaluate(
+                    COMMENT_TEXTS_JS, [selector, scanned, limit, selector == GENERIC_COMMENT_SELECTOR]
+                )
             except Exception as e:
                 logger.info(f"Selector {selector} failed: {e}")
-                continue
-        
-        if not comment_elements or len(comment_elements) == 0:
-            logger.warning("⚠️ No comment elements found on page")
-            return comments
-        
-        # Extract data from each comment (limit to max_comments)
-        for idx, comment_elem in enumerate(comment_elements[:max_comments]):
-            try:
-                # comment_data = {
-                #     'username': None,
-                #     'content': None,
-                #     'time': None,
-                #     'likes': '0'
-                # }
-                
-                text = await comment_elem.inner_text()
-                comments.append(text)
-                '''
-                # Try to extract username
-                username_selectors = [
-                    '[data-e2e="comment-author-name"]',
-                    '.user-name',
-                    '[class*="author"]',
-                    '[class*="username"]'
-                ]
-                for selector in username_selectors:
-                    try:
-                        username_elem = comment_elem.locator(selector).first
-                        if await username_elem.count() > 0:
-                            comment_data['username'] = await username_elem.inner_text()
-                            break
-                    except:
-                        continue
-                
-                # Try to extract comment content
-                content_selectors = [
-                    '[data-e2e="comment-content"]',
-                    '.comment-text',
-                    '[class*="comment-content"]',
-                    '[class*="text"]'
-                ]
-                for selector in content_selectors:
-                    try:
-                        content_elem = comment_elem.locator(selector).first
-                        if await content_elem.count() > 0:
-                            comment_data['content'] = await content_elem.inner_text()
-                            break
-                    except:
-                        continue
-                
-                # Try to extract comment time
-                time_selectors = [
-                    '[data-e2e="comment-time"]',
-                    '.comment-time',
-                    '[class*="time"]',
-                    '[class*="date"]'
-                ]
-                for selector in time_selectors:
-                    try:
-                        time_elem = comment_elem.locator(selector).first
-                        if await time_elem.count() > 0:
-                            comment_data['time'] = await time_elem.inner_text()
-                            break
-                    except:
-                        continue
-                
-                # Try to extract like count
-                like_selectors = [
-                    '[data-e2e="comment-like-count"]',
-                    '.like-count',
-                    '[class*="like"]'
-                ]
-                for selector in like_selectors:
-                    try:
-                        like_elem = comment_elem.locator(selector).first
-                        if await like_elem.count() > 0:
-                            comment_data['likes'] = await like_elem.inner_text()
-                            break
-                    except:
-                        continue
+                break
+            scanned += len(texts)
+            for text in texts:
+                try:
+                    comment = comment_parsers.parse_douyin_comment(text, now)
+                except Exception as e:
+                    logger.error(f"Error parsing comment: {e}")
+                    continue
+                if comment:
+                    yielded += 1
+                    yield comment
+            if len(texts) < limit:
+                break
+        if scanned:
+            logger.info(f"✅ Extracted {yielded} comments from {scanned} elements using selector: {selector}")
+            return
+    logger.warning("⚠️ No comment elements found on page")
 
-                # Only add comment if at least content or username was extracted
-                if comment_data['content'] or comment_data['username']:
-                    comments.append(comment_data)
-                    logger.info(f"✅ Extracted comment {idx+1}: {comment_data['username'][:20] if comment_data['username'] else 'Unknown'}")
-                '''
-                
-            except Exception as e:
-                logger.error(f"Error extracting comment {idx+1}: {e}")
-                continue
-        
-        logger.info(f"✅ Successfully extracted {len(comments)} comments")
-        
-    except Exception as e:
-        logger.error(f"❌ Error during comment extraction: {e}")
-    
-    return comments
 
-async def scrape_post(url, conn):
+async def extract_comments(page, max_comments=20, now=None):
+    """
+    Extracts the comments already loaded on a Douyin post page (see load_comments).
+    :return: list of comment dicts, at most max_comments
+    """
+    logger.info(f"🔍 Starting comment extraction (max: {max_comments})...")
+    return [comment async for comment in iter_comments(page, max_comments, now=now)]
+
+async def extract_item(page, url, now=None):
+    """
+    Extract the post fields and comments from a loaded Douyin page (live or a stored snapshot)
+    :param now: time the page was fetched, relative comment times are resolved against it (default now)
+    :return: item dict for utils.insert_data
+    """
+    details = await extract_details_new(page)
+
+    # Extract comments
+    with metrics.span("comments", PLATFORM):
+        comments = await extract_comments(page, max_comments=20, now=now)
+
+    # Serialize comments to JSON string for database storage (only if comments exist)
+    comments_json = json.dumps(comments, ensure_ascii=False) if comments else None
+
+    return {
+        'unnamed': None,
+        'user_name': details['title'].strip() if details['title'] else None,
+        'publication_date': details['publish_time'].strip() if details['publish_time'] else None,
+        'content': details['content'].strip() if details['content'] else None,
+        'shared_count': utils.chinese_unit_to_number(details['share_count'].strip()) if details['share_count'] else 0,
+        'comment_count': utils.chinese_unit_to_number(details['comment_count'].strip()) if details['comment_count'] else 0,
+        'like_count': utils.chinese_unit_to_number(details['like_count'].strip()) if details['like_count'] else 0,
+        'link1': url,
+        'link2': None,
+        'content_segmented': None,
+        'is_agriculture_related': None,
+        'index_number': None,
+        'comments': comments_json
+    }
+
+
+async def scrape_item(url, pool=None):
     """
     Scrapes the title, publish date, content, and interaction counts 
     (Share, Comment, Like) for a specific Douyin post using Playwright.
+    :return: item dict for utils.insert_data
+    :raise Exception: when the page couldn't be scraped
     """
     logger.info("🚀 Launching Playwright browser...")
     logger.info(f"Target url: {url}")
 
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True, args=['--start-maximized'])
-        # Create a new page context to maintain login state (e.g., cookies)
-        context = await browser.new_context(
-            viewport={"width": 1920, "height": 1080},
-            ignore_https_errors=True
-        )
-        page = await context.new_page()
-        await page.goto(url)
-        await page.wait_for_timeout(5000)
+    async with page_pool.page_for(url, pool) as page:
+        capture = snapshot_store.start_capture(page)
+        with metrics.span("navigate", PLATFORM):
+            await page.goto(url)
+        with metrics.span("fixed_wait", PLATFORM):
+            await page.wait_for_timeout(config.page_load_wait_ms)
+
+        with metrics.span("login_dismiss", PLATFORM):
+            try:
+                await page.locator(
+                    'xpath=//div[contains(text(), "登录后免费畅享高清视频")]/following-sibling::div[1]'
+                ).click(timeout=config.login_dismiss_timeout_ms)
+            except PlaywrightTimeoutError:
+                # no banner when the saved session is logged in, don't wait the default 30s for it
+                logger.info("No login banner to dismiss")
 
-        await page.locator('xpath=//div[contains(text(), "登录后免费畅享高清视频")]/following-sibling::div[1]').click()
+        with metrics.span("load_comments", PLATFORM):
+            await load_comments(page)
+        with metrics.span("snapshot", PLATFORM):
+            await snapshot_store.save_capture(capture, page, url)
 
-        details = await extract_details_new(page)
-        
-        # Extract comments
-        comments = await extract_comments(page, max_comments=20)
-        comments = utils.extract_douyin_comments_from_text(comments)
-        
-        # Serialize comments to JSON string for database storage (only if comments exist)
-        comments_json = json.dumps(comments, ensure_ascii=False) if comments else None
-        
-        item = [{
-            'unnamed': None,
-            'user_name': details['title'].strip() if details['title'] else None,
-            'publication_date': details['publish_time'].strip() if details['publish_time'] else None,
-            'content': details['content'].strip() if details['content'] else None,
-            'shared_count': utils.chinese_unit_to_number(details['share_count'].strip()) if details['share_count'] else 0,
-            'comment_count': utils.chinese_unit_to_number(details['comment_count'].strip()) if details['comment_count'] else 0,
-            'like_count': utils.chinese_unit_to_number(details['like_count'].strip()) if details['like_count'] else 0,
-            'link1': url,
-            'link2': None,
-            'content_segmented': None,
-            'is_agriculture_related': None,
-            'index_number': None,
-            'comments': comments_json
-        }]
-        logger.info(f"💾 Inserting scraped data into the database...: {item}")
+        item = await extract_item(page, url)
+        await browser_utils.save_storage_state(page.context, PLATFORM)
+        return item
 
-        utils.insert_data(conn, config.table_name, item)
\ No newline at end of file
+
+async def scrape_post(url, conn, pool=None):
+    """
+    Scrape a post with scrape_item and insert it into the database.
+    Returns True when the post was saved.
+    """
+    item = [await scrape_item(url, pool)]
+    logger.info(f"💾 Inserting scraped data into the database...: {item}")
+    with metrics.span("insert", PLATFORM):
+        saved = utils.insert_data(conn, config.table_name, item)
+    if saved < len(item):
+        logger.error("❌ The post couldn't be saved to the database")
+    return saved == len(item)
@@ -0,0 +1,305 @@
+"""
+Long-running HTTP scrape service, so on-demand lookups don't pay the Python, import and
+browser startup of `python main.py` on every request.
+
+    python scrape_service.py [--host 127.0.0.1] [--port 8700] [--fixtures]
+
+One process keeps a warm page_pool.PagePool (the browser is launched at startup, pages are
+reused per platform) and scrapes with scrape_api.scrape_one, at most `scrape_concurrency`
+urls at a time.
+
+    POST /scrape   {"url": "..."}                  -> the result once scraped
+                   {"urls": ["...", ...]}          -> the results of all urls once scraped
+                   {..., "wait": false}            -> 202 {"job_id": ...} right away
+                   {..., "platform": "douyin"}     -> scraper to use for urls of other hosts
+    GET  /jobs/<job_id>                            -> job status and the results so far
+    GET  /health                                   -> pool, cache and in-flight counts
+    GET  /metrics                                  -> run metrics in the Prometheus text format
+
+A result is a Post (`"type": "post"`) or a ScrapeError (`"type": "error"`) as a JSON object.
+Requests for a url that is being scraped with the same platform wait for that scrape instead of
+starting another, and posts scraped within `service_cache_ttl_seconds` are served from memory
+(`"cached": true`). Set `service_save_results` to also upsert the posts into `data.db`, from a
+worker thread so the event loop keeps serving requests during the write. A post that couldn't be
+saved is still returned, but logged, counted in `service_save_failures_total` and not cached.
+
+`--fixtures` serves the page fixtures of benchmarks/ in the same process and logs their urls,
+e.g. POST {"url": "http://127.0.0.1:<port>/douyin/1", "platform": "douyin"}, to try the
+service without network.
+"""
+import argparse
+import asyncio
+import dataclasses
+import sqlite3
+import time
+import uuid
+from collections import OrderedDict
+try:
+    from aiohttp import web
+except ImportError:  # the service can't run without it
+    web = None
+import config
+import page_pool
+import scrape_api
+import utils
+from logging_config import get_logger
+from run_metrics import get_metrics
+
+logger = get_logger()
+metrics = get_metrics()
+
+# HTTP status of a result returned with "wait": true
+RESULT_STATUS = {"failure": 502, "timeout": 504, "unsupported": 400}
+
+
+def record_json(record, cached=False):
+    """
+    JSON object of a Post or ScrapeError
+    """
+    data = dataclasses.asdict(record)
+    data["type"] = "post" if isinstance(record, scrape_api.Post) else "error"
+    data["cached"] = cached
+    return data
+
+
+class ResultCache:
+    """
+    Posts by (url, platform), forgotten after `ttl` seconds; the least recently stored go first beyond `max_size`
+    """
+
+    def __init__(self, ttl=None, max_size=None):
+        self.ttl = config.service_cache_ttl_seconds if ttl is None else ttl
+        self.max_size = max_size or config.service_cache_max_size
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, record = entry
+        if expires < time.monotonic():
+            del self._entries[key]
+            return None
+        return record
+
+    def put(self, key, record):
+        if self.ttl <= 0:
+            return
+        self._entries.pop(key, None)
+        self._entries[key] = (time.monotonic() + self.ttl, record)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class Job:
+    def __init__(self, urls):
+        self.id = uuid.uuid4().hex
+        self.urls = list(dict.fromkeys(urls))
+        self.created = time.time()
+        self.results = {}
+        self.task = None
+
+    @property
+    def done(self):
+        return len(self.results) == len(self.urls)
+
+    def to_json(self):
+        return {
+            "job_id": self.id,
+            "status": "done" if self.done else "running",
+            "pending": len(self.urls) - len(self.results),
+            "results": [self.results[url] for url in self.urls if url in self.results],
+        }
+
+
+class ScrapeService:
+    def __init__(self, pool=None, cache=None, concurrency=None, save_results=None):
+        self.pool = pool
+        self.cache = cache or ResultCache()
+        self.semaphore = asyncio.Semaphore(concurrency or config.scrape_concurrency)
+        self.inflight = {}
+        self.jobs = OrderedDict()
+        save_results = config.service_save_results if save_results is None else save_results
+        self.sink = None
+        # one write at a time on the sink's connection, whichever thread runs it
+        self.sink_lock = asyncio.Lock()
+        if save_results:
+            self.sink = scrape_api.SqliteSink(sqlite3.connect(config.db_name, check_same_thread=False))
+
+    async def start(self):
+        if self.pool is None:
+            self.pool = await page_pool.PagePool().start()
+        await self.pool.warm()
+        logger.info("🔥 Browser launched, the service is ready")
+        return self
+
+    async def close(self):
+        for job in self.jobs.values():
+            if job.task is not None:
+                job.task.cancel()
+        for task in list(self.inflight.values()):
+            task.cancel()
+        await asyncio.gather(*self.inflight.values(), return_exceptions=True)
+        await self.pool.close()
+        if self.sink is not None:
+            # let a write already running in its thread finish first
+            async with self.sink_lock:
+                self.sink.conn.close()
+
+    async def _scrape(self, url, platform):
+        async with self.semaphore:
+            record = await scrape_api.scrape_one(url, self.pool, platform=platform)
+        if isinstance(record, scrape_api.Post):
+            if self.sink is not None:
+                try:
+                    async with self.sink_lock:
+                        await asyncio.to_thread(self.sink, record)
+                except sqlite3.Error as e:
+                    # still answer with the post, but don't cache it so the next request saves it again
+                    logger.error(f"❌ Failed to save {url} to {config.db_name}: {e}")
+                    metrics.inc("service_save_failures_total", platform=platform)
+                    return record
+            self.cache.put((url, platform), record)
+        return record
+
+    async def result(self, url, platform=None):
+        """
+        Result of `url` from the cache, the scrape already in flight, or a new scrape
+        :return: (Post or ScrapeError, cached)
+        """
+        # the same url scraped as another platform is another result
+        key = (url, platform or utils.platform_from_url(url))
+        record = self.cache.get(key)
+        if record is not None:
+            metrics.inc("service_requests_total", source="cache")
+            return record, True
+        task = self.inflight.get(key)
+        if task is None:
+            metrics.inc("service_requests_total", source="scrape")
+            task = self.inflight[key] = asyncio.ensure_future(self._scrape(*key))
+            task.add_done_callback(lambda done: self.inflight.pop(key, None) if self.inflight.get(key) is done else None)
+        else:
+            metrics.inc("service_requests_total", source="in_flight")
+        # a client that disconnects doesn't cancel the scrape other requests may be waiting for
+        return await asyncio.shield(task), False
+
+    def submit(self, urls, platform=None):
+        """
+        Start a job scraping `urls` in the background
+        """
+        job = Job(urls)
+
+        async def run(url):
+            record, cached = await self.result(url, platform)
+            job.results[url] = record_json(record, cached)
+
+        job.task = asyncio.ensure_future(asyncio.gather(*(run(url) for url in job.urls)))
+        self.jobs[job.id] = job
+        # forget the oldest finished jobs
+        excess = len(self.jobs) - config.service_max_jobs
+        for job_id in [job_id for job_id, old in self.jobs.items() if old.done][:max(excess, 0)]:
+            del self.jobs[job_id]
+        return job
+
+
+def _bad_request(message):
+    return web.json_response({"error": message}, status=400)
+
+
+async def handle_scrape(request):
+    service = request.app["service"]
+    try:
+        body = await request.json()
+    except ValueError:
+        return _bad_request("The body must be a JSON object")
+    if not isinstance(body, dict):
+        return _bad_request("The body must be a JSON object")
+    single = "url" in body
+    urls = [body["url"]] if single else body.get("urls")
+    if not urls or not isinstance(urls, list) or not all(isinstance(url, str) and url for url in urls):
+        return _bad_request('Expected "url" or a non-empty "urls" list of strings')
+    if len(urls) > config.service_max_batch:
+        return _bad_request(f"At most {config.service_max_batch} urls per request")
+    platform = body.get("platform")
+    if platform is not None and platform not in scrape_api.ITEM_SCRAPERS:
+        return _bad_request(f"Unknown platform, expected one of {list(scrape_api.ITEM_SCRAPERS)}")
+
+    if not body.get("wait", True):
+        job = service.submit(urls, platform)
+        return web.json_response({"job_id": job.id, "urls": len(urls)}, status=202)
+    if single:
+        record, cached = await service.result(urls[0], platform)
+        status = 200 if isinstance(record, scrape_api.Post) else RESULT_STATUS.get(record.status, 502)
+        return web.json_response(record_json(record, cached), status=status)
+    results = await asyncio.gather(*(service.result(url, platform) for url in urls))
+    return web.json_response({"results": [record_json(record, cached) for record, cached in results]})
+
+
+async def handle_job(request):
+    job = request.app["service"].jobs.get(request.match_info["job_id"])
+    if job is None:
+        return web.json_response({"error": "Unknown job id"}, status=404)
+    return web.json_response(job.to_json())
+
+
+async def handle_health(request):
+    service = request.app["service"]
+    browser = service.pool.browser
+    return web.json_response({
+        "browser_connected": bool(browser is not None and browser.is_connected()),
+        "idle_pages": {platform: len(slots) for platform, slots in service.pool.idle.items()},
+        "busy_pages": service.pool.busy,
+        "in_flight": len(service.inflight),
+        "cached": len(service.cache),
+        "jobs": len(service.jobs),
+    })
+
+
+async def handle_metrics(request):
+    return web.Response(text=metrics.to_prometheus(), content_type="text/plain")
+
+
+def create_app(service=None):
+    """
+    aiohttp application of the service; the pool is started with the app and closed with it
+    :param service: default a ScrapeService with its own pool
+    """
+    if web is None:
+        raise ImportError("The scrape service needs the aiohttp package: pip install aiohttp")
+    app = web.Application()
+    app.router.add_post("/scrape", handle_scrape)
+    app.router.add_get("/jobs/{job_id}", handle_job)
+    app.router.add_get("/health", handle_health)
+    app.router.add_get("/metrics", handle_metrics)
+
+    async def lifecycle(app):
+        app["service"] = await (service or ScrapeService()).start()
+        yield
+        await app["service"].close()
+
+    app.cleanup_ctx.append(lifecycle)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HTTP service scraping posts on demand with a warm browser")
+    parser.add_argument("--host", default=config.service_host)
+    parser.add_argument("--port", type=int, default=config.service_port)
+    parser.add_argument("--fixtures", action="store_true", help="also serve the page fixtures of benchmarks/ to scrape")
+    args = parser.parse_args()
+
+    fixture_server = None
+    if args.fixtures:
+        from benchmarks.fixture_server import FixtureServer
+
+        fixture_server = FixtureServer().start()
+        logger.info(f"Serving fixtures at {fixture_server.base_url}, e.g. {fixture_server.post_url('douyin', 1)} "
+                    f'with "platform": "douyin"')
+    try:
+        web.run_app(create_app(), host=args.host, port=args.port, print=None)
+    finally:
+        if fixture_server is not None:
+            fixture_server.stop()
@@ -1,167 +1,212 @@
 import asyncio
 import json
 import re
-from playwright.async_api import async_playwright
 from datetime import datetime, timedelta
 from logging_config import get_logger
+from run_metrics import get_metrics
 import utils
+import browser_utils
+import snapshot_store
+import page_pool
 import config
 
 logger = get_logger()
+metrics = get_metrics()
 
-async def scrape_post(url, conn):
+PLATFORM = 'weibo'
+
+CONTENT_SELECTOR = ".detail_wbtext_4CRf9"
+LOGIN_SELECTOR = ".login_box"
+
+async def scrape_item(url, pool=None):
     """
     Scrapes the title, publish date, content, and interaction counts 
     (Share, Comment, Like) for a specific Weibo post using Playwright.
+    :return: item dict for utils.insert_data
+    :raise Exception: when the page couldn't be scraped
     """
     logger.info("🚀 Launching Playwright browser...")
     logger.info(f"Target url: {url}")
 
-    async with async_playwright() as p:
-        # Launch chromium browser. Note: headless=False allows you to see and manually log in.
-        # If you are already logged in, you can try setting headless=True.
-        browser = await p.chromium.launch(headless=True, args=['--start-maximized'])
-        
-        # Create a new page context to maintain login state (e.g., cookies)
-        context = await browser.new_context(
-            viewport={"width": 1920, "height": 1080},
-            ignore_https_errors=True
-        )
-        page = await context.new_page()
-
-        try:
-            # await page.goto(url, wait_until="networkidle")
+    # Note: headless=False in page_pool.py allows you to see and manually log in.
+    async with page_pool.page_for(url, pool) as page:
+        capture = snapshot_store.start_capture(page)
+        # await page.goto(url, wait_until="networkidle")
+        with metrics.span("navigate", PLATFORM):
             await page.goto(url)
-            
-            # --- Login Check and Wait (Crucial Step) ---
-            # If the page redirects to the login screen, you must manually log in in the opened browser
-            await page.wait_for_timeout(5000)
-            
-            # Check if the login page is displayed (e.g., look for a login box class)
-            if await page.locator(".login_box").count() > 0:
-                 logger.info("\n⚠️ Browser is open. Please manually complete the login within 50 seconds!")
-                 # Give enough time for manual login
-                 await page.wait_for_timeout(50000) 
-                 await page.goto(url, wait_until="networkidle")
-                 logger.info("✅ Login time finished, attempting to reload the post page...")
-            
-            # ------------------------------------
-
-            # Wait for the main post content to load. This waits for the parent container of the post text.
-            await page.wait_for_selector(".detail_wbtext_4CRf9", timeout=10000)
-            logger.info("🔍 Page content loaded, starting data extraction...")
-
-            title_locator = page.locator(".head_name_24eEB")
-            title = await title_locator.inner_text()
-
-            # 1. Post Content (also used as "Title")
-            content_locator = page.locator(".detail_wbtext_4CRf9")
-            content = await content_locator.inner_text()
-            
-            # 2. Publish Date
-            date_locator = page.locator(".head-info_time_6sFQg")
-            original_publish_date = await date_locator.inner_text()
-
-            # START DATE FORMATTING LOGIC
-            # Convert date format: 'YY-MM-DD HH:MM' -> 'YYYY-MM-DD HH:MM:SS'
+        
+        # --- Login Check and Wait (Crucial Step) ---
+        # If the page redirects to the login screen, you must manually log in in the opened browser
+        # Whichever of the post or the login box shows up first tells if the saved session is still valid
+        with metrics.span("session_check", PLATFORM):
             try:
-                # Parse the date string based on the user-provided example format
-                dt_object = datetime.strptime(original_publish_date.strip(), '%y-%m-%d %H:%M')
-                # Format to YYYY-MM-DD HH:MM:SS (adding ':00' for seconds)
-                formatted_date = dt_object.strftime('%Y-%m-%d %H:%M:%S')
-            except ValueError:
-                # If parsing fails (e.g., if the date is a relative time like '5 minutes ago'), 
-                # keep the original text.
-                logger.info(f"⚠️ Warning: Could not parse date '{original_publish_date.strip()}'. Keeping original format.")
-
-            publish_date = formatted_date # Use the newly formatted date
-
-            # 3. Interaction Counts (Share, Comment, Like)
-            # The selectors here are based on the new weibo.com structure and may change with site updates
-            # We locate the counts by finding the interactive toolbar at the bottom
-            toolbar_locator = page.locator(".toolbar_main_3Mxwo")
-
-            # Helper to extract digits from a text segment
-            def _first_number_or_zero(s: str) -> str:
-                m = re.search(r'(\d+)', s or "")
-                return m.group(1) if m else "0"
-
-            share_count = "0"
-            comment_count = "0"
-            like_count = "0"
+                await page.locator(f"{CONTENT_SELECTOR}, {LOGIN_SELECTOR}").first.wait_for(
+                    timeout=config.page_load_wait_ms
+                )
+            except Exception:
+                logger.info("⚠️ Neither the post nor the login box showed up, continue with the content check")
+        
+        # Check if the login page is displayed (e.g., look for a login box class)
+        if await page.locator(LOGIN_SELECTOR).count() > 0:
+            async def wait_for_login():
+                logger.info(f"\n⚠️ Browser is open. Please manually complete the login within {config.login_wait_ms // 1000} seconds!")
+                # Give enough time for manual login
+                with metrics.span("login_wait", PLATFORM):
+                    await page.wait_for_timeout(config.login_wait_ms)
+                    await page.goto(url, wait_until="networkidle")
+                logger.info("✅ Login time finished, attempting to reload the post page...")
+                if await page.locator(LOGIN_SELECTOR).count() == 0:
+                    # later urls (and runs) start from this session
+                    await browser_utils.save_storage_state(page.context, PLATFORM)
+                    logger.info("🔑 Weibo login state saved")
 
-            try:
-                toolbar_text = ""
-                if await toolbar_locator.count() > 0:
-                    toolbar_text = await toolbar_locator.first.inner_text()
-                    parts = [p.strip() for p in toolbar_text.splitlines() if p.strip()]
-                    # If we got at least 3 parts, take them; otherwise try to find numbers by regex
-                    if len(parts) >= 3:
-                        share_count = _first_number_or_zero(parts[0])
-                        comment_count = _first_number_or_zero(parts[1])
-                        like_count = _first_number_or_zero(parts[2])
-                    else:
-                        # fallback: try to extract first three numbers from the whole toolbar text
-                        nums = re.findall(r'(\d+)', toolbar_text)
-                        if len(nums) >= 3:
-                            share_count, comment_count, like_count = nums[0], nums[1], nums[2]
-                        elif len(nums) == 2:
-                            share_count, comment_count = nums[0], nums[1]
-                        elif len(nums) == 1:
-                            comment_count = nums[0]
-                        # any missing remain "0"
-                else:
-                    logger.info("⚠️ Toolbar not found, defaulting counts to 0")
-            except Exception as e:
-                logger.warning(f"Failed to parse toolbar counts: {e}")
-
-            # comments scraping
-            comments = await scrape_comments(page, url, max_comments=20)
-            comments = json.dumps(comments, ensure_ascii=False) if comments else None
-            
-            item = [{
-                'unnamed': None,
-                'user_name': title,
-                'publication_date': publish_date,
-                'content': content,
-                'shared_count': share_count if share_count else '0',
-                'comment_count': comment_count if comment_count else '0',
-                'like_count': like_count if like_count else '0',
-                'link1': url,
-                'link2': None,
-                'content_segmented': None,
-                'is_agriculture_related': None,
-                'index_number': None,
-                'comments': comments
-            }]
-            logger.info(f"💾 Inserting scraped data into the database...: {item}")
-
-            utils.insert_data(conn, config.table_name, item)
-
-        except Exception as e:
-            logger.info(f"❌ An error occurred: {e}")
-            logger.info("Possible reasons: The page structure has changed, or content failed to load due to unsuccessful login.")
-        finally:
-            logger.info("🗑️ Closing browser.")
-            await browser.close()
-
-
-async def scrape_comments(page, url, max_comments: int = 20):
+            if not await browser_utils.refresh_login(PLATFORM, page.context, wait_for_login):
+                raise RuntimeError("Weibo session expired and the login was refreshed less than "
+                                   f"{config.login_refresh_interval_seconds}s ago")
+            if await page.locator(LOGIN_SELECTOR).count() > 0:
+                # another scrape refreshed the session while this one waited, reload the post with it
+                await page.goto(url, wait_until="networkidle")
+        
+        # ------------------------------------
+
+        # Wait for the main post content to load. This waits for the parent container of the post text.
+        with metrics.span("wait_content", PLATFORM):
+            await page.wait_for_selector(CONTENT_SELECTOR, timeout=10000)
+        logger.info("🔍 Page content loaded, starting data extraction...")
+
+        with metrics.span("load_comments", PLATFORM):
+            await load_comments(page, url)
+        with metrics.span("snapshot", PLATFORM):
+            await snapshot_store.save_capture(capture, page, url)
+
+        item = await extract_item(page, url)
+        # keep the saved session fresh with the cookies the site rotated
+        await browser_utils.save_storage_state(page.context, PLATFORM)
+        return item
+
+
+async def scrape_post(url, conn, pool=None):
     """
-    Scrape comments for a weibo post url and save each comment as:
-    {
-      'username': "用户A",
-      'content': "test",
-      'time': "2025-11-26",
-      'likes': '10'
-    }
-    NOTE: selectors are best-effort and may need adjustment if weibo HTML changes.
+    Scrape a post with scrape_item and insert it into the database.
+    Returns True when the post was saved.
     """
-    logger.info(f"🔎 Scraping comments for: {url}")
-    comments: list[dict] = []
+    try:
+        item = [await scrape_item(url, pool)]
+        logger.info(f"💾 Inserting scraped data into the database...: {item}")
+        with metrics.span("insert", PLATFORM):
+            saved = utils.insert_data(conn, config.table_name, item)
+        if saved < len(item):
+            logger.error("❌ The post couldn't be saved to the database")
+        return saved == len(item)
+    except Exception as e:
+        logger.info(f"❌ An error occurred: {e}")
+        logger.info("Possible reasons: The page structure has changed, or content failed to load due to unsuccessful login.")
+        return False
+
+
+async def extract_item(page, url, now=None):
+    """
+    Extract the post fields and comments from a loaded Weibo page (live or a stored snapshot)
+    :param now: time the page was fetched, relative comment times are resolved against it (default now)
+    :return: item dict for utils.insert_data
+    """
+    with metrics.span("locate_title", PLATFORM):
+        title_locator = page.locator(".head_name_24eEB")
+        title = await title_locator.inner_text()
+
+    # 1. Post Content (also used as "Title")
+    with metrics.span("locate_content", PLATFORM):
+        content_locator = page.locator(CONTENT_SELECTOR)
+        content = await content_locator.inner_text()
+    
+    # 2. Publish Date
+    with metrics.span("locate_publish_date", PLATFORM):
+        date_locator = page.locator(".head-info_time_6sFQg")
+        original_publish_date = await date_locator.inner_text()
+
+    # START DATE FORMATTING LOGIC
+    # Convert date format: 'YY-MM-DD HH:MM' -> 'YYYY-MM-DD HH:MM:SS'
+    try:
+        # Parse the date string based on the user-provided example format
+        dt_object = datetime.strptime(original_publish_date.strip(), '%y-%m-%d %H:%M')
+        # Format to YYYY-MM-DD HH:MM:SS (adding ':00' for seconds)
+        formatted_date = dt_object.strftime('%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        # If parsing fails (e.g., if the date is a relative time like '5 minutes ago'), 
+        # keep the original text.
+        logger.info(f"⚠️ Warning: Could not parse date '{original_publish_date.strip()}'. Keeping original format.")
+
+    publish_date = formatted_date # Use the newly formatted date
+
+    # 3. Interaction Counts (Share, Comment, Like)
+    # The selectors here are based on the new weibo.com structure and may change with site updates
+    # We locate the counts by finding the interactive toolbar at the bottom
+    toolbar_locator = page.locator(".toolbar_main_3Mxwo")
+
+    # Helper to extract digits from a text segment
+    def _first_number_or_zero(s: str) -> str:
+        m = re.search(r'(\d+)', s or "")
+        return m.group(1) if m else "0"
+
+    share_count = "0"
+    comment_count = "0"
+    like_count = "0"
 
     try:
-        await page.wait_for_timeout(1000)
+        toolbar_text = ""
+        if await toolbar_locator.count() > 0:
+            with metrics.span("locate_toolbar", PLATFORM):
+                toolbar_text = await toolbar_locator.first.inner_text()
+            parts = [p.strip() for p in toolbar_text.splitlines() if p.strip()]
+            # If we got at least 3 parts, take them; otherwise try to find numbers by regex
+            if len(parts) >= 3:
+                share_count = _first_number_or_zero(parts[0])
+                comment_count = _first_number_or_zero(parts[1])
+                like_count = _first_number_or_zero(parts[2])
+            else:
+                # fallback: try to extract first three numbers from the whole toolbar text
+                nums = re.findall(r'(\d+)', toolbar_text)
+                if len(nums) >= 3:
+                    share_count, comment_count, like_count = nums[0], nums[1], nums[2]
+                elif len(nums) == 2:
+                    share_count, comment_count = nums[0], nums[1]
+                elif len(nums) == 1:
+                    comment_count = nums[0]
+                # any missing remain "0"
+        else:
+            logger.info("⚠️ Toolbar not found, defaulting counts to 0")
+    except Exception as e:
+        logger.warning(f"Failed to parse toolbar counts: {e}")
+
+    # comments scraping
+    with metrics.span("comments", PLATFORM):
+        comments = await extract_comments(page, url, max_comments=20, now=now)
+    comments = json.dumps(comments, ensure_ascii=False) if comments else None
+    
+    return {
+        'unnamed': None,
+        'user_name': title,
+        'publication_date': publish_date,
+        'content': content,
+        'shared_count': share_count if share_count else '0',
+        'comment_count': comment_count if comment_count else '0',
+        'like_count': like_count if like_count else '0',
+        'link1': url,
+        'link2': None,
+        'content_segmented': None,
+        'is_agriculture_related': None,
+        'index_number': None,
+        'comments': comments
+    }
+
+
+async def load_comments(page, url):
+    """
+    Scroll the post page so the first comments get loaded
+    """
+    logger.info(f"🔎 Loading comments for: {url}")
+    try:
+        await page.wait_for_timeout(config.comment_wait_ms)
         # await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
 
         # Scroll to load more comments
@@ -169,11 +214,28 @@ async def scrape_comments(page, url, max_comments: int = 20):
         for i in range(3):
             try:
                 await page.evaluate("window.scrollBy(0, 500)")
-                await page.wait_for_timeout(2000)
+                await page.wait_for_timeout(config.scroll_wait_ms)
                 logger.info(f"Scroll {i+1}/3 completed")
             except Exception as e:
                 logger.error(f"Scroll error: {e}")
-        
+    except Exception as e:
+        logger.info(f"❌ An error occurred while loading comments: {e}")
+
+
+async def extract_comments(page, url, max_comments: int = 20, now=None):
+    """
+    Extract the comments already loaded on a weibo post page (see load_comments) and save each comment as:
+    {
+      'username': "用户A",
+      'content': "test",
+      'time': "2025-11-26",
+      'likes': '10'
+    }
+    NOTE: selectors are best-effort and may need adjustment if weibo HTML changes.
+    """
+    comments: list[dict] = []
+
+    try:
         comments_area_div = page.locator('div[class^="RepostCommentList_mar1_"]')
         comments_div = comments_area_div.locator('div[class="con1 woo-box-item-flex"]')
         
@@ -197,7 +259,8 @@ async def scrape_comments(page, url, max_comments: int = 20):
                 continue
         
         # Extract structured comment data from text
-        comments = utils.extract_weibo_comments_from_text(comments_text)
+        with metrics.span("parse_comments", PLATFORM):
+            comments = utils.extract_weibo_comments_from_text(comments_text, now)
         logger.info(f"✅ Successfully scraped {len(comments)} comments from {url}")
         
     except Exception as e:
@@ -1,90 +1,123 @@
 import asyncio
-from playwright.async_api import async_playwright
 from datetime import datetime
 from logging_config import get_logger
+from run_metrics import get_metrics
 import utils
+import browser_utils
+import snapshot_store
+import page_pool
 import config
 
 logger = get_logger()
+metrics = get_metrics()
 
-async def scrape_post(url, conn):
+PLATFORM = 'weixin'
+
+TITLE_SELECTOR = "#activity-name"
+
+async def extract_item(page, url, now=None):
     """
-    Scrape WeChat article.
+    Extract the article fields from a loaded WeChat article page (live or a stored snapshot)
+    :param now: time the page was fetched, unused: the article page has no relative times
+    :return: item dict for utils.insert_data
     """
-    logger.info("🚀 Launching Playwright browser for WeChat article...")
-    logger.info(f"Target url: {url}")
+    # Article Title
+    # Common selector for the WeChat article title
+    with metrics.span("locate_title", PLATFORM):
+        title_locator = page.locator(TITLE_SELECTOR)
+        # Wait for the title element to be visible
+        await title_locator.wait_for(timeout=10000)
+        title = await title_locator.inner_text()
+    
+    # Publish Date
+    # Common selector for the WeChat publish date
+    with metrics.span("locate_publish_date", PLATFORM):
+        date_locator = page.locator("#publish_time")
+        original_publish_date = await date_locator.inner_text()
+    
+    original_publish_date = original_publish_date.strip()
+    # Attempt to convert to standard format: YYYY-MM-DD HH:MM:SS
+    try:
+        # Try format: YYYY-MM-DD HH:MM (e.g., '2023-11-22 14:56')
+        dt_object = datetime.strptime(original_publish_date, '%Y年%m月%d日 %H:%M')
+        formatted_date = dt_object.strftime('%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        # Fallback to original text if parsing fails (e.g., relative date strings)
+        logger.info(f"⚠️ Warning: Could not parse date '{formatted_date}'. Keeping original format.")
+    
+    publish_date = formatted_date
 
-    async with async_playwright() as p:
-        # WeChat articles are usually publicly viewable, so we can use headless mode.
-        browser = await p.chromium.launch(headless=True, args=['--start-maximized'])
-        
-        context = await browser.new_context(
-            viewport={"width": 1920, "height": 1080},
-            ignore_https_errors=True
-        )
-        page = await context.new_page()
+    # Article Content
+    # Common selector for the main article content body
+    with metrics.span("locate_content", PLATFORM):
+        content_locator = page.locator("#js_article")
+        # We strip the text to remove leading/trailing whitespace
+        content = (await content_locator.inner_text()).strip()
 
-        try:
-            # Navigate and wait for the page to be fully loaded
-            # await page.goto(url, wait_until="networkidle")
-            await page.goto(url)
-            await page.wait_for_timeout(5000)
+    # Post user
+    with metrics.span("locate_user_name", PLATFORM):
+        user_name_locator = page.locator("#js_wx_follow_nickname")
+        user_name = await user_name_locator.inner_text()
 
-            # Article Title
-            # Common selector for the WeChat article title
-            title_locator = page.locator("#activity-name")
-            # Wait for the title element to be visible
-            await title_locator.wait_for(timeout=10000)
-            title = await title_locator.inner_text()
-            
-            # Publish Date
-            # Common selector for the WeChat publish date
-            date_locator = page.locator("#publish_time")
-            original_publish_date = await date_locator.inner_text()
-            
-            original_publish_date = original_publish_date.strip()
-            # Attempt to convert to standard format: YYYY-MM-DD HH:MM:SS
-            try:
-                # Try format: YYYY-MM-DD HH:MM (e.g., '2023-11-22 14:56')
-                dt_object = datetime.strptime(original_publish_date, '%Y年%m月%d日 %H:%M')
-                formatted_date = dt_object.strftime('%Y-%m-%d %H:%M:%S')
-            except ValueError:
-                # Fallback to original text if parsing fails (e.g., relative date strings)
-                logger.info(f"⚠️ Warning: Could not parse date '{formatted_date}'. Keeping original format.")
-            
-            publish_date = formatted_date
+    return {
+        'unnamed': None,
+        'user_name': user_name,
+        'publication_date': publish_date,
+        'content': f"{title}\n{content}",
+        'shared_count': None,
+        'comment_count': None,
+        'like_count': None,
+        'link1': url,
+        'link2': None,
+        'content_segmented': None,
+        'is_agriculture_related': None,
+        'index_number': None
+    }
 
-            # Article Content
-            # Common selector for the main article content body
-            content_locator = page.locator("#js_article")
-            # We strip the text to remove leading/trailing whitespace
-            content = (await content_locator.inner_text()).strip()
 
-            # Post user
-            user_name_locator = page.locator("#js_wx_follow_nickname")
-            user_name = await user_name_locator.inner_text()
+async def scrape_item(url, pool=None):
+    """
+    Scrape WeChat article.
+    :return: item dict for utils.insert_data
+    :raise Exception: when the page couldn't be scraped
+    """
+    logger.info("🚀 Launching Playwright browser for WeChat article...")
+    logger.info(f"Target url: {url}")
 
-            item = [{
-                'unnamed': None,
-                'user_name': user_name,
-                'publication_date': publish_date,
-                'content': f"{title}\n{content}",
-                'shared_count': None,
-                'comment_count': None,
-                'like_count': None,
-                'link1': url,
-                'link2': None,
-                'content_segmented': None,
-                'is_agriculture_related': None,
-                'index_number': None
-            }]
-            logger.info(f"💾 Inserting scraped data into the database...: {item}")
+    async with page_pool.page_for(url, pool) as page:
+        capture = snapshot_store.start_capture(page)
+        # Navigate and wait for the page to be fully loaded
+        # await page.goto(url, wait_until="networkidle")
+        with metrics.span("navigate", PLATFORM):
+            await page.goto(url)
+        with metrics.span("fixed_wait", PLATFORM):
+            await page.wait_for_timeout(config.page_load_wait_ms)
+        if capture is not None:
+            # the snapshot must hold the article, not a half-loaded page
+            with metrics.span("wait_content", PLATFORM):
+                await page.locator(TITLE_SELECTOR).wait_for(timeout=10000)
+        with metrics.span("snapshot", PLATFORM):
+            await snapshot_store.save_capture(capture, page, url)
 
-            utils.insert_data(conn, config.table_name, item)
+        item = await extract_item(page, url)
+        await browser_utils.save_storage_state(page.context, PLATFORM)
+        return item
 
-        except Exception as e:
-            logger.info(f"❌ An error occurred: {e}")
-            logger.info("Possible reasons: Page structure changed or main selectors failed.")
-        finally:
-            logger.info("🗑️ Closing browser.")
-            await browser.close()
+
+async def scrape_post(url, conn, pool=None):
+    """
+    Scrape a post with scrape_item and insert it into the database.
+    Returns True when the post was saved.
+    """
+    try:
+        item = [await scrape_item(url, pool)]
+        logger.info(f"💾 Inserting scraped data into the database...: {item}")
+        with metrics.span("insert", PLATFORM):
+            saved = utils.insert_data(conn, config.table_name, item)
+        if saved < len(item):
+            logger.error("❌ The post couldn't be saved to the database")
+        return saved == len(item)
+    except Exception as e:
+        logger.info(f"❌ An error occurred: {e}")
+        logger.info("Possible reasons: Page structure changed or main selectors failed.")
+        return False
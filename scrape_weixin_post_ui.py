@@ -13,6 +13,7 @@ from PIL import ImageGrab
 from logging_config import get_logger
 import config
 import utils
+import ocr_utils
 
 logger = get_logger()
 
@@ -101,7 +102,7 @@ def get_post_metrics_data(url):
         width = right - left
         height = bottom - top
         logger.info(f"Read Wechat window size: {width} {height}")
-        # search_icon_x, search_icon_y = utils.find_search_icon_coordination(
+        # search_icon_x, search_icon_y = ocr_utils.find_search_icon_coordination(
         #     left, top, right, bottom)
         search_area_x = left + int(width / 2)
         search_area_y = top + 110
@@ -117,7 +118,7 @@ def get_post_metrics_data(url):
 
         # Using local OCR to read data from image (metrics)
         like_count, shared_count, favorite_count, comment_count = (
-            utils.ocr_wechat_article_metrics(left, bottom - 200, right, bottom)
+            ocr_utils.ocr_wechat_article_metrics(left, bottom - 200, right, bottom)
         )
 
         # Copy all article text via select-all + copy and return raw text
@@ -171,6 +172,7 @@ if __name__ == "__main__":
                     "shared_count": shared_count,
                     "comment_count": comment_count,
                     "like_count": like_count,
+                    "favorite_count": favorite_count,  # kept in the metric history only
                     "link1": url,
                     "link2": None,
                     "content_segmented": None,
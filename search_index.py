@@ -0,0 +1,212 @@
+"""
+SQLite FTS5 full-text index over post content (and optionally comments) with CJK bigram tokens.
+
+FTS5's built-in tokenizers treat a run of Chinese characters as one token, so the text is
+tokenized here before it is stored: every run of CJK characters becomes its overlapping
+bigrams plus its last character ("小麦长势" -> 小麦 麦长 长势 势), other words stay whole
+and lower-cased. A query word becomes the phrase of its bigrams, which matches exactly the
+posts containing that substring; a single character becomes a prefix query.
+
+The `<table>_fts` table (rowid = posts.id) is created by utils.create_table and kept in sync
+by utils.insert_data. Existing databases are indexed once with:
+    python search_index.py rebuild
+and searched with:
+    python search_index.py search 小麦 灌浆 [--limit 20]
+"""
+import argparse
+import json
+import re
+import sqlite3
+import config
+from logging_config import get_logger
+
+logger = get_logger()
+
+# CJK unified ideographs, extension A and compatibility ideographs
+_CJK = "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+_TOKEN_RE = re.compile(f"([{_CJK}]+)|([^\\W_{_CJK}]+)")
+
+SYNC_CHUNK_SIZE = 500
+
+# bm25 weights of the content and comments columns
+CONTENT_WEIGHT = 1.0
+COMMENTS_WEIGHT = 0.4
+
+
+def fts_table(table_name):
+    return f"{table_name}_fts"
+
+
+def tokenize(text):
+    """
+    Split text into index tokens: CJK bigrams plus the last character of each CJK run, other words lower-cased
+    """
+    tokens = []
+    for cjk, word in _TOKEN_RE.findall(text or ""):
+        if word:
+            tokens.append(word.lower())
+        elif len(cjk) == 1:
+            tokens.append(cjk)
+        else:
+            tokens.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+            # the last character on its own, so a single-character prefix query finds it too
+            tokens.append(cjk[-1])
+    return tokens
+
+
+def comments_text(comments):
+    """
+    Text of the comments JSON stored in posts.comments
+    """
+    if not comments:
+        return ""
+    try:
+        parsed = json.loads(comments)
+    except (TypeError, ValueError):
+        return str(comments)
+    if not isinstance(parsed, list):
+        return ""
+    texts = []
+    for comment in parsed:
+        if isinstance(comment, dict):
+            texts.append(str(comment.get("content") or ""))
+        else:
+            texts.append(str(comment))
+    return "\n".join(texts)
+
+
+def build_match_query(query):
+    """
+    Turn a user query into an FTS5 MATCH expression, all words must match
+    """
+    phrases = []
+    for cjk, word in _TOKEN_RE.findall(query or ""):
+        if word:
+            phrases.append(f'"{word.lower()}"')
+        elif len(cjk) == 1:
+            phrases.append(f'"{cjk}"*')
+        else:
+            phrases.append('"' + " ".join(cjk[i:i + 2] for i in range(len(cjk) - 1)) + '"')
+    return " AND ".join(phrases)
+
+
+def index_exists(conn, table_name):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts_table(table_name),)
+    ).fetchone() is not None
+
+
+def create_index(conn, table_name):
+    """
+    Create the FTS table of `table_name` if it doesn't exist yet
+    :return: True when it was created
+    """
+    if index_exists(conn, table_name):
+        return False
+    conn.execute(f"CREATE VIRTUAL TABLE {fts_table(table_name)} USING fts5(content, comments)")
+    conn.commit()
+    if conn.execute(f"SELECT EXISTS(SELECT 1 FROM {table_name})").fetchone()[0]:
+        logger.info(f"⚠️ Full-text index created for existing rows, run `python search_index.py rebuild` to fill it")
+    return True
+
+
+def _index_rows(conn, table_name, rows):
+    fts = fts_table(table_name)
+    conn.executemany(f"DELETE FROM {fts} WHERE rowid = ?", [(row[0],) for row in rows])
+    conn.executemany(
+        f"INSERT INTO {fts} (rowid, content, comments) VALUES (?, ?, ?)",
+        [
+            (
+                row_id,
+                " ".join(tokenize(content)),
+                " ".join(tokenize(comments_text(comments))) if config.fts_index_comments else "",
+            )
+            for row_id, content, comments in rows
+        ],
+    )
+
+
+def sync_posts(conn, table_name, links):
+    """
+    Re-index the posts with these link1 values (called by utils.insert_data),
+    nothing to do when the database has no index
+    """
+    if not index_exists(conn, table_name):
+        return
+    links = list(links)
+    for start in range(0, len(links), SYNC_CHUNK_SIZE):
+        chunk = links[start:start + SYNC_CHUNK_SIZE]
+        rows = conn.execute(
+            f"SELECT id, content, comments FROM {table_name} WHERE link1 IN ({', '.join('?' for _ in chunk)})",
+            chunk,
+        ).fetchall()
+        _index_rows(conn, table_name, rows)
+
+
+def rebuild(conn, table_name, chunk_size=5000):
+    """
+    Re-index every post of `table_name`
+    :return: number of indexed posts
+    """
+    create_index(conn, table_name)
+    conn.execute(f"DELETE FROM {fts_table(table_name)}")
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT id, content, comments FROM {table_name}")
+    indexed = 0
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        _index_rows(conn, table_name, rows)
+        indexed += len(rows)
+    # merge the index segments written by the many small inserts
+    conn.execute(f"INSERT INTO {fts_table(table_name)} ({fts_table(table_name)}) VALUES ('optimize')")
+    conn.commit()
+    logger.info(f"✅ Indexed {indexed} posts of {table_name}")
+    return indexed
+
+
+def search(conn, query, table_name=None, limit=20, include_comments=True):
+    """
+    Ranked keyword search over post content (and comments)
+    :param include_comments: False matches the post content only
+    :return: list of dicts with link1, user_name, publication_date, content and score (lower is better)
+    """
+    table_name = table_name or config.table_name
+    match = build_match_query(query)
+    if not match:
+        return []
+    if not include_comments:
+        match = f"content : ({match})"
+    fts = fts_table(table_name)
+    rows = conn.execute(
+        f"""
+        SELECT p.link1, p.user_name, p.publication_date, p.content,
+               bm25({fts}, {CONTENT_WEIGHT}, {COMMENTS_WEIGHT}) AS score
+        FROM {fts} JOIN {table_name} AS p ON p.id = {fts}.rowid
+        WHERE {fts} MATCH ?
+        ORDER BY score
+        LIMIT ?""",
+        (match, limit),
+    ).fetchall()
+    return [dict(zip(["link1", "user_name", "publication_date", "content", "score"], row)) for row in rows]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Full-text index of the scraped posts")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("rebuild", help="index all posts of the database")
+    search_parser = subparsers.add_parser("search", help="ranked keyword search")
+    search_parser.add_argument("query", nargs="+")
+    search_parser.add_argument("--limit", type=int, default=20)
+    search_parser.add_argument("--content-only", action="store_true", help="don't match comments")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(config.db_name)
+    if args.command == "rebuild":
+        rebuild(conn, config.table_name)
+    else:
+        for result in search(conn, " ".join(args.query), limit=args.limit, include_comments=not args.content_only):
+            content = (result["content"] or "").replace("\n", " ")
+            print(f"{result['score']:8.3f}  {result['publication_date']}  {result['link1']}\n          {content[:80]}")
+    conn.close()
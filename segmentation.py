@@ -0,0 +1,184 @@
+"""
+Post-processing stage: Chinese word segmentation of `posts.content` into `content_segmented`
+(jieba, words separated by spaces) for every row where it is still NULL.
+
+    python segmentation.py [--workers 4] [--chunk-size 5000]
+
+Rows are read in id order, chunk by chunk. Texts are keyed by the sha1 of the content in
+the `segmentation_cache` table, so a reposted text is segmented once, in this run or any
+later one. The distinct uncached texts of a chunk are split across a process pool (each
+worker loads the jieba dictionary once), and the results are written back with one bulk
+UPDATE per chunk. The report gives characters/sec per worker CPU second.
+"""
+import argparse
+import hashlib
+import logging
+import multiprocessing
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+try:
+    import jieba
+except ImportError:  # segmentation can't run without it
+    jieba = None
+import config
+from logging_config import get_logger
+
+logger = get_logger()
+
+CACHE_TABLE = "segmentation_cache"
+
+
+def content_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def segment_text(text):
+    """
+    Words of `text` separated by single spaces, whitespace dropped
+    """
+    return " ".join(word for word in jieba.cut(text) if word.strip())
+
+
+def _init_worker():
+    # load the dictionary once per worker process, not on its first task
+    jieba.setLogLevel(logging.WARNING)
+    jieba.initialize()
+
+
+def segment_batch(texts):
+    """
+    Segment a batch of (hash, text), runs in a pool worker
+    :return: (list of (hash, segmented text), worker CPU seconds spent)
+    """
+    start = time.process_time()
+    results = [(text_hash, segment_text(text)) for text_hash, text in texts]
+    return results, time.process_time() - start
+
+
+def create_cache_table(conn):
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {CACHE_TABLE} (
+            content_hash TEXT PRIMARY KEY,
+            segmented TEXT NOT NULL
+        ) WITHOUT ROWID
+    """
+    )
+    conn.commit()
+
+
+def _cached(conn, hashes, chunk_size=500):
+    cached = {}
+    hashes = list(hashes)
+    for start in range(0, len(hashes), chunk_size):
+        chunk = hashes[start:start + chunk_size]
+        cached.update(
+            conn.execute(
+                f"SELECT content_hash, segmented FROM {CACHE_TABLE} "
+                f"WHERE content_hash IN ({', '.join('?' for _ in chunk)})",
+                chunk,
+            ).fetchall()
+        )
+    return cached
+
+
+def _split(items, parts):
+    size = -(-len(items) // parts)
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def segment_posts(conn, table_name=None, workers=None, chunk_size=None):
+    """
+    Fill `content_segmented` of every row where it is NULL and the content isn't
+    :param workers: segmentation processes, default the CPU count; 1 segments in this process
+    :return: dict with rows, distinct texts segmented, cache hits, chars, wall and CPU seconds
+    """
+    if jieba is None:
+        raise ImportError("Segmentation needs the jieba package: pip install jieba")
+    table_name = table_name or config.table_name
+    chunk_size = chunk_size or config.segment_chunk_size
+    workers = workers or multiprocessing.cpu_count()
+    create_cache_table(conn)
+
+    pool = None
+    if workers > 1:
+        # spawn, like the other pools of the project
+        pool = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker
+        )
+    else:
+        _init_worker()
+
+    stats = {"rows": 0, "segmented": 0, "cache_hits": 0, "chars": 0, "cpu_seconds": 0.0}
+    start = time.perf_counter()
+    last_id = 0
+    try:
+        while True:
+            rows = conn.execute(
+                f"SELECT id, content FROM {table_name} "
+                f"WHERE id > ? AND content_segmented IS NULL AND content IS NOT NULL ORDER BY id LIMIT ?",
+                (last_id, chunk_size),
+            ).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            row_hashes = [(row_id, content_hash(content)) for row_id, content in rows]
+            texts = {text_hash: content for (_, text_hash), (_, content) in zip(row_hashes, rows)}
+            segmented = _cached(conn, texts)
+            stats["cache_hits"] += len(segmented)
+            missing = [(text_hash, text) for text_hash, text in texts.items() if text_hash not in segmented]
+
+            if missing:
+                if pool is None:
+                    batches = [segment_batch(missing)]
+                else:
+                    batches = pool.map(segment_batch, _split(missing, workers))
+                new_rows = []
+                for results, cpu_seconds in batches:
+                    new_rows += results
+                    stats["cpu_seconds"] += cpu_seconds
+                segmented.update(new_rows)
+                stats["segmented"] += len(missing)
+                stats["chars"] += sum(len(text) for _, text in missing)
+                conn.executemany(
+                    f"INSERT OR IGNORE INTO {CACHE_TABLE} (content_hash, segmented) VALUES (?, ?)", new_rows
+                )
+
+            conn.executemany(
+                f"UPDATE {table_name} SET content_segmented = ? WHERE id = ?",
+                [(segmented[text_hash], row_id) for row_id, text_hash in row_hashes],
+            )
+            conn.commit()
+            stats["rows"] += len(rows)
+            logger.info(f"Segmentation: processed up to id {last_id}, {stats['rows']} rows updated")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    stats["wall_seconds"] = time.perf_counter() - start
+    return stats
+
+
+def report(stats, workers):
+    per_core = stats["chars"] / stats["cpu_seconds"] if stats["cpu_seconds"] else 0
+    logger.info(
+        f"✅ Segmented {stats['rows']} rows in {stats['wall_seconds']:.1f}s with {workers} workers: "
+        f"{stats['segmented']} distinct texts, {stats['cache_hits']} cache hits, "
+        f"{per_core:,.0f} chars/sec per core ({stats['chars']:,} chars in {stats['cpu_seconds']:.1f} CPU seconds)"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Segment posts.content into content_segmented")
+    parser.add_argument("--workers", type=int, default=None, help="segmentation processes, default the CPU count")
+    parser.add_argument("--chunk-size", type=int, default=None, help="rows read and updated per chunk")
+    args = parser.parse_args()
+
+    workers = args.workers or multiprocessing.cpu_count()
+    conn = sqlite3.connect(config.db_name)
+    logger.info(f"connect to database successful: {config.db_name}")
+    stats = segment_posts(conn, workers=workers, chunk_size=args.chunk_size)
+    conn.close()
+    report(stats, workers)
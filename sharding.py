@@ -0,0 +1,127 @@
+"""
+Stable URL sharding for running the scrapers in several processes or on several machines.
+
+Every URL is assigned to a shard by a hash of the URL text, so the same URL
+always lands on the same shard for a given shard count, no matter which
+process or machine computes it. Each shard writes to its own SQLite file,
+merged back into the main database with `merge_shards`.
+"""
+import hashlib
+import os
+import sqlite3
+import metric_history
+import utils
+from logging_config import get_logger
+
+logger = get_logger()
+
+MERGE_COLUMNS = [
+    "unnamed",
+    "user_name",
+    "publication_date",
+    "content",
+    "shared_count",
+    "comment_count",
+    "like_count",
+    "link1",
+    "link2",
+    "content_segmented",
+    "is_agriculture_related",
+    "index_number",
+    "comments",
+    # kept from the shard, not the time of the merge; updated_at is the merge time, so the
+    # incremental export picks up rows merged after its watermark
+    "created_at",
+]
+
+
+def shard_of(url, num_shards):
+    """
+    Return the 0-based shard index of a url
+    """
+    digest = hashlib.sha1(url.strip().encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % num_shards
+
+
+def parse_shard_spec(spec):
+    """
+    Parse a 1-based shard spec like '2/4' into (index, count) with a 0-based index
+    """
+    try:
+        index, count = (int(part) for part in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard spec '{spec}', expected i/K such as 1/4")
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"Invalid shard spec '{spec}', i must be between 1 and K")
+    return index - 1, count
+
+
+def select_shard(urls, index, count):
+    """
+    Keep the urls that belong to shard `index` (0-based) of `count`
+    """
+    return [url for url in urls if shard_of(url, count) == index]
+
+
+def shard_db_path(db_name, index, count):
+    """
+    SQLite file of one shard, e.g. data.db -> data.shard-1-of-4.db
+    """
+    root, ext = os.path.splitext(db_name)
+    return f"{root}.shard-{index + 1}-of-{count}{ext or '.db'}"
+
+
+def remove_shard_db(path):
+    """
+    Delete a shard database file and its journal files, if any
+    """
+    for file_path in (path, f"{path}-journal", f"{path}-wal", f"{path}-shm"):
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+
+def merge_shards(conn, shard_paths, table_name, chunk_size=1000, remove=False):
+    """
+    Upsert the posts of each shard database into `conn` on the link1 UNIQUE key.
+    :param remove: delete each shard database once it is merged, so a later run doesn't merge its rows again
+    :return: number of merged rows
+    """
+    merged = 0
+    for path in shard_paths:
+        if not os.path.exists(path):
+            logger.warning(f"⚠️ Shard database not found, skip: {path}")
+            continue
+        logger.info(f"Merging shard database: {path}")
+        shard_conn = sqlite3.connect(path)
+        done = False
+        try:
+            # shards written before the timestamp columns existed
+            utils.ensure_columns(shard_conn, table_name, {"created_at": "TEXT", "updated_at": "TEXT"})
+            cursor = shard_conn.execute(f"SELECT {', '.join(MERGE_COLUMNS)} FROM {table_name}")
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                items = [dict(zip(MERGE_COLUMNS, row)) for row in rows]
+                # rows without comments must not clear comments already in the main db
+                with_comments = [item for item in items if item["comments"] is not None]
+                without_comments = [
+                    {k: v for k, v in item.items() if k != "comments"}
+                    for item in items if item["comments"] is None
+                ]
+                if with_comments:
+                    utils.insert_data(conn, table_name, with_comments, record_metrics=False)
+                if without_comments:
+                    utils.insert_data(conn, table_name, without_comments, record_metrics=False)
+                merged += len(items)
+            # the shard's own history keeps the original scrape times
+            metric_history.copy_snapshots(shard_conn, conn, table_name)
+            done = True
+        except sqlite3.Error as e:
+            logger.error(f"❌ Failed to merge shard database {path}: {e}")
+        finally:
+            shard_conn.close()
+        if done and remove:
+            remove_shard_db(path)
+    logger.info(f"✅ Merged {merged} rows from {len(shard_paths)} shard databases")
+    return merged
@@ -0,0 +1,211 @@
+"""
+Content-addressed store of raw page snapshots: the rendered HTML of a scraped url plus
+the JSON API responses captured while it loaded, so the extractors can be re-run later
+without fetching the url again (see reextract.py).
+
+    snapshots/objects/ab/<sha256>.json.zst   zstd-compressed snapshot, one file per distinct content
+    snapshots/index.db                       one row per fetch: canonical url, fetch time, content hash
+
+Enabled with `config.snapshot_enabled`. The scrapers call `start_capture(page)` before
+navigating and `save_capture(capture, page, url)` once the page is fully loaded.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+from datetime import datetime
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+try:
+    import zstandard
+except ImportError:  # snapshots can't be written or read without it
+    zstandard = None
+import config
+import utils
+from logging_config import get_logger
+
+logger = get_logger()
+
+# query parameters that change between shares of the same post
+TRACKING_PARAMS = {"chksm", "scene", "srcid", "sharer_shareid", "sharer_sharetime", "from", "spm", "share_token"}
+
+ZSTD_LEVEL = 10
+
+
+def canonical_url(url):
+    """
+    Normalize a post url for the index: lower-case scheme and host, no fragment,
+    no tracking parameters, sorted query
+    """
+    parts = urlsplit(url.strip())
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in TRACKING_PARAMS)
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, urlencode(query), ""))
+
+
+class SnapshotStore:
+    def __init__(self, root=None):
+        """
+        :param root: store directory, default config.snapshot_dir
+        """
+        if zstandard is None:
+            raise ImportError("The snapshot store needs the zstandard package: pip install zstandard")
+        self.root = root or config.snapshot_dir
+        os.makedirs(os.path.join(self.root, "objects"), exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(self.root, "index.db"), timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS snapshots (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                canonical_url TEXT NOT NULL,
+                url TEXT NOT NULL,
+                platform TEXT,
+                fetched_at TEXT NOT NULL,
+                content_hash TEXT NOT NULL
+            )
+        """
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_snapshots_url_time ON snapshots (canonical_url, fetched_at)"
+        )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def _object_path(self, content_hash):
+        return os.path.join(self.root, "objects", content_hash[:2], f"{content_hash}.json.zst")
+
+    def put(self, url, html, api_responses=None, fetched_at=None):
+        """
+        Store a snapshot of `url`. The content is written once per distinct hash,
+        every call adds an index row.
+        :param api_responses: list of {'url', 'status', 'body'} captured while the page loaded
+        :return: content hash
+        """
+        payload = json.dumps(
+            {"html": html, "api": api_responses or []}, ensure_ascii=False, sort_keys=True
+        ).encode("utf-8")
+        content_hash = hashlib.sha256(payload).hexdigest()
+        path = self._object_path(content_hash)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(payload))
+            os.replace(tmp_path, path)
+
+        fetched_at = fetched_at or datetime.now().isoformat(sep=" ", timespec="seconds")
+        self.conn.execute(
+            "INSERT INTO snapshots (canonical_url, url, platform, fetched_at, content_hash) VALUES (?, ?, ?, ?, ?)",
+            (canonical_url(url), url, utils.platform_from_url(url), fetched_at, content_hash),
+        )
+        self.conn.commit()
+        return content_hash
+
+    def get(self, content_hash):
+        """
+        :return: snapshot dict with 'html' and 'api'
+        """
+        with open(self._object_path(content_hash), "rb") as f:
+            return json.loads(zstandard.ZstdDecompressor().decompress(f.read()))
+
+    def latest(self, platform=None, since=None):
+        """
+        Latest snapshot of every url
+        :param platform: only urls of this platform
+        :param since: only snapshots fetched at or after this time ('YYYY-MM-DD[ HH:MM:SS]')
+        :return: list of (url, fetched_at, content_hash)
+        """
+        # ids grow with fetch time, the highest id of a url is its latest snapshot
+        sql = """
+            SELECT url, fetched_at, content_hash FROM snapshots
+            WHERE id IN (SELECT MAX(id) FROM snapshots GROUP BY canonical_url)"""
+        params = []
+        if platform:
+            sql += " AND platform = ?"
+            params.append(platform)
+        if since:
+            sql += " AND fetched_at >= ?"
+            params.append(since)
+        sql += " ORDER BY canonical_url"
+        return self.conn.execute(sql, params).fetchall()
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = SnapshotStore()
+    return _store
+
+
+class PageCapture:
+    """
+    Collects the JSON responses of a page while it loads
+    """
+
+    def __init__(self, page):
+        self.responses = []
+        self.page = page
+        page.on("response", self._on_response)
+
+    def detach(self):
+        self.page.remove_listener("response", self._on_response)
+
+    def _on_response(self, response):
+        if "json" in (response.headers.get("content-type") or ""):
+            self.responses.append(response)
+
+    async def api_responses(self):
+        captured = []
+        for response in self.responses:
+            try:
+                body = await response.text()
+            except Exception:
+                # the body is gone once the page navigated away or the request was a redirect
+                continue
+            captured.append({"url": response.url, "status": response.status, "body": body})
+        return captured
+
+
+# capture attached to each page, a reused page (see page_pool.py) gets a new one per url
+_active_captures = {}
+
+
+def start_capture(page):
+    """
+    Start capturing the API responses of `page` when snapshots are enabled, before page.goto
+    :return: capture for save_capture, or None
+    """
+    if not config.snapshot_enabled:
+        return None
+    stop_capture(page)
+    capture = _active_captures[page] = PageCapture(page)
+    return capture
+
+
+def stop_capture(page):
+    """
+    Detach the capture of `page`, if any, so the responses of the next url don't pile up on it
+    """
+    capture = _active_captures.pop(page, None)
+    if capture is not None:
+        capture.detach()
+
+
+async def save_capture(capture, page, url):
+    """
+    Snapshot the rendered page and its captured API responses. Never fails the scrape.
+    """
+    if capture is None:
+        return None
+    try:
+        html = await page.content()
+        content_hash = get_store().put(url, html, await capture.api_responses())
+        logger.info(f"📸 Snapshot of {url} saved: {content_hash[:12]}")
+        return content_hash
+    except Exception as e:
+        logger.warning(f"⚠️ Failed to save the snapshot of {url}: {e}")
+        return None